@@ -0,0 +1 @@
+"""Performance benchmarks on synthetic workloads, see :mod:`benchmarks.run`."""
@@ -0,0 +1,288 @@
+"""Measure throughput and peak memory of the converter, the processors and the CLI.
+
+    python -m benchmarks.run                 # print the results
+    python -m benchmarks.run --save          # record them as the baseline
+    python -m benchmarks.run --check         # exit 1 when slower or bigger than the baseline
+
+Timings are the best of ``--repeat`` runs. Peak memory is measured in a separate run with
+tracemalloc for in-process benchmarks, and as the child's max RSS for the CLI ones.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import NamedTuple
+
+from benchmarks import workloads
+from codehere.converter import Converter
+from codehere.processors import process_markdown, process_notebook, process_py
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_THRESHOLD = 0.3
+# Peaks of a few kilobytes vary by more than any threshold from run to run.
+MEMORY_SLACK = 64 * 1024
+MB = 1024 * 1024
+
+
+class Workload(NamedTuple):
+    """What a benchmark runs, how much input one run handles, and in which unit."""
+
+    run: Callable[[], object]
+    amount: float
+    unit: str
+    subprocess: bool = False
+
+
+class Result(NamedTuple):
+    name: str
+    seconds: float
+    throughput: float
+    unit: str
+    peak_bytes: int | None
+
+
+# The child reports its own peak RSS from /proc: ru_maxrss would also count the pages it
+# shared with this process between fork and exec.
+_CLI = """
+import atexit, sys
+def report():
+    with open("/proc/self/status") as f:
+        print(*(line for line in f if line.startswith("VmHWM:")), file=sys.stderr, end="")
+atexit.register(report)
+from codehere.cli import main
+main()
+"""
+
+
+def _cli(*args: str) -> Callable[[], object]:
+    command = [sys.executable, "-c", _CLI, *args]
+    return lambda: subprocess.run(command, check=True, capture_output=True, text=True)
+
+
+def bench_process_lines(tmp: str, scale: float) -> Workload:
+    lines = workloads.code_lines(int(20_000 * scale))
+    converter = Converter()
+    return Workload(lambda: converter.process_lines(lines), len(lines), "lines/s")
+
+
+def bench_process_py(tmp: str, scale: float) -> Workload:
+    infile = os.path.join(tmp, "large.py")
+    size = workloads.python_file(infile, int(200_000 * scale))
+    return Workload(lambda: process_py(infile, os.path.join(tmp, "large-task.py")), size / MB, "MB/s")
+
+
+def bench_process_markdown(tmp: str, scale: float) -> Workload:
+    infile = os.path.join(tmp, "large.md")
+    size = workloads.markdown_file(infile, int(200_000 * scale))
+    return Workload(lambda: process_markdown(infile, os.path.join(tmp, "large-task.md")), size / MB, "MB/s")
+
+
+def bench_process_markdown_prose(tmp: str, scale: float) -> Workload:
+    infile = os.path.join(tmp, "prose.md")
+    size = workloads.markdown_file(infile, int(200_000 * scale), prose_lines=40)
+    outfile = os.path.join(tmp, "prose-task.md")
+    return Workload(lambda: process_markdown(infile, outfile, fenced=True), size / MB, "MB/s")
+
+
+def bench_process_notebook(tmp: str, scale: float) -> Workload:
+    cells = int(2_000 * scale)
+    infile = os.path.join(tmp, "cells.ipynb")
+    workloads.notebook_file(infile, cells, 4)
+    return Workload(lambda: process_notebook(infile, os.path.join(tmp, "cells-task.ipynb")), cells, "cells/s")
+
+
+def bench_process_notebook_sparse(tmp: str, scale: float) -> Workload:
+    cells = int(2_000 * scale)
+    infile = os.path.join(tmp, "sparse.ipynb")
+    workloads.notebook_file(infile, cells, 4, tagged_every=10)
+    return Workload(lambda: process_notebook(infile, os.path.join(tmp, "sparse-task.ipynb")), cells, "cells/s")
+
+
+def bench_process_notebook_outputs(tmp: str, scale: float) -> Workload:
+    infile = os.path.join(tmp, "outputs.ipynb")
+    size = workloads.notebook_file(infile, int(200 * scale), 1, output_bytes=100_000)
+    outfile = os.path.join(tmp, "outputs-task.ipynb")
+    return Workload(lambda: process_notebook(infile, outfile, clear=True), size / MB, "MB/s")
+
+
+def bench_process_notebook_outputs_stream(tmp: str, scale: float) -> Workload:
+    infile = os.path.join(tmp, "outputs-stream.ipynb")
+    size = workloads.notebook_file(infile, int(200 * scale), 1, output_bytes=100_000)
+    outfile = os.path.join(tmp, "outputs-stream-task.ipynb")
+    return Workload(lambda: process_notebook(infile, outfile, clear=True, stream=True), size / MB, "MB/s")
+
+
+def bench_merge_submissions(tmp: str, scale: float) -> Workload:
+    from codehere.merge import merge_many
+
+    template = os.path.join(tmp, "template.ipynb")
+    workloads.notebook_file(template, 200, 4)
+    count = int(100 * scale)
+    for index in range(count):
+        os.makedirs(os.path.join(tmp, "submissions", str(index)))
+        process_notebook(template, os.path.join(tmp, "submissions", str(index), "template.ipynb"))
+    submissions = os.path.join(tmp, "submissions")
+    return Workload(lambda: merge_many(template, [submissions], os.path.join(tmp, "merged")), count, "files/s")
+
+
+def bench_cli_py(tmp: str, scale: float) -> Workload:
+    infile = os.path.join(tmp, "cli.py")
+    workloads.python_file(infile, 200)
+    return Workload(_cli(infile, "--outfile", os.path.join(tmp, "cli-task.py")), 1, "runs/s", subprocess=True)
+
+
+def bench_cli_notebook(tmp: str, scale: float) -> Workload:
+    infile = os.path.join(tmp, "cli.ipynb")
+    size = workloads.notebook_file(infile, int(100 * scale), 2, output_bytes=50_000)
+    outfile = os.path.join(tmp, "cli-task.ipynb")
+    return Workload(_cli(infile, "--outfile", outfile, "--clear"), size / MB, "MB/s", subprocess=True)
+
+
+BENCHMARKS: dict[str, Callable[[str, float], Workload]] = {
+    "process_lines": bench_process_lines,
+    "process_py": bench_process_py,
+    "process_markdown": bench_process_markdown,
+    "process_markdown_prose": bench_process_markdown_prose,
+    "process_notebook": bench_process_notebook,
+    "process_notebook_sparse": bench_process_notebook_sparse,
+    "process_notebook_outputs": bench_process_notebook_outputs,
+    "process_notebook_outputs_stream": bench_process_notebook_outputs_stream,
+    "merge_submissions": bench_merge_submissions,
+    "cli_py": bench_cli_py,
+    "cli_notebook": bench_cli_notebook,
+}
+
+
+def _peak_bytes(workload: Workload) -> int | None:
+    if workload.subprocess:
+        if sys.platform != "linux":
+            return None
+        _, peak, _ = workload.run().stderr.splitlines()[-1].split()  # "VmHWM: <n> kB"
+        return int(peak) * 1024
+    tracemalloc.start()
+    try:
+        workload.run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(name: str, workload: Workload, *, repeat: int = 5) -> Result:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        workload.run()
+        best = min(best, time.perf_counter() - started)
+    return Result(name, best, workload.amount / best, workload.unit, _peak_bytes(workload))
+
+
+def run_benchmarks(names: list[str] | None = None, *, scale: float = 1.0, repeat: int = 5) -> list[Result]:
+    """Generate each workload in a temporary directory and measure it."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="codehere-bench-") as tmp:
+        for name in names or BENCHMARKS:
+            results.append(measure(name, BENCHMARKS[name](tmp, scale), repeat=repeat))
+    return results
+
+
+def to_baseline(results: list[Result], *, scale: float) -> dict:
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "system": platform.system(),
+        },
+        "scale": scale,
+        "results": {
+            result.name: {
+                "seconds": result.seconds,
+                "throughput": result.throughput,
+                "unit": result.unit,
+                "peak_bytes": result.peak_bytes,
+            }
+            for result in results
+        },
+    }
+
+
+def compare(results: list[Result], baseline: dict, *, threshold: float = DEFAULT_THRESHOLD) -> list[str]:
+    """Describe every result whose throughput dropped, or peak memory grew, by more than *threshold*."""
+    regressions = []
+    for result in results:
+        expected = baseline["results"].get(result.name)
+        if expected is None:
+            continue
+        if result.throughput < expected["throughput"] * (1 - threshold):
+            regressions.append(
+                f"{result.name}: {result.throughput:,.1f} {result.unit}, "
+                f"baseline {expected['throughput']:,.1f} {result.unit}"
+            )
+        if (
+            result.peak_bytes is not None
+            and expected["peak_bytes"] is not None
+            and result.peak_bytes > expected["peak_bytes"] * (1 + threshold) + MEMORY_SLACK
+        ):
+            regressions.append(
+                f"{result.name}: peak memory {result.peak_bytes / MB:,.2f} MB, "
+                f"baseline {expected['peak_bytes'] / MB:,.2f} MB"
+            )
+    return regressions
+
+
+def format_results(results: list[Result]) -> str:
+    width = max(len(result.name) for result in results)
+    lines = []
+    for result in results:
+        peak = f"{result.peak_bytes / MB:10.2f} MB" if result.peak_bytes is not None else f"{'-':>13}"
+        lines.append(
+            f"{result.name:<{width}}  {result.seconds * 1000:10.2f} ms"
+            f"  {result.throughput:14,.1f} {result.unit:<7}  peak {peak}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark codehere on synthetic workloads.")
+    parser.add_argument("names", nargs="*", metavar="name", help=f"benchmarks to run: {', '.join(BENCHMARKS)} (all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every workload size")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark, the best one counts")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file")
+    parser.add_argument("--save", action="store_true", help="write the results to the baseline file")
+    parser.add_argument("--check", action="store_true", help="exit 1 on regressions against the baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown or memory growth (0.3 = 30%%)"
+    )
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run_benchmarks(args.names, scale=args.scale, repeat=args.repeat)
+    print(format_results(results))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(to_baseline(results, scale=args.scale), f, indent=1, sort_keys=True)
+            f.write("\n")
+        print("Saved baseline in:", args.baseline, file=sys.stderr)
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["scale"] != args.scale:
+            parser.error(f"the baseline was recorded with --scale {baseline['scale']}")
+        regressions = compare(results, baseline, threshold=args.threshold)
+        if regressions:
+            parser.exit(1, "Performance regressions:\n" + "\n".join(regressions) + "\n")
+        print("No regressions against:", args.baseline, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Synthetic inputs for the benchmarks: tagged .py/.md files and notebooks of any size."""
+
+import base64
+import json
+import os
+
+BEGIN = '"""<codehere>"""\n'
+END = '"""</codehere>"""\n'
+COMMENT_BEGIN = '"""<comment>"""\n'
+COMMENT_END = '"""</comment>"""\n'
+
+
+def code_lines(blocks: int, *, block_lines: int = 6, plain_lines: int = 4) -> list[str]:
+    """Source with *blocks* tagged regions, alternating codehere and comment blocks."""
+    lines = []
+    for index in range(blocks):
+        lines.extend(f"value_{index}_{line} = compute({line})\n" for line in range(plain_lines))
+        begin, end = (BEGIN, END) if index % 2 == 0 else (COMMENT_BEGIN, COMMENT_END)
+        lines.append("    " + begin)
+        lines.extend(f"    result_{index} = solve({line}, value_{index}_0)\n" for line in range(block_lines))
+        lines.append("    " + end)
+    return lines
+
+
+def plain_lines(count: int) -> list[str]:
+    """Tag-free source of *count* lines, like most cells of a lecture notebook."""
+    return [f"value_{line} = compute({line})\n" for line in range(count)]
+
+
+def python_file(path: str, lines: int) -> int:
+    """Write a .py file of about *lines* lines; return its size in bytes."""
+    per_block = 4 + 6 + 2
+    with open(path, "w") as f:
+        f.writelines(code_lines(max(1, lines // per_block)))
+    return os.path.getsize(path)
+
+
+def markdown_file(path: str, lines: int, *, prose_lines: int = 0) -> int:
+    """Write a .md file of about *lines* lines, with tagged code in fenced blocks.
+
+    With *prose_lines*, every section also has that many lines of prose, like a lecture book.
+    """
+    per_section = 3 + 2 + 12 + prose_lines
+    prose = "".join(f"Line {line} of prose explains the step, with `inline code`.\n" for line in range(prose_lines))
+    with open(path, "w") as f:
+        for index in range(max(1, lines // per_section)):
+            f.write(f"## Exercise {index}\n\nImplement the step below.\n")
+            f.write(prose)
+            f.write("```python\n")
+            f.writelines(code_lines(1))
+            f.write("```\n")
+    return os.path.getsize(path)
+
+
+def notebook(cells: int, blocks_per_cell: int, *, output_bytes: int = 0, tagged_every: int = 1) -> dict:
+    """A notebook of *cells* code cells with *blocks_per_cell* tagged blocks each.
+
+    With *output_bytes*, every cell also carries a base64 PNG output of about that size,
+    like plots in a lecture notebook that was run before being converted. With *tagged_every*,
+    only one code cell in that many is tagged, the others hold as many lines of plain code.
+    """
+    tagged = code_lines(blocks_per_cell)
+    image = base64.b64encode(os.urandom(output_bytes * 3 // 4)).decode() if output_bytes else None
+    notebook_cells = []
+    for index in range(cells):
+        outputs = [{"output_type": "stream", "name": "stdout", "text": [f"cell {index}\n"]}]
+        if image is not None:
+            outputs.append(
+                {
+                    "output_type": "display_data",
+                    "data": {"image/png": image, "text/plain": ["<Figure size 640x480 with 1 Axes>"]},
+                    "metadata": {},
+                }
+            )
+        notebook_cells.append(
+            {
+                "cell_type": "code",
+                "execution_count": index + 1,
+                "metadata": {},
+                "outputs": outputs,
+                "source": tagged if index % tagged_every == 0 else plain_lines(len(tagged)),
+            }
+        )
+        notebook_cells.append({"cell_type": "markdown", "metadata": {}, "source": [f"Step {index}\n"]})
+    return {
+        "cells": notebook_cells,
+        "metadata": {"kernelspec": {"name": "python3", "display_name": "Python 3", "language": "python"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+
+
+def notebook_file(path: str, cells: int, blocks_per_cell: int, *, output_bytes: int = 0, tagged_every: int = 1) -> int:
+    """Write :func:`notebook` to *path* in the nbformat layout; return its size in bytes."""
+    with open(path, "w") as f:
+        json.dump(notebook(cells, blocks_per_cell, output_bytes=output_bytes, tagged_every=tagged_every), f, indent=1)
+    return os.path.getsize(path)
@@ -2,110 +2,152 @@
 
 __version__ = "0.2.1"
 
-from codehere.converter import Converter
-from codehere.exceptions import (
-    CodehereError,
-    NoOpenTagError,
-    TagError,
-    UnclosedTagError,
-    UnsupportedExtensionError,
-)
-from codehere.processors import process_file
-from codehere.utils import get_outfile_path
-
-
-def _detect_notebook_path() -> str | None:
-    """Try to auto-detect the current notebook path (Colab, VS Code, Jupyter)."""
-    from pathlib import Path
-
-    # VS Code stores the notebook path in IPython's user namespace
-    try:
-        ip = __import__("IPython").get_ipython()
-        if ip:
-            path = ip.user_ns.get("__vsc_ipynb_file__")
-            if path and Path(path).exists():
-                return str(path)
-    except Exception:
-        pass
-
-    # Google Colab: fetch notebook content via internal API and save to a temp file
-    try:
-        from google.colab import _message
-        import json as _json
-        import tempfile
-
-        response = _message.blocking_request("get_ipynb", timeout_sec=10)
-        if response and "ipynb" in response:
-            tmp = tempfile.NamedTemporaryFile(suffix=".ipynb", delete=False, mode="w")
-            _json.dump(response["ipynb"], tmp)
-            tmp.close()
-            return tmp.name
-    except Exception:
-        pass
-
-    # Jupyter: try matching kernel connection file to running server sessions
-    try:
-        import ipykernel
-        import json as _json
-        from urllib.request import urlopen
-
-        connection_file = Path(ipykernel.get_connection_file()).stem
-        kernel_id = connection_file.split("-", 1)[1].split(".")[0]
-
-        for mod_name in ("jupyter_server.serverapp", "notebook.notebookapp"):
-            try:
-                mod = __import__(mod_name, fromlist=["list_running_servers"])
-                for srv in mod.list_running_servers():
-                    url = srv["url"] + "api/sessions"
-                    if srv.get("token"):
-                        url += "?token=" + srv["token"]
-                    sessions = _json.loads(urlopen(url).read())
-                    for sess in sessions:
-                        if sess["kernel"]["id"] == kernel_id:
-                            nb_path = sess.get("notebook", {}).get("path") or sess.get("path")
-                            if nb_path:
-                                full = Path(srv.get("notebook_dir", srv.get("root_dir", ""))) / nb_path
-                                if full.exists():
-                                    return str(full)
-            except Exception:
-                continue
-    except Exception:
-        pass
-
-    # Fallback: single .ipynb in current directory
-    notebooks = list(Path.cwd().glob("*.ipynb"))
-    if len(notebooks) == 1:
-        return str(notebooks[0])
-
-    return None
+import importlib
+
+TYPE_CHECKING = False  # typing itself costs more to import than the rest of the package
+
+if TYPE_CHECKING:
+    from codehere.aio import ConvertResult, aconvert, aconvert_many
+    from codehere.archive import archive_many
+    from codehere.check import check_file, check_many
+    from codehere.converter import Converter, RenderCache
+    from codehere.document import TARGETS, CompiledDocument
+    from codehere.exceptions import (
+        CodehereError,
+        NoOpenTagError,
+        TagError,
+        UnclosedTagError,
+        UnsupportedExtensionError,
+    )
+    from codehere.merge import MergeTemplate, merge_many
+    from codehere.processors import (
+        compile_file,
+        convert_notebook_dict,
+        convert_notebook_json,
+        convert_text,
+        process_file,
+        process_stream,
+    )
+    from codehere.stats import Stats
+    from codehere.utils import get_outfile_path
+
+# Public names are imported on first access, so that `import codehere` (and the CLI
+# startup) only pays for the modules that are actually used.
+_LAZY_ATTRIBUTES = {
+    "CompiledDocument": "codehere.document",
+    "Converter": "codehere.converter",
+    "ConvertResult": "codehere.aio",
+    "CodehereError": "codehere.exceptions",
+    "MergeTemplate": "codehere.merge",
+    "NoOpenTagError": "codehere.exceptions",
+    "RenderCache": "codehere.converter",
+    "Stats": "codehere.stats",
+    "TARGETS": "codehere.document",
+    "TagError": "codehere.exceptions",
+    "UnclosedTagError": "codehere.exceptions",
+    "UnsupportedExtensionError": "codehere.exceptions",
+    "aconvert": "codehere.aio",
+    "aconvert_many": "codehere.aio",
+    "archive_many": "codehere.archive",
+    "check_file": "codehere.check",
+    "check_many": "codehere.check",
+    "compile_file": "codehere.processors",
+    "convert_notebook_dict": "codehere.processors",
+    "convert_notebook_json": "codehere.processors",
+    "convert_text": "codehere.processors",
+    "get_outfile_path": "codehere.utils",
+    "merge_many": "codehere.merge",
+    "process_file": "codehere.processors",
+    "process_stream": "codehere.processors",
+}
+
+
+def __getattr__(name: str):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted({*globals(), *_LAZY_ATTRIBUTES})
 
 
 def convert(
     file: str | None = None,
-    outfile: str | None = None,
+    outfile: str | dict[str, str] | None = None,
     solution: bool = False,
     clear: bool = False,
     replacement: str = " Your code here ",
+    targets: list[str] | None = None,
 ) -> None:
-    """Backward-compatible entry point."""
+    """Backward-compatible entry point.
+
+    With *targets* (e.g. ``["task", "solution"]``) the file is read and parsed once and
+    every target is rendered from it; *outfile* may then map each target to its path.
+    """
+    from codehere.document import TARGETS, CompiledDocument
+    from codehere.processors import compile_file
+    from codehere.utils import get_outfile_path
+
+    if targets is None:
+        targets = ["solution" if solution else "task"]
+    unknown = [target for target in targets if target not in TARGETS]
+    if unknown:
+        raise ValueError(f"Unknown targets: {', '.join(unknown)}. Expected some of: {', '.join(TARGETS)}.")
+    if isinstance(outfile, str) and len(targets) > 1:
+        raise ValueError("A single outfile cannot hold several targets; pass a mapping from target to path.")
+
+    document = None
     if file is None:
-        file = _detect_notebook_path()
-    if file is None:
-        raise FileNotFoundError("Cannot determine input file location. Please specify it directly.")
-    if outfile is None:
-        outfile = get_outfile_path(file, solution=solution)
-    process_file(file, outfile, solution=solution, clear=clear, replacement=replacement)
-    print("Saved in:", outfile)
+        from codehere.detect import detect_notebook
+
+        detected = detect_notebook()
+        if detected is None:
+            raise FileNotFoundError("Cannot determine input file location. Please specify it directly.")
+        file = detected.path
+        if detected.notebook is not None:
+            # On Colab the content comes from the browser: there is no file to read, and the
+            # outputs are named after the notebook, in the current directory.
+            document = CompiledDocument.from_notebook(detected.notebook)
+    if document is None:
+        document = compile_file(file)
+
+    for target in targets:
+        target_outfile = outfile.get(target) if isinstance(outfile, dict) else outfile
+        if target_outfile is None:
+            target_outfile = get_outfile_path(file, solution=target == "solution")
+        document.write(target_outfile, solution=target == "solution", clear=clear, replacement=replacement)
+        print("Saved in:", target_outfile)
 
 
 __all__ = [
+    "CompiledDocument",
     "Converter",
+    "ConvertResult",
     "CodehereError",
+    "MergeTemplate",
     "NoOpenTagError",
+    "RenderCache",
+    "Stats",
+    "TARGETS",
     "TagError",
     "UnclosedTagError",
     "UnsupportedExtensionError",
+    "aconvert",
+    "aconvert_many",
+    "archive_many",
+    "check_file",
+    "check_many",
+    "compile_file",
     "convert",
+    "convert_notebook_dict",
+    "convert_notebook_json",
+    "convert_text",
     "get_outfile_path",
+    "merge_many",
     "process_file",
+    "process_stream",
 ]
@@ -0,0 +1,119 @@
+"""asyncio counterparts of the path-based conversions, see :func:`aconvert` and :func:`aconvert_many`."""
+
+import asyncio
+from collections.abc import Iterable
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import NamedTuple
+
+from codehere.converter import Converter, RenderCache
+from codehere.exceptions import CodehereError
+from codehere.output import write_output
+from codehere.processors import _unsupported, convert_notebook_json, convert_text, process_file
+from codehere.utils import get_outfile_path
+
+
+class ConvertResult(NamedTuple):
+    """Outcome of one input of :func:`aconvert_many`: *error* is ``None`` when the conversion succeeded."""
+
+    infile: str
+    outfile: str | None
+    error: Exception | None
+
+
+def _read(infile: str) -> str | bytes:
+    if infile.endswith(".ipynb"):
+        with open(infile, "rb") as f:
+            return f.read()
+    with open(infile) as f:
+        return f.read()
+
+
+def _render(
+    data: str | bytes, *, notebook: bool, solution: bool, clear: bool, replacement: str, converter: Converter | None
+) -> str | bytes:
+    if notebook:
+        return convert_notebook_json(data, solution=solution, clear=clear, replacement=replacement, converter=converter)
+    return convert_text(data, solution=solution, replacement=replacement, converter=converter)
+
+
+async def aconvert(
+    infile: str,
+    outfile: str | None = None,
+    *,
+    solution: bool = False,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    stream: bool = False,
+    executor: Executor | None = None,
+    converter: Converter | None = None,
+) -> str:
+    """Convert *infile* into *outfile* without blocking the event loop; return the outfile.
+
+    Reading and writing run in the loop's default thread pool, rendering runs in *executor*
+    (the default thread pool too when ``None``). A :class:`~concurrent.futures.ProcessPoolExecutor`
+    takes CPU-bound rendering off the GIL; *converter* must then be left to ``None``. With
+    *stream*, notebooks are rewritten in one go by :func:`~codehere.processors.process_notebook`
+    in *executor*. The output is replaced atomically, so cancelling never leaves it half written,
+    and is left untouched when its content does not change.
+    """
+    if not infile.endswith((".py", ".md", ".ipynb")):
+        raise _unsupported(infile)
+    loop = asyncio.get_running_loop()
+    outfile = outfile or get_outfile_path(infile, solution=solution)
+    options = {"solution": solution, "clear": clear, "replacement": replacement, "converter": converter}
+
+    if stream and infile.endswith(".ipynb"):
+        await loop.run_in_executor(executor, partial(process_file, infile, outfile, stream=True, **options))
+        return outfile
+
+    data = await asyncio.to_thread(_read, infile)
+    rendered = await loop.run_in_executor(
+        executor, partial(_render, data, notebook=infile.endswith(".ipynb"), **options)
+    )
+    await asyncio.to_thread(write_output, outfile, rendered)
+    return outfile
+
+
+async def aconvert_many(
+    inputs: Iterable[str | tuple[str, str]],
+    *,
+    solution: bool = False,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    stream: bool = False,
+    limit: int = 16,
+    executor: Executor | None = None,
+    converter: Converter | None = None,
+) -> list[ConvertResult]:
+    """Convert many inputs concurrently; return one :class:`ConvertResult` per input, in order.
+
+    *inputs* are infiles, or ``(infile, outfile)`` pairs. At most *limit* conversions are
+    in flight at once, so that reads and writes overlap with rendering without opening
+    every file at the same time. Failed inputs do not stop the others. Cancelling the call
+    cancels every conversion still pending. Unless a process pool is given as *executor*,
+    all conversions share one warm converter with a render cache.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    if converter is None and not isinstance(executor, ProcessPoolExecutor):
+        converter = Converter(render_cache=RenderCache())
+
+    async def convert_one(infile: str, outfile: str | None) -> ConvertResult:
+        async with semaphore:
+            try:
+                outfile = await aconvert(
+                    infile,
+                    outfile,
+                    solution=solution,
+                    clear=clear,
+                    replacement=replacement,
+                    stream=stream,
+                    executor=executor,
+                    converter=converter,
+                )
+            except (CodehereError, OSError, ValueError) as e:
+                return ConvertResult(infile, outfile, e)
+            return ConvertResult(infile, outfile, None)
+
+    pairs = [(item, None) if isinstance(item, str) else item for item in inputs]
+    return list(await asyncio.gather(*(convert_one(infile, outfile) for infile, outfile in pairs)))
@@ -0,0 +1,266 @@
+"""Bundling of batch outputs into one zip or tar stream, see :func:`archive_many`."""
+
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePath
+from typing import TYPE_CHECKING, BinaryIO
+
+from codehere.batch import BatchReport, _check_targets
+from codehere.exceptions import CodehereError
+from codehere.processors import compile_file, convert_notebook_json
+from codehere.stats import Stats, stage
+from codehere.utils import ARCHIVE_FORMATS, check_collisions, collect_inputs
+
+if TYPE_CHECKING:
+    from codehere.prune import PrunePolicy
+
+# Every entry gets this timestamp, the earliest a zip file can hold, instead of the time of the
+# build, so that archives of the same outputs are byte for byte identical.
+EPOCH = (1980, 1, 1, 0, 0, 0)
+EPOCH_SECONDS = 315532800
+# Rendered inputs waiting to be appended, per worker: enough to keep the workers busy while
+# the archive is written, without holding the outputs of the whole batch.
+RESULTS_PER_JOB = 4
+
+
+def archive_format(name: str) -> str:
+    """Format of an archive, guessed from its file *name*."""
+    if name.endswith((".tar.gz", ".tgz")):
+        return "tar.gz"
+    for format in ("zip", "tar"):
+        if name.endswith(f".{format}"):
+            return format
+    raise ValueError(f"Cannot tell the archive format of {name}. Expected one of: {', '.join(ARCHIVE_FORMATS)}.")
+
+
+class ArchiveWriter:
+    """Append files to a zip or tar archive written to *fileobj*, which need not be seekable.
+
+    Entries are regular files with fixed timestamps, owners and permissions, so the bytes of
+    the archive only depend on the names and contents of its entries and their order.
+    *fileobj* is left open by :meth:`close`.
+    """
+
+    def __init__(self, fileobj: BinaryIO, format: str = "zip") -> None:
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {format!r}. Expected one of: {', '.join(ARCHIVE_FORMATS)}.")
+        self.format = format
+        self._gzip = None
+        if format == "zip":
+            self._archive = zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            if format == "tar.gz":
+                # Unlike tarfile's own compression, this header holds no time and no file name.
+                fileobj = self._gzip = gzip.GzipFile(filename="", mode="wb", fileobj=fileobj, mtime=0)
+            self._archive = tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.PAX_FORMAT)
+
+    def add(self, name: str, data: bytes) -> None:
+        if self.format == "zip":
+            info = zipfile.ZipInfo(name, date_time=EPOCH)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.create_system = 3  # Unix, for the permissions below to count
+            info.external_attr = 0o644 << 16
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = EPOCH_SECONDS
+            info.mode = 0o644
+            self._archive.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        self._archive.close()
+        if self._gzip is not None:
+            self._gzip.close()
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def plan_entries(
+    paths: list[str], *, targets: list[str] | tuple[str, ...] = ("task",)
+) -> list[tuple[str, list[tuple[str, str]]]]:
+    """Map every input found in *paths* to its ``(target, entry name)`` pairs in an archive.
+
+    Like :func:`codehere.batch.plan_outputs`, with the archive as the output directory.
+    """
+    _check_targets(targets)
+    inputs = collect_inputs(paths)
+    check_collisions(inputs)
+    plan = []
+    for infile, relative in inputs:
+        names = [(target, PurePath(target, relative) if len(targets) > 1 else relative) for target in targets]
+        plan.append((str(infile), [(target, name.as_posix()) for target, name in names]))
+    return plan
+
+
+def render_one(
+    infile: str,
+    entries: list[tuple[str, str]],
+    *,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    fenced: bool = False,
+    stats: Stats | None = None,
+) -> tuple[Exception | None, list[tuple[str, bytes]]]:
+    """Render *infile* once per ``(target, name)`` entry; return the error instead of raising it.
+
+    Returns the error, if any, and the entry names with their contents, which are all dropped
+    when one of them fails. The options are those of :func:`codehere.batch.convert_one`.
+    """
+    rendered = []
+    try:
+        if stream and infile.endswith(".ipynb"):
+            with open(infile, "rb") as f:
+                data = f.read()
+            for target, name in entries:
+                rendered.append(
+                    (
+                        name,
+                        convert_notebook_json(
+                            data,
+                            solution=target == "solution",
+                            clear=clear,
+                            replacement=replacement,
+                            stream=True,
+                            prune=prune,
+                            stats=stats,
+                        ),
+                    )
+                )
+        else:
+            document = compile_file(infile, fenced=fenced, stats=stats)
+            for target, name in entries:
+                text = document.serialize(
+                    solution=target == "solution",
+                    clear=clear,
+                    replacement=replacement,
+                    prune=prune,
+                    canonical=canonical,
+                )
+                rendered.append((name, text.encode("utf-8") if isinstance(text, str) else text))
+    except (CodehereError, OSError, ValueError, KeyError) as e:
+        # A notebook without cells or cell types is reported like invalid JSON.
+        return e, []
+    return None, rendered
+
+
+def _render_job(job: tuple) -> tuple[Exception | None, list[tuple[str, bytes]], Stats | None]:
+    infile, entries, clear, replacement, stream, prune, canonical, fenced, collect_stats = job
+    stats = Stats() if collect_stats else None
+    error, rendered = render_one(
+        infile,
+        entries,
+        clear=clear,
+        replacement=replacement,
+        stream=stream,
+        prune=prune,
+        canonical=canonical,
+        fenced=fenced,
+        stats=stats,
+    )
+    return error, rendered, stats
+
+
+def _in_order(executor: ProcessPoolExecutor, jobs: Iterable[tuple], window: int) -> Iterator[tuple]:
+    """Results of :func:`_render_job` over *jobs*, in order, with at most *window* of them pending."""
+    pending: deque = deque()
+    for job in jobs:
+        pending.append(executor.submit(_render_job, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def archive_many(
+    paths: list[str],
+    archive: str | BinaryIO,
+    *,
+    format: str | None = None,
+    targets: list[str] | tuple[str, ...] = ("task",),
+    jobs: int | None = 1,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    fenced: bool = False,
+    stats: Stats | None = None,
+) -> BatchReport:
+    """Convert files, directories and glob patterns into one zip or tar *archive*.
+
+    *archive* is a file name, whose extension gives the *format* unless it is set, or a binary
+    file object (a pipe will do). Entries mirror the input tree like :func:`codehere.batch.convert_many`
+    does under its output directory, in the order of the inputs. Each input is appended as soon
+    as it is rendered, by one of *jobs* worker processes (all CPUs when ``None``), so only a few
+    inputs' outputs are held in memory at a time. Inputs that fail are left out and reported.
+    A named archive is written atomically, and left untouched when its content is unchanged.
+    """
+    if format is None:
+        if not isinstance(archive, str):
+            raise ValueError("The format of an archive written to a file object must be given")
+        format = archive_format(archive)
+    if format not in ARCHIVE_FORMATS:
+        raise ValueError(f"Unknown archive format: {format!r}. Expected one of: {', '.join(ARCHIVE_FORMATS)}.")
+    plan = plan_entries(paths, targets=targets)
+    batch = [
+        (infile, entries, clear, replacement, stream, prune, canonical, fenced, stats is not None)
+        for infile, entries in plan
+    ]
+
+    if isinstance(archive, str):
+        from codehere.output import AtomicOutput
+
+        with AtomicOutput(archive, "wb") as output:
+            return _write_archive(output.file, format, plan, batch, jobs, stats)
+    return _write_archive(archive, format, plan, batch, jobs, stats)
+
+
+def _write_archive(
+    fileobj: BinaryIO,
+    format: str,
+    plan: list[tuple[str, list[tuple[str, str]]]],
+    batch: list[tuple],
+    jobs: int | None,
+    stats: Stats | None,
+) -> BatchReport:
+    jobs = min(jobs or os.cpu_count() or 1, len(batch))
+    failures = []
+    written = 0
+    with ArchiveWriter(fileobj, format) as writer:
+        if jobs <= 1:
+            results: Iterator[tuple] = map(_render_job, batch)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            results = _in_order(executor, batch, jobs * RESULTS_PER_JOB)
+        try:
+            for (infile, _), (error, rendered, job_stats) in zip(plan, results):
+                if job_stats is not None:
+                    stats.merge(job_stats)
+                if error is not None:
+                    failures.append((infile, error))
+                with stage(stats, "write"):
+                    for name, data in rendered:
+                        writer.add(name, data)
+                if stats is not None:
+                    stats.add("files", len(rendered))
+                    stats.add("bytes_written", sum(len(data) for _, data in rendered))
+                written += len(rendered)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    return BatchReport(len(plan), written, failures)
@@ -0,0 +1,210 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from codehere.cache import BuildCache, file_digest, is_fresh, make_entry, make_options
+from codehere.document import TARGETS
+from codehere.exceptions import CodehereError
+from codehere.processors import compile_file, process_notebook
+from codehere.stats import Stats
+from codehere.utils import check_collisions, collect_inputs
+
+if TYPE_CHECKING:
+    from codehere.prune import PrunePolicy
+
+
+def _check_targets(targets: list[str] | tuple[str, ...]) -> None:
+    unknown = [target for target in targets if target not in TARGETS]
+    if unknown:
+        raise ValueError(f"Unknown targets: {', '.join(unknown)}. Expected some of: {', '.join(TARGETS)}.")
+
+
+def plan_outputs(
+    paths: list[str],
+    outdir: str,
+    *,
+    targets: list[str] | tuple[str, ...] = ("task",),
+) -> list[tuple[str, list[tuple[str, str]]]]:
+    """Map every input found in *paths* to its ``(target, outfile)`` pairs under *outdir*.
+
+    Outputs mirror the input tree; with several targets each one gets its own subdirectory.
+    Raises ``ValueError`` when two inputs would be written to the same output.
+    """
+    _check_targets(targets)
+    out_root = Path(outdir).resolve()
+    # Outputs of an earlier run inside the input tree are not inputs.
+    inputs = [
+        (infile, relative) for infile, relative in collect_inputs(paths) if out_root not in infile.resolve().parents
+    ]
+    check_collisions(inputs)
+    plan = []
+    for infile, relative in inputs:
+        outputs = []
+        for target in targets:
+            target_dir = Path(outdir, target) if len(targets) > 1 else Path(outdir)
+            outputs.append((target, str(target_dir / relative)))
+        plan.append((str(infile), outputs))
+    return plan
+
+
+class BatchReport(NamedTuple):
+    total: int
+    written: int
+    failures: list[tuple[str, Exception]]
+
+
+def convert_one(
+    infile: str,
+    outputs: list[tuple[str, str]],
+    *,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    entries: dict[str, dict | None] | None = None,
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    fenced: bool = False,
+    stats: Stats | None = None,
+) -> tuple[Exception | None, dict[str, dict | None]]:
+    """Parse *infile* once and write each of its outputs; return the error instead of raising it.
+
+    With manifest *entries* (keyed by outfile, see :mod:`codehere.cache`), outputs that are
+    still fresh are skipped. Returns the error, if any, and the written outfiles mapped to
+    their new manifest entries (``None`` when not caching). With *stream*, notebooks are
+    rewritten without being loaded, see :func:`codehere.processors.process_notebook`, which
+    *prune* and *canonical* are passed on to. With *fenced*, only tags inside fenced code blocks
+    of Markdown files count. *stats* collects timings and counters of the conversions.
+    """
+    written: dict[str, dict | None] = {}
+    try:
+        input_digest = file_digest(infile) if entries is not None else None
+        document = None
+        for target, outfile in outputs:
+            options = make_options(
+                solution=target == "solution",
+                clear=clear,
+                replacement=replacement,
+                prune=prune,
+                canonical=canonical,
+                fenced=fenced,
+                stream=stream,
+            )
+            if entries is not None and is_fresh(entries.get(outfile), input_digest, outfile, options):
+                continue
+            os.makedirs(os.path.dirname(outfile) or ".", exist_ok=True)
+            if stream and infile.endswith(".ipynb"):
+                process_notebook(
+                    infile,
+                    outfile,
+                    solution=target == "solution",
+                    clear=clear,
+                    replacement=replacement,
+                    stream=True,
+                    prune=prune,
+                    stats=stats,
+                )
+            else:
+                if document is None:
+                    document = compile_file(infile, fenced=fenced, stats=stats)
+                document.write(
+                    outfile,
+                    solution=target == "solution",
+                    clear=clear,
+                    replacement=replacement,
+                    prune=prune,
+                    canonical=canonical,
+                )
+            written[outfile] = make_entry(infile, input_digest, outfile, options) if entries is not None else None
+    except (CodehereError, OSError, ValueError, KeyError) as e:
+        # A notebook without cells or cell types is reported like invalid JSON.
+        return e, written
+    return None, written
+
+
+def _convert_job(job: tuple) -> tuple[Exception | None, dict[str, dict | None], Stats | None]:
+    infile, outputs, clear, replacement, entries, stream, prune, canonical, fenced, collect_stats = job
+    # Workers collect their own stats, which are sent back and merged.
+    stats = Stats() if collect_stats else None
+    error, written = convert_one(
+        infile,
+        outputs,
+        clear=clear,
+        replacement=replacement,
+        entries=entries,
+        stream=stream,
+        prune=prune,
+        canonical=canonical,
+        fenced=fenced,
+        stats=stats,
+    )
+    return error, written, stats
+
+
+def convert_many(
+    paths: list[str],
+    outdir: str,
+    *,
+    targets: list[str] | tuple[str, ...] = ("task",),
+    jobs: int | None = 1,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    cache: BuildCache | None = None,
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    fenced: bool = False,
+    stats: Stats | None = None,
+) -> BatchReport:
+    """Convert files, directories and glob patterns into a mirrored tree under *outdir*.
+
+    Files are spread over *jobs* worker processes (all CPUs when ``None``). With a *cache*,
+    outputs that are still fresh are skipped and the manifest is saved at the end. *stream*,
+    *prune*, *canonical* and *fenced* are passed on to :func:`convert_one`, and *stats* receives
+    the timings of all workers.
+    """
+    plan = plan_outputs(paths, outdir, targets=targets)
+    batch = [
+        (
+            infile,
+            outputs,
+            clear,
+            replacement,
+            {outfile: cache.entry(outfile) for _, outfile in outputs} if cache is not None else None,
+            stream,
+            prune,
+            canonical,
+            fenced,
+            stats is not None,
+        )
+        for infile, outputs in plan
+    ]
+    jobs = jobs or os.cpu_count() or 1
+
+    if jobs == 1 or len(batch) <= 1:
+        results = list(map(_convert_job, batch))
+    else:
+        chunksize = max(1, len(batch) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=min(jobs, len(batch))) as executor:
+            results = list(executor.map(_convert_job, batch, chunksize=chunksize))
+
+    failures = []
+    written = 0
+    for (infile, _), (error, outputs, job_stats) in zip(plan, results):
+        if job_stats is not None:
+            stats.merge(job_stats)
+        if error is not None:
+            failures.append((infile, error))
+        written += len(outputs)
+        if cache is not None:
+            cache.update(outputs)
+    if cache is not None:
+        cache.save()
+    return BatchReport(len(plan), written, failures)
+
+
+def format_failures(failures: list[tuple[str, Exception]], total: int) -> str:
+    """One line per failed input with its error, which already names the tag line and cell."""
+    lines = [f"{infile}: {type(error).__name__}: {error}" for infile, error in failures]
+    lines.append(f"{len(failures)} of {total} files failed")
+    return "\n".join(lines) + "\n"
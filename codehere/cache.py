@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING
+
+from codehere.utils import DEFAULT_CACHE_FILE
+
+if TYPE_CHECKING:
+    from codehere.prune import PrunePolicy
+
+
+def _version() -> str:
+    from codehere import __version__
+
+    return __version__
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def make_options(
+    *,
+    solution: bool = False,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    fenced: bool = False,
+    stream: bool = False,
+) -> dict:
+    options = {"solution": solution, "clear": clear, "replacement": replacement}
+    # Later options are only added when set, so that older manifests stay valid.
+    if prune is not None:
+        options["prune"] = prune.as_options()
+    if canonical:
+        options["canonical"] = True
+    if fenced:
+        options["fenced"] = True
+    if stream:
+        # A streamed notebook keeps the input's JSON layout instead of the compact one.
+        options["stream"] = True
+    return options
+
+
+def make_entry(infile: str, input_digest: str, outfile: str, options: dict) -> dict:
+    """Manifest entry for *outfile*, freshly written from *infile* with *options*."""
+    stat = os.stat(outfile)
+    return {
+        "input": infile,
+        "input_sha256": input_digest,
+        "version": _version(),
+        "options": options,
+        "output_sha256": file_digest(outfile),
+        "output_size": stat.st_size,
+        "output_mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def is_fresh(entry: dict | None, input_digest: str, outfile: str, options: dict) -> bool:
+    """Whether *outfile* is still the unmodified output of the same input, version and options."""
+    if entry is None:
+        return False
+    if (entry["input_sha256"], entry["version"], entry["options"]) != (input_digest, _version(), options):
+        return False
+    try:
+        stat = os.stat(outfile)
+    except OSError:
+        return False
+    if (stat.st_size, stat.st_mtime_ns) == (entry["output_size"], entry["output_mtime_ns"]):
+        return True
+    # Touched but possibly unchanged, e.g. after a checkout: fall back to the content hash.
+    return stat.st_size == entry["output_size"] and file_digest(outfile) == entry["output_sha256"]
+
+
+class BuildCache:
+    """Manifest of previously written outputs, used to skip conversions whose result would not change.
+
+    Entries are keyed by output path, relative to the directory holding the manifest.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_FILE) -> None:
+        self.path = path
+        self.root = os.path.dirname(os.path.abspath(path))
+        try:
+            with open(path) as f:
+                self.entries: dict[str, dict] = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def key(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def entry(self, outfile: str) -> dict | None:
+        return self.entries.get(self.key(outfile))
+
+    def is_fresh(self, infile: str, outfile: str, options: dict, input_digest: str | None = None) -> bool:
+        return is_fresh(self.entry(outfile), input_digest or file_digest(infile), outfile, options)
+
+    def record(self, infile: str, outfile: str, options: dict, input_digest: str | None = None) -> None:
+        self.entries[self.key(outfile)] = make_entry(
+            self.key(infile), input_digest or file_digest(infile), outfile, options
+        )
+
+    def update(self, entries: dict[str, dict]) -> None:
+        """Merge entries made by :func:`make_entry`, keyed and referring to paths as given."""
+        for outfile, entry in entries.items():
+            self.entries[self.key(outfile)] = {**entry, "input": self.key(entry["input"])}
+
+    def find_output(self, infile: str, options: dict) -> str | None:
+        """Path of an output previously recorded for *infile* with *options*, if any."""
+        infile_key = self.key(infile)
+        for key, entry in self.entries.items():
+            if entry["input"] == infile_key and entry["options"] == options:
+                return os.path.relpath(os.path.join(self.root, key))
+        return None
+
+    def invalidate(self, infiles: list[str] | None = None) -> int:
+        """Forget outputs of *infiles* (all outputs when ``None``); return how many were dropped."""
+        if infiles is None:
+            dropped = len(self.entries)
+            self.entries.clear()
+            return dropped
+        keys = {self.key(infile) for infile in infiles}
+        stale = [key for key, entry in self.entries.items() if entry["input"] in keys]
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
+
+    def save(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
@@ -0,0 +1,99 @@
+"""Tag validation without rendering or writing anything, see :func:`check_many`."""
+
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import NamedTuple
+
+from codehere import markdown
+from codehere.converter import Converter
+from codehere.document import _source_lines, cell_error
+from codehere.exceptions import CodehereError, TagError
+from codehere.processors import _unsupported
+from codehere.utils import collect_inputs, split_lines
+
+# Below this many files, starting worker processes costs more than checking the files.
+MIN_FILES_PER_JOB = 256
+
+
+class CheckReport(NamedTuple):
+    total: int
+    problems: list[tuple[str, Exception]]
+
+
+def check_file(infile: str, converter: Converter | None = None, *, fenced: bool = False) -> list[TagError]:
+    """Every tag error of *infile*, in order; errors in notebooks name their cell.
+
+    With *fenced*, only tags inside fenced code blocks of Markdown files are checked.
+    """
+    converter = converter or Converter()
+    if infile.endswith((".py", ".md")):
+        with open(infile) as f:
+            lines = f.readlines()
+        if fenced and infile.endswith(".md"):
+            return markdown.check_lines(converter, lines)
+        return converter.check_lines(lines)
+    if not infile.endswith(".ipynb"):
+        raise _unsupported(infile)
+
+    # json.loads decodes typical notebooks several times faster than the streaming scanner
+    # walks them, outputs included; only huge outputs would make the scanner worth it.
+    with open(infile, "rb") as f:
+        notebook = json.loads(f.read())
+    errors: list[TagError] = []
+    for cell_index, cell in enumerate(notebook["cells"]):
+        if cell["cell_type"] == "code":
+            lines = _source_lines(cell["source"])
+            errors.extend(cell_error(error, cell_index) for error in converter.check_lines(lines))
+    return errors
+
+
+def check_text(text: str, *, fenced: bool = False) -> list[TagError]:
+    """Every tag error of the content of a .py or .md file held in memory, see :func:`check_file`."""
+    if fenced:
+        return markdown.check_lines(Converter(), split_lines(text))
+    return Converter().check_lines(split_lines(text))
+
+
+def _check_job(infiles: list[str], fenced: bool = False) -> list[tuple[str, Exception]]:
+    converter = Converter()
+    problems: list[tuple[str, Exception]] = []
+    for infile in infiles:
+        try:
+            problems.extend((infile, error) for error in check_file(infile, converter, fenced=fenced))
+        except (CodehereError, OSError, ValueError, KeyError) as e:
+            # A notebook without cells or cell types is reported like invalid JSON.
+            problems.append((infile, e))
+    return problems
+
+
+def check_many(paths: list[str], *, jobs: int | None = None, fenced: bool = False) -> CheckReport:
+    """Check files, directories and glob patterns; return every problem found, by input.
+
+    Inputs that cannot be read or parsed are reported with their error. Checking is spread
+    over *jobs* worker processes (all CPUs when ``None``) when there are enough files for it.
+    *fenced* is passed on to :func:`check_file`.
+    """
+    infiles = [str(infile) for infile, _ in collect_inputs(paths)]
+    jobs = min(jobs or os.cpu_count() or 1, len(infiles) // MIN_FILES_PER_JOB)
+    if jobs <= 1:
+        return CheckReport(len(infiles), _check_job(infiles, fenced))
+
+    # Contiguous chunks keep the problems in input order.
+    size = -(-len(infiles) // (jobs * 4))
+    chunks = [infiles[start : start + size] for start in range(0, len(infiles), size)]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        problems = [problem for chunk in executor.map(_check_job, chunks, repeat(fenced)) for problem in chunk]
+    return CheckReport(len(infiles), problems)
+
+
+def format_problems(report: CheckReport) -> str:
+    """One line per problem, then a summary line."""
+    lines = [f"{infile}: {type(error).__name__}: {error}" for infile, error in report.problems]
+    files = len({infile for infile, _ in report.problems})
+    if report.problems:
+        lines.append(f"{len(report.problems)} problems in {files} of {report.total} files")
+    else:
+        lines.append(f"Checked {report.total} files: no problems")
+    return "\n".join(lines) + "\n"
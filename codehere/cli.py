@@ -1,19 +1,79 @@
 import argparse
+import os
 import sys
+from typing import TYPE_CHECKING
 
-from codehere.processors import process_file
-from codehere.utils import get_outfile_path
+from codehere.utils import ARCHIVE_FORMATS, DEFAULT_CACHE_FILE, FORMATS, GLOB_CHARS
+
+if TYPE_CHECKING:
+    from codehere.cache import BuildCache
+    from codehere.prune import PrunePolicy
+    from codehere.stats import Stats
+
+# Everything else is imported by the command that needs it: the CLI runs once per file in
+# grading pipelines, so --help, --version and single .py conversions must start fast.
 
 
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Prepare Jupyter notebooks, Python files, and Markdown for seminars and homework.",
+        epilog="Run 'codehere serve --help' for the long-running JSON-lines service, "
+        "and 'codehere merge --help' to merge student submissions back into a template.",
+    )
+    parser.add_argument(
+        "file", type=str, nargs="+", help="path to input file, directory or glob pattern, or - for standard input"
+    )
+    parser.add_argument("--outfile", type=str, help="path to output file, or - for standard output")
+    parser.add_argument("--format", choices=FORMATS, help="format of the content read from - (standard input)")
+    parser.add_argument("--outdir", type=str, help="output directory mirroring the inputs (batch mode)")
+    parser.add_argument(
+        "--archive", type=str, metavar="PATH", help="write all outputs into one zip or tar archive, or - for stdout"
+    )
+    parser.add_argument(
+        "--archive-format", choices=ARCHIVE_FORMATS, help="format of --archive (default: from its extension)"
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="worker processes in batch mode, 0 for all CPUs (default: 1, or all CPUs for --check)",
     )
-    parser.add_argument("file", type=str, help="path to input file")
-    parser.add_argument("--outfile", type=str, help="path to output file")
     parser.add_argument("--clear", action="store_true", help="clear code cells outputs (notebooks only)")
-    parser.add_argument("--solution", action="store_true", help="keep solution code instead of replacing with NotImplementedError")
+    variant = parser.add_mutually_exclusive_group()
+    variant.add_argument("--solution", action="store_true", help="keep solution code instead of replacing with NotImplementedError")
+    variant.add_argument("--both", action="store_true", help="write both task and solution versions from a single read")
     parser.add_argument("--replacement", type=str, default=" Your code here ", help="text for the 'your code here' banner")
+    parser.add_argument("--stream", action="store_true", help="rewrite notebooks without loading their outputs")
+    parser.add_argument(
+        "--canonical", action="store_true", help="write notebooks in Jupyter's layout (indent 1, sorted keys)"
+    )
+    parser.add_argument("--fenced", action="store_true", help="in Markdown, only render tags inside fenced code blocks")
+    prune = parser.add_argument_group("output pruning", "keep code cells outputs, minus their heavy parts")
+    prune.add_argument(
+        "--max-output-bytes", type=int, metavar="N", help="drop output items over N bytes, truncate streams to N bytes"
+    )
+    prune.add_argument(
+        "--allow-mime", action="append", metavar="PATTERN", help="keep only MIME types matching PATTERN, e.g. 'text/*'"
+    )
+    prune.add_argument("--deny-mime", action="append", metavar="PATTERN", help="drop MIME types matching PATTERN")
+    prune.add_argument("--max-stream-lines", type=int, metavar="N", help="truncate stdout/stderr outputs to N lines")
+    prune.add_argument("--strip-execution-count", action="store_true", help="reset execution counts")
+    prune.add_argument(
+        "--strip-metadata", action="store_true", help="drop output metadata, widget state and most cell metadata"
+    )
+    parser.add_argument("--incremental", action="store_true", help="skip outputs that are up to date with their inputs")
+    parser.add_argument("--cache-file", type=str, default=DEFAULT_CACHE_FILE, help="manifest used by --incremental")
+    parser.add_argument("--watch", action="store_true", help="stay running and re-render inputs whenever they are saved")
+    parser.add_argument("--invalidate", action="store_true", help="forget cached builds of the inputs and exit")
+    parser.add_argument(
+        "--check", action="store_true", help="only validate the tags of the inputs, report every error and exit"
+    )
+    parser.add_argument("--stats", action="store_true", help="report time per stage and counters")
+    parser.add_argument(
+        "--stats-format",
+        choices=["text", "json"],
+        help="format of --stats: text on stderr (default) or json on stdout",
+    )
     parser.add_argument("--version", action="version", version=f"%(prog)s {_get_version()}")
     return parser
 
@@ -24,18 +84,453 @@ def _get_version() -> str:
     return __version__
 
 
+def _is_batch(args: argparse.Namespace) -> bool:
+    return (
+        len(args.file) > 1
+        or args.outdir is not None
+        or any(os.path.isdir(path) or any(char in path for char in GLOB_CHARS) for path in args.file)
+    )
+
+
+def _batch_jobs(args: argparse.Namespace) -> int | None:
+    # Conversions are serial by default, -j 0 uses every CPU.
+    return 1 if args.jobs is None else args.jobs or None
+
+
+def _make_prune(parser: argparse.ArgumentParser, args: argparse.Namespace) -> "PrunePolicy | None":
+    if not (
+        args.max_output_bytes is not None
+        or args.allow_mime
+        or args.deny_mime
+        or args.max_stream_lines is not None
+        or args.strip_execution_count
+        or args.strip_metadata
+    ):
+        return None
+    for option, value in (("--max-output-bytes", args.max_output_bytes), ("--max-stream-lines", args.max_stream_lines)):
+        if value is not None and value < 0:
+            parser.error(f"{option} must not be negative")
+    from codehere.prune import PrunePolicy
+
+    return PrunePolicy(
+        max_output_bytes=args.max_output_bytes,
+        allow_mime=tuple(args.allow_mime) if args.allow_mime else None,
+        deny_mime=tuple(args.deny_mime or ()),
+        max_stream_lines=args.max_stream_lines,
+        strip_execution_count=args.strip_execution_count,
+        strip_metadata=args.strip_metadata,
+    )
+
+
+def _make_stats(args: argparse.Namespace) -> "Stats | None":
+    if not args.stats:
+        return None
+    from codehere.stats import Stats
+
+    return Stats()
+
+
+def _report_stats(args: argparse.Namespace, stats: "Stats | None") -> None:
+    if stats is None:
+        return
+    if args.stats_format == "json":
+        import json
+
+        print(json.dumps(stats.as_dict(), indent=1))
+    else:
+        print(stats.format(), file=sys.stderr)
+
+
+def _run_batch(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    from codehere.batch import convert_many, format_failures
+    from codehere.cache import BuildCache
+    from codehere.document import TARGETS
+
+    if args.outfile is not None:
+        parser.error("--outfile cannot be used with several inputs; use --outdir")
+    if args.outdir is None:
+        parser.error("--outdir is required for directories, globs and several inputs")
+
+    targets = TARGETS if args.both else ["solution" if args.solution else "task"]
+    stats = _make_stats(args)
+    try:
+        report = convert_many(
+            args.file,
+            args.outdir,
+            targets=targets,
+            jobs=_batch_jobs(args),
+            clear=args.clear,
+            replacement=args.replacement,
+            cache=BuildCache(args.cache_file) if args.incremental else None,
+            stream=args.stream,
+            prune=args.prune,
+            canonical=args.canonical,
+            fenced=args.fenced,
+            stats=stats,
+        )
+    except ValueError as e:
+        # Inputs colliding on one output, found before anything is written.
+        parser.error(str(e))
+    print(f"Saved {report.written} outputs of {report.total} files in:", args.outdir, file=sys.stderr)
+    _report_stats(args, stats)
+    if report.failures:
+        parser.exit(1, format_failures(report.failures, report.total))
+
+
+def _archive(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    from codehere.archive import archive_format, archive_many
+    from codehere.batch import format_failures
+    from codehere.document import TARGETS
+
+    if "-" in args.file:
+        parser.error("--archive cannot read from -")
+    for option in ("outfile", "outdir"):
+        if getattr(args, option) is not None:
+            parser.error(f"--{option} cannot be used with --archive")
+    for option in ("incremental", "watch", "check", "invalidate"):
+        if getattr(args, option):
+            parser.error(f"--{option} cannot be used with --archive")
+    to_stdout = args.archive == "-"
+    format = args.archive_format
+    if format is None:
+        if to_stdout:
+            parser.error("--archive-format is required to write an archive to -")
+        try:
+            format = archive_format(args.archive)
+        except ValueError as e:
+            parser.error(f"{e} Use --archive-format.")
+    if to_stdout and args.stats_format == "json":
+        parser.error("--stats-format json cannot be used when writing to standard output")
+
+    targets = TARGETS if args.both else ["solution" if args.solution else "task"]
+    stats = _make_stats(args)
+    try:
+        report = archive_many(
+            args.file,
+            sys.stdout.buffer if to_stdout else args.archive,
+            format=format,
+            targets=targets,
+            jobs=_batch_jobs(args),
+            clear=args.clear,
+            replacement=args.replacement,
+            stream=args.stream,
+            prune=args.prune,
+            canonical=args.canonical,
+            fenced=args.fenced,
+            stats=stats,
+        )
+    except ValueError as e:
+        # Inputs colliding on one entry, found before anything is written.
+        parser.error(str(e))
+    if to_stdout:
+        sys.stdout.buffer.flush()
+    else:
+        print(f"Saved {report.written} outputs of {report.total} files in:", args.archive, file=sys.stderr)
+    _report_stats(args, stats)
+    if report.failures:
+        parser.exit(1, format_failures(report.failures, report.total))
+
+
+def _watch(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    from codehere.document import TARGETS
+    from codehere.watch import Watcher
+
+    if args.outdir is None and any(
+        os.path.isdir(path) or any(char in path for char in GLOB_CHARS) for path in args.file
+    ):
+        parser.error("--outdir is required to watch directories and globs")
+
+    targets = TARGETS if args.both else ["solution" if args.solution else "task"]
+    try:
+        watcher = Watcher(
+            args.file,
+            args.outdir,
+            targets=targets,
+            clear=args.clear,
+            replacement=args.replacement,
+            prune=args.prune,
+            stream=args.stream,
+            canonical=args.canonical,
+            fenced=args.fenced,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print("Watching for changes, press Ctrl+C to stop", file=sys.stderr)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def _check(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    from codehere.check import check_many, format_problems
+
+    # Unlike conversions, checks use every CPU unless told otherwise: they only pay off for large trees.
+    report = check_many(args.file, jobs=args.jobs or None, fenced=args.fenced)
+    if report.problems:
+        parser.exit(1, format_problems(report))
+    print(format_problems(report), end="", file=sys.stderr)
+
+
+def _pipe(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    import io
+
+    from codehere.processors import process_stream
+
+    if len(args.file) > 1 or args.outdir is not None:
+        parser.error("- cannot be used with several inputs or --outdir")
+    for option in ("both", "incremental", "watch", "check", "invalidate"):
+        if getattr(args, option):
+            parser.error(f"--{option} cannot be used with -")
+    (infile,) = args.file
+    if infile == "-":
+        format = args.format
+        if format is None:
+            parser.error("--format is required to read from -")
+    else:
+        format = os.path.splitext(infile)[1].lstrip(".")
+        if format not in FORMATS:
+            parser.error(f"cannot tell the format of {infile}, supported: {', '.join(FORMATS)}")
+    to_stdout = args.outfile in (None, "-")
+    if to_stdout and args.stats_format == "json":
+        parser.error("--stats-format json cannot be used when writing to standard output")
+
+    stats = _make_stats(args)
+    src = sys.stdin.buffer if infile == "-" else open(infile, "rb")
+    dst = sys.stdout.buffer if to_stdout else io.BytesIO()
+    try:
+        process_stream(
+            src,
+            dst,
+            format,
+            solution=args.solution,
+            clear=args.clear,
+            replacement=args.replacement,
+            stream=args.stream,
+            prune=args.prune,
+            canonical=args.canonical,
+            fenced=args.fenced,
+            stats=stats,
+        )
+    finally:
+        if src is not sys.stdin.buffer:
+            src.close()
+    if not to_stdout:
+        from codehere.output import write_output
+
+        written = write_output(args.outfile, dst.getvalue())
+        print("Saved in:" if written else "Up to date:", args.outfile, file=sys.stderr)
+    _report_stats(args, stats)
+
+
+def _invalidate(args: argparse.Namespace) -> None:
+    from codehere.cache import BuildCache
+    from codehere.utils import collect_inputs
+
+    cache = BuildCache(args.cache_file)
+    dropped = cache.invalidate([str(infile) for infile, _ in collect_inputs(args.file)])
+    cache.save()
+    print(f"Invalidated {dropped} cached outputs in:", args.cache_file, file=sys.stderr)
+
+
+def build_serve_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="codehere serve",
+        description="Answer JSON-lines conversion requests on stdin/stdout (or a Unix socket) "
+        "until EOF or a shutdown request, keeping rendered cells cached between jobs.",
+    )
+    parser.add_argument("--socket", type=str, help="listen on this Unix socket instead of stdin/stdout")
+    parser.add_argument("--jobs", "-j", type=int, help="worker threads (default: CPUs + 4, at most 32)")
+    parser.add_argument("--cache-size", type=int, default=4096, help="rendered sources kept in memory")
+    return parser
+
+
+def _serve(argv: list[str]) -> None:
+    from codehere.converter import RenderCache
+    from codehere.serve import Service, UnixServer
+
+    args = build_serve_parser().parse_args(argv)
+    service = Service(jobs=args.jobs, render_cache=RenderCache(maxsize=args.cache_size))
+    try:
+        if args.socket is None:
+            service.serve(sys.stdin.buffer, sys.stdout.buffer)
+        else:
+            with UnixServer(args.socket, service) as server:
+                print("Listening on:", args.socket, file=sys.stderr)
+                server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+def build_merge_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="codehere merge",
+        description="Put the answers of submitted tasks back into the instructor's source, so that they can "
+        "be run with its tests. Reports answer regions that do not match the template and lines edited "
+        "outside of them.",
+    )
+    parser.add_argument("template", type=str, help="instructor's source the tasks were rendered from")
+    parser.add_argument("submission", type=str, nargs="+", help="submitted task, directory or glob pattern")
+    parser.add_argument("--outdir", type=str, required=True, help="output directory mirroring the submissions")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="worker processes (default: all CPUs)")
+    parser.add_argument(
+        "--replacement", type=str, default=" Your code here ", help="text of the banner the tasks were rendered with"
+    )
+    return parser
+
+
+def _merge(argv: list[str]) -> None:
+    from codehere.merge import format_merge_report, merge_many
+
+    parser = build_merge_parser()
+    args = parser.parse_args(argv)
+    try:
+        report = merge_many(
+            args.template, args.submission, args.outdir, jobs=args.jobs or None, replacement=args.replacement
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    if report.failures:
+        parser.exit(1, format_merge_report(report))
+    print(format_merge_report(report), end="", file=sys.stderr)
+
+
 def main(argv: list[str] | None = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        _serve(argv[1:])
+        return
+    if argv[:1] == ["merge"]:
+        _merge(argv[1:])
+        return
+
     parser = build_parser()
     args = parser.parse_args(argv)
+    args.prune = _make_prune(parser, args)
+    if args.stream and args.canonical:
+        parser.error("--canonical cannot be used with --stream, which keeps the notebook's layout")
+    if args.format is not None and args.file != ["-"]:
+        parser.error("--format only applies to content read from -")
+
+    if args.archive_format is not None and args.archive is None:
+        parser.error("--archive-format only applies to --archive")
+    if args.stats_format is not None and not args.stats:
+        parser.error("--stats-format only applies to --stats")
+    if args.archive is not None:
+        _archive(parser, args)
+        return
+    if "-" in args.file or args.outfile == "-":
+        _pipe(parser, args)
+        return
+
+    if args.invalidate:
+        _invalidate(args)
+        return
+    if args.check:
+        if args.watch:
+            parser.error("--check cannot be used with --watch")
+        _check(parser, args)
+        return
+    if args.watch:
+        if args.stats:
+            parser.error("--stats cannot be used with --watch")
+        _watch(parser, args)
+        return
+    if _is_batch(args):
+        _run_batch(parser, args)
+        return
+    (args.file,) = args.file
+
+    from codehere.cache import BuildCache, make_options
+    from codehere.processors import compile_file, process_file
+
+    cache = BuildCache(args.cache_file) if args.incremental else None
+    stats = _make_stats(args)
+
+    if args.both:
+        if args.outfile is not None:
+            parser.error("--outfile cannot be used with --both")
+        document = None
+        for solution in (False, True):
+            options = make_options(
+                solution=solution,
+                clear=args.clear,
+                replacement=args.replacement,
+                prune=args.prune,
+                canonical=args.canonical,
+                fenced=args.fenced,
+                stream=args.stream,
+            )
+            outfile = _default_outfile(args.file, options, cache)
+            if cache is not None and cache.is_fresh(args.file, outfile, options):
+                print("Up to date:", outfile, file=sys.stderr)
+                continue
+            if args.stream and args.file.endswith(".ipynb"):
+                written = process_file(
+                    args.file,
+                    outfile,
+                    solution=solution,
+                    clear=args.clear,
+                    replacement=args.replacement,
+                    stream=True,
+                    prune=args.prune,
+                    stats=stats,
+                )
+            else:
+                if document is None:
+                    document = compile_file(args.file, fenced=args.fenced, stats=stats)
+                written = document.write(
+                    outfile,
+                    solution=solution,
+                    clear=args.clear,
+                    replacement=args.replacement,
+                    prune=args.prune,
+                    canonical=args.canonical,
+                )
+            if cache is not None:
+                cache.record(args.file, outfile, options)
+            print("Saved in:" if written else "Up to date:", outfile, file=sys.stderr)
+        if cache is not None:
+            cache.save()
+        _report_stats(args, stats)
+        return
 
     if args.outfile is None:
-        args.outfile = get_outfile_path(args.file, solution=args.solution)
+        options = make_options(
+            solution=args.solution,
+            clear=args.clear,
+            replacement=args.replacement,
+            prune=args.prune,
+            canonical=args.canonical,
+            fenced=args.fenced,
+            stream=args.stream,
+        )
+        args.outfile = _default_outfile(args.file, options, cache)
 
-    process_file(
+    written = process_file(
         args.file,
         args.outfile,
         solution=args.solution,
         clear=args.clear,
         replacement=args.replacement,
+        cache=cache,
+        stream=args.stream,
+        prune=args.prune,
+        canonical=args.canonical,
+        fenced=args.fenced,
+        stats=stats,
     )
-    print("Saved in:", args.outfile, file=sys.stderr)
+    if cache is not None:
+        cache.save()
+    print("Saved in:" if written else "Up to date:", args.outfile, file=sys.stderr)
+    _report_stats(args, stats)
+
+
+def _default_outfile(infile: str, options: dict, cache: "BuildCache | None") -> str:
+    from codehere.utils import get_outfile_path
+
+    # Reuse the output recorded for these options instead of picking a new unique name.
+    recorded = cache.find_output(infile, options) if cache is not None else None
+    return recorded or get_outfile_path(infile, solution=options["solution"])
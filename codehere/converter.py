@@ -1,6 +1,115 @@
+import _thread
+import os
 import re
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable, Iterator
+from typing import TYPE_CHECKING, NamedTuple
 
-from codehere.exceptions import NoOpenTagError, UnclosedTagError
+from codehere.exceptions import NoOpenTagError, TagError, UnclosedTagError
+
+if TYPE_CHECKING:
+    from codehere.stats import Stats
+
+
+class Block(NamedTuple):
+    """A tagged region: *begin* and *end* are the indexes of its tag lines."""
+
+    begin: int
+    end: int
+    kind: str
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    entries: int
+    bytes: int
+
+
+class RenderCache:
+    """Bounded LRU cache of rendered sources, keyed on the source lines and the render options.
+
+    Entries are evicted, least recently used first, once there are more than *maxsize*
+    of them or their text adds up to more than *max_bytes*; ``None`` disables either bound.
+    It can be shared by converters running in several threads.
+
+    Only :meth:`Converter.process_lines` consults it, as the watch mode, the ``serve`` command
+    and :mod:`codehere.aio` do. Compiled documents (batch conversions, archives, ``--both``)
+    find and render their blocks without it: their single scan per file costs less than
+    keying every cell, and a cache does not make shared cells measurably faster there.
+    """
+
+    def __init__(self, maxsize: int | None = 4096, max_bytes: int | None = 64 * 1024 * 1024) -> None:
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[list[str], int]] = OrderedDict()
+        # The low-level lock avoids importing threading, which costs more than this whole module.
+        self._lock = _thread.allocate_lock()
+
+    def get(self, key: Hashable) -> list[str] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: list[str], size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while (self.maxsize is not None and len(self._entries) > self.maxsize) or (
+                self.max_bytes is not None and self.bytes > self.max_bytes
+            ):
+                self.bytes -= self._entries.popitem(last=False)[1][1]
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, len(self._entries), self.bytes)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.bytes = 0
+
+
+class _Nesting:
+    """Stack of open tags, checking that blocks nest properly as their tags are met."""
+
+    def __init__(self) -> None:
+        self.stack: list[tuple[int, int]] = []
+
+    def kinds(self) -> list[int]:
+        return [kind for _, kind in self.stack]
+
+    def open(self, index: int, kind: int) -> None:
+        if kind in self.kinds():
+            raise UnclosedTagError("Unclosed tag in line: " + str(index), line=index)
+        self.stack.append((index, kind))
+
+    def close(self, index: int, kind: int) -> int:
+        """Close the innermost block, which must be of *kind*, and return the index of its first line."""
+        if self.stack and self.stack[-1][1] == kind:
+            return self.stack.pop()[0]
+        if kind in self.kinds():
+            # The innermost block of the other kind is cut by this tag.
+            begin = self.stack[-1][0]
+            raise UnclosedTagError("Unclosed tag in line: " + str(begin), line=begin)
+        raise NoOpenTagError("No open tag for line: " + str(index), line=index)
+
+    def finish(self) -> None:
+        if self.stack:
+            begin = self.stack.pop()[0]
+            raise UnclosedTagError("Unclosed tag in line: " + str(begin), line=begin)
 
 
 class Converter:
@@ -14,15 +123,57 @@ class Converter:
 
     CODE_REPLACEMENT = "raise NotImplementedError"
 
+    CODEHERE = "codehere"
+    COMMENT = "comment"
+
     def __init__(
         self,
         sep_begin: str = SEP_BEGIN,
         sep_end: str = SEP_END,
         code_replacement: str | None = CODE_REPLACEMENT,
+        render_cache: RenderCache | None = None,
+        stats: "Stats | None" = None,
     ) -> None:
         self.begin_sep = sep_begin
         self.end_sep = sep_end
         self.code_replacement = code_replacement
+        self.render_cache = render_cache
+        self.stats = stats
+
+        self._begin_pattern = self.compile_tags(sep_begin)
+        self._end_pattern = self.compile_tags(sep_end)
+        # Groups of the combined pattern come in (begin, end) pairs, one pair per block kind.
+        self._kinds = (self.CODEHERE, self.COMMENT)
+        self._tags = (sep_begin, sep_end, self.COMMENT_BEGIN, self.COMMENT_END)
+        self._tag_pattern = self.compile_tags(*self._tags)
+        # Every tag line holds this common prefix of the tags, so plain substring searches rule
+        # out whole sources, then most lines of the others, before any regex runs.
+        self._sentinel = os.path.commonprefix(self._tags)
+
+    @classmethod
+    def compile_tags(cls, *tags: str) -> re.Pattern:
+        """Compile one pattern matching a line that holds any of *tags*, each in its own group."""
+        alternatives = "|".join("(" + re.escape(tag) + ")" for tag in tags)
+        return re.compile(cls.SEP_TEMPLATE.format("(?:" + alternatives + ")"))
+
+    def has_tags(self, source: str | list[str]) -> bool:
+        """Whether *source* may hold tags; when it does not, rendering returns it unchanged."""
+        text = source if isinstance(source, str) else "".join(source)
+        if self._sentinel:
+            return self._sentinel in text
+        return any(tag in text for tag in self._tags)
+
+    def _tag_lines(self, lines: list[str]) -> Iterator[tuple[int, re.Match]]:
+        """Index and match of every tag line of *lines*; only lines holding the sentinel are matched."""
+        if not self.has_tags(lines):
+            return
+        match = self._tag_pattern.match
+        sentinel = self._sentinel
+        for index, line in enumerate(lines):
+            if sentinel in line:
+                found = match(line)
+                if found is not None:
+                    yield index, found
 
     def check_separators_consistency(self, lines: list[str]) -> None:
         stack: list[int] = []
@@ -31,20 +182,22 @@ class Converter:
                 stack.append(index)
             if self.is_end_sep(line):
                 if len(stack) == 0:
-                    raise NoOpenTagError("No open tag for line: " + str(index))
+                    raise NoOpenTagError("No open tag for line: " + str(index), line=index)
                 stack.pop()
 
             if len(stack) > 1:
-                raise UnclosedTagError("Unclosed tag in line: " + str(stack.pop()))
+                index = stack.pop()
+                raise UnclosedTagError("Unclosed tag in line: " + str(index), line=index)
 
         if len(stack) != 0:
-            raise UnclosedTagError("Unclosed tag in line: " + str(stack.pop()))
+            index = stack.pop()
+            raise UnclosedTagError("Unclosed tag in line: " + str(index), line=index)
 
     def is_begin_sep(self, line: str) -> re.Match | None:
-        return re.search(self.SEP_TEMPLATE.format(self.begin_sep), line)
+        return self._begin_pattern.match(line)
 
     def is_end_sep(self, line: str) -> re.Match | None:
-        return re.search(self.SEP_TEMPLATE.format(self.end_sep), line)
+        return self._end_pattern.match(line)
 
     def is_sep(self, line: str) -> re.Match | None:
         return self.is_begin_sep(line) or self.is_end_sep(line)
@@ -53,41 +206,239 @@ class Converter:
         self.check_separators_consistency(lines)
         return [index for index, line in enumerate(lines) if self.is_sep(line)]
 
-    def render_text_block(self, lines: list[str], begin_rep: str, end_rep: str) -> list[str]:
-        lines = list(lines)
-        rev_sep_indexes = list(reversed(self.get_separators_indexes(lines)))
-        if not rev_sep_indexes:
-            return lines
-        for begin, end in zip(rev_sep_indexes[1::2], rev_sep_indexes[::2]):
-            if self.code_replacement is None:
-                middle = [
-                    lines[begin].replace(self.begin_sep, begin_rep),
-                    *lines[begin + 1 : end],
-                    lines[end].replace(self.end_sep, end_rep),
-                ]
+    def find_blocks(self, lines: list[str]) -> list[Block]:
+        """Find codehere and comment blocks of *lines* in one pass, ordered by their first line.
+
+        Blocks of the same kind cannot be nested, and blocks of different kinds
+        must either be disjoint or one must contain the other.
+        """
+        if self.stats is None:
+            return self._find_blocks(lines)
+        with self.stats.stage("scan"):
+            blocks = self._find_blocks(lines)
+        self.stats.add("lines", len(lines))
+        self.stats.add("blocks", len(blocks))
+        return blocks
+
+    def check_lines(self, lines: list[str]) -> list[TagError]:
+        """Every tag error of *lines*, in line order.
+
+        :meth:`find_blocks` raises the first error its scan meets, which is one of these but need
+        not have the lowest line: of several blocks left open, it names the innermost one.
+
+        After an error the scan goes on as if the offending tag was not there, or, for a tag
+        closing an outer block, as if the inner unclosed blocks had been closed.
+        """
+        errors: list[TagError] = []
+        nesting = _Nesting()
+        for index, found in self._tag_lines(lines):
+            kind, is_end = divmod(found.lastindex - 1, 2)
+            try:
+                if is_end:
+                    nesting.close(index, kind)
+                else:
+                    nesting.open(index, kind)
+            except UnclosedTagError as e:
+                errors.append(e)
+                if is_end:
+                    while nesting.stack.pop()[1] != kind:
+                        pass
+            except NoOpenTagError as e:
+                errors.append(e)
+        while nesting.stack:
+            try:
+                nesting.finish()
+            except UnclosedTagError as e:
+                errors.append(e)
+        errors.sort(key=lambda error: error.line)
+        return errors
+
+    def _find_blocks(self, lines: list[str]) -> list[Block]:
+        blocks: list[Block] = []
+        nesting = _Nesting()
+        for index, found in self._tag_lines(lines):
+            kind, is_end = divmod(found.lastindex - 1, 2)
+            if is_end:
+                blocks.append(Block(nesting.close(index, kind), index, self._kinds[kind]))
             else:
-                middle = [
-                    lines[begin].replace(self.begin_sep, begin_rep),
-                    lines[begin].replace(self.begin_sep, self.code_replacement),
-                    lines[end].replace(self.end_sep, end_rep),
-                ]
-            lines = lines[:begin] + middle + lines[end + 1 :]
-        return lines
+                nesting.open(index, kind)
+        nesting.finish()
 
-    def process_lines(self, lines: list[str], *, solution: bool = False, replacement: str = " Your code here ") -> list[str]:
-        """Run both codehere and comment tag passes on *lines*."""
+        blocks.sort()
+        return blocks
+
+    def iter_lines(
+        self,
+        lines: Iterable[str],
+        *,
+        solution: bool = False,
+        replacement: str = " Your code here ",
+    ) -> Iterator[str]:
+        """Lazily render *lines* like :meth:`process_lines`, holding only the open block in memory.
+
+        Lines outside blocks are yielded as soon as they are read; a block is yielded once it
+        is closed, so tag errors are raised before any line of the broken block is produced.
+        """
+        begin_rep = self.get_replacement(inner_string=replacement)
+        end_rep = self.get_replacement(inner_string="")
+        codehere, comment = 0, 1
+
+        nesting = _Nesting()
+        begin_lines: dict[int, str] = {}
+        # Rendered lines of the open top-level codehere block in solution mode.
+        held: list[str] = []
+        match = self._tag_pattern.match
+        sentinel = self._sentinel
+        for index, line in enumerate(lines):
+            found = match(line) if sentinel in line else None
+            if found is None:
+                if not nesting.stack:
+                    yield line
+                elif solution and nesting.kinds() == [codehere]:
+                    held.append(line)
+                continue
+
+            kind, is_end = divmod(found.lastindex - 1, 2)
+            if not is_end:
+                nesting.open(index, kind)
+                begin_lines[kind] = line
+                continue
+
+            nesting.close(index, kind)
+            begin_line = begin_lines.pop(kind)
+            if kind == comment:
+                removed = begin_line.replace(self.COMMENT_BEGIN, "")
+                rendered = [removed, removed, line.replace(self.COMMENT_END, "")]
+                if not nesting.stack:
+                    yield from rendered
+                elif solution:
+                    held += rendered
+            elif nesting.stack:
+                # Inside a comment block, which is replaced as a whole.
+                continue
+            elif solution:
+                rendered, held = held, []
+                yield begin_line.replace(self.begin_sep, begin_rep)
+                yield from rendered
+                yield line.replace(self.end_sep, end_rep)
+            else:
+                yield begin_line.replace(self.begin_sep, begin_rep)
+                yield begin_line.replace(self.begin_sep, self.CODE_REPLACEMENT)
+                yield line.replace(self.end_sep, end_rep)
+        nesting.finish()
+
+    def render_blocks(
+        self,
+        lines: list[str],
+        blocks: list[Block],
+        *,
+        solution: bool = False,
+        replacement: str = " Your code here ",
+    ) -> list[str]:
+        """Render *blocks* previously found in *lines* by :meth:`find_blocks`."""
+        if self.stats is not None:
+            with self.stats.stage("render"):
+                return self._render_blocks(lines, blocks, solution=solution, replacement=replacement)
+        return self._render_blocks(lines, blocks, solution=solution, replacement=replacement)
+
+    def _render_blocks(self, lines: list[str], blocks: list[Block], *, solution: bool, replacement: str) -> list[str]:
         begin_rep = self.get_replacement(inner_string=replacement)
         end_rep = self.get_replacement(inner_string="")
 
-        codehere_converter = Converter(code_replacement=None) if solution else Converter()
-        result = codehere_converter.render_text_block(lines, begin_rep=begin_rep, end_rep=end_rep)
+        edits: list[tuple[int, int, list[str]]] = []
+        for begin, end, kind in blocks:
+            if kind == self.COMMENT:
+                edits += self._block_edits(lines, begin, end, self.COMMENT_BEGIN, self.COMMENT_END, "", "", "")
+            else:
+                code_replacement = None if solution else self.CODE_REPLACEMENT
+                edits += self._block_edits(
+                    lines, begin, end, self.begin_sep, self.end_sep, begin_rep, end_rep, code_replacement
+                )
+        # A comment block inside a solution codehere block lies between the two tag edits.
+        edits.sort(key=lambda edit: edit[0])
+        return self.splice(lines, edits)
+
+    def render_text_block(self, lines: list[str], begin_rep: str, end_rep: str) -> list[str]:
+        sep_indexes = self.get_separators_indexes(lines)
+        edits: list[tuple[int, int, list[str]]] = []
+        for begin, end in zip(sep_indexes[::2], sep_indexes[1::2]):
+            edits += self._block_edits(
+                lines, begin, end, self.begin_sep, self.end_sep, begin_rep, end_rep, self.code_replacement
+            )
+        return self.splice(lines, edits)
+
+    @staticmethod
+    def _block_edits(
+        lines: list[str],
+        begin: int,
+        end: int,
+        begin_sep: str,
+        end_sep: str,
+        begin_rep: str,
+        end_rep: str,
+        code_replacement: str | None,
+    ) -> list[tuple[int, int, list[str]]]:
+        """Edits rendering one block; with no *code_replacement* only the tag lines are replaced."""
+        if code_replacement is None:
+            return [
+                (begin, begin + 1, [lines[begin].replace(begin_sep, begin_rep)]),
+                (end, end + 1, [lines[end].replace(end_sep, end_rep)]),
+            ]
+        middle = [
+            lines[begin].replace(begin_sep, begin_rep),
+            lines[begin].replace(begin_sep, code_replacement),
+            lines[end].replace(end_sep, end_rep),
+        ]
+        return [(begin, end + 1, middle)]
+
+    @staticmethod
+    def splice(lines: list[str], edits: list[tuple[int, int, list[str]]]) -> list[str]:
+        """Replace ``lines[start:stop]`` by the given lines for each edit, in one forward pass.
+
+        *edits* must be ordered by start; an edit starting inside an already applied one is skipped.
+        """
+        result: list[str] = []
+        position = 0
+        for start, stop, middle in edits:
+            if start < position:
+                continue
+            result.extend(lines[position:start])
+            result.extend(middle)
+            position = stop
+        result.extend(lines[position:])
+        return result
+
+    def process_lines(self, lines: list[str], *, solution: bool = False, replacement: str = " Your code here ") -> list[str]:
+        """Render both codehere and comment tags of *lines* with a single tag scan.
+
+        With a :class:`RenderCache`, a source already rendered with the same options costs one lookup.
+        Sources without tags are never cached: checking them costs less than the lookup.
+        """
+        if self.render_cache is None or not self.has_tags(lines):
+            return self._render_lines(lines, solution=solution, replacement=replacement)
+
+        key = (self.begin_sep, self.end_sep, solution, replacement, tuple(lines))
+        result = self.render_cache.get(key)
+        if result is None:
+            result = self._render_lines(lines, solution=solution, replacement=replacement)
+            self.render_cache.put(key, result, sum(map(len, lines)) + sum(map(len, result)))
+        return list(result)
+
+    def render_tagged(
+        self, lines: list[str], *, solution: bool = False, replacement: str = " Your code here "
+    ) -> list[str] | None:
+        """Like :meth:`process_lines`, but ``None`` without scanning *lines* when they hold no tags."""
+        if self.has_tags(lines):
+            return self.process_lines(lines, solution=solution, replacement=replacement)
+        if self.stats is not None:
+            self.stats.add("lines", len(lines))
+        return None
 
-        comment_converter = Converter(
-            sep_begin=self.COMMENT_BEGIN,
-            sep_end=self.COMMENT_END,
-            code_replacement="",
-        )
-        return comment_converter.render_text_block(result, begin_rep="", end_rep="")
+    def _render_lines(self, lines: list[str], *, solution: bool, replacement: str) -> list[str]:
+        blocks = self.find_blocks(lines)
+        if not blocks:
+            return list(lines)
+        return self.render_blocks(lines, blocks, solution=solution, replacement=replacement)
 
     @staticmethod
     def get_replacement(inner_string: str, desired_size: int = 30, symbol: str = "#") -> str:
@@ -0,0 +1,159 @@
+"""Find the notebook that the running kernel belongs to, for :func:`codehere.convert` without a file."""
+
+import json
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from time import monotonic
+from typing import NamedTuple
+from urllib.request import Request, urlopen
+
+DEFAULT_TIMEOUT = 5.0
+COLAB = "colab"
+
+# Kernel ID -> notebook path (or COLAB), for the life of the process: a kernel never moves
+# to another notebook, so servers are only asked once.
+_detected: dict[str, str] = {}
+
+
+class DetectedNotebook(NamedTuple):
+    """Where the current notebook was found: a *path* on disk, or its content in *notebook*."""
+
+    path: str
+    notebook: dict | None = None
+
+
+def kernel_id() -> str | None:
+    """ID of the running IPython kernel, taken from its connection file name."""
+    if "ipykernel" not in sys.modules:
+        return None
+    try:
+        import ipykernel
+
+        connection_file = Path(ipykernel.get_connection_file()).stem
+    except Exception:
+        return None
+    # kernel-<id>.json
+    return connection_file.split("-", 1)[-1]
+
+
+def vscode_notebook_path() -> str | None:
+    """VS Code stores the notebook path in IPython's user namespace."""
+    IPython = sys.modules.get("IPython")
+    ip = IPython.get_ipython() if IPython is not None else None
+    path = ip.user_ns.get("__vsc_ipynb_file__") if ip is not None else None
+    if path and Path(path).exists():
+        return str(path)
+    return None
+
+
+def fetch_colab_notebook(*, timeout: float = DEFAULT_TIMEOUT) -> dict | None:
+    """Current notebook content from Colab's frontend, or ``None`` outside Colab."""
+    if "google.colab" not in sys.modules:
+        return None
+    try:
+        from google.colab import _message
+
+        response = _message.blocking_request("get_ipynb", timeout_sec=timeout)
+    except Exception:
+        return None
+    if response and "ipynb" in response:
+        return response["ipynb"]
+    return None
+
+
+def colab_notebook_name(notebook: dict) -> str:
+    return notebook.get("metadata", {}).get("colab", {}).get("name") or "notebook.ipynb"
+
+
+def running_servers() -> list[dict]:
+    """Jupyter Server and classic Notebook servers running on this machine, from their runtime files."""
+    try:
+        from jupyter_core.paths import jupyter_runtime_dir
+    except ImportError:
+        return []
+    servers = []
+    for pattern in ("jpserver-*.json", "nbserver-*.json"):
+        for info_file in sorted(Path(jupyter_runtime_dir()).glob(pattern)):
+            try:
+                servers.append(json.loads(info_file.read_text()))
+            except (OSError, ValueError):
+                continue
+    return servers
+
+
+def session_path(server: dict, kernel: str, *, timeout: float = DEFAULT_TIMEOUT) -> str | None:
+    """Path of the notebook whose session runs *kernel* on *server*, if it exists on disk."""
+    request = Request(server["url"].rstrip("/") + "/api/sessions")
+    if server.get("token"):
+        request.add_header("Authorization", "token " + server["token"])
+    with urlopen(request, timeout=timeout) as response:
+        sessions = json.loads(response.read())
+    for session in sessions:
+        if session.get("kernel", {}).get("id") != kernel:
+            continue
+        path = session.get("notebook", {}).get("path") or session.get("path")
+        if path:
+            full = Path(server.get("root_dir") or server.get("notebook_dir") or "", path)
+            if full.exists():
+                return str(full)
+    return None
+
+
+def find_session_path(servers: list[dict], kernel: str, *, timeout: float = DEFAULT_TIMEOUT) -> str | None:
+    """Ask all *servers* at once for *kernel*'s notebook; give up on all of them after *timeout* seconds.
+
+    Unreachable or hung servers only cost the time left until the deadline.
+    """
+    if not servers:
+        return None
+    deadline = monotonic() + timeout
+    executor = ThreadPoolExecutor(max_workers=len(servers), thread_name_prefix="codehere-sessions")
+    try:
+        pending = {executor.submit(session_path, server, kernel, timeout=timeout) for server in servers}
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                return None
+            for future in done:
+                if future.exception() is None and future.result() is not None:
+                    return future.result()
+        return None
+    finally:
+        # Requests still in flight end on their own socket timeout; nobody waits for them.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def detect_notebook(*, timeout: float = DEFAULT_TIMEOUT) -> DetectedNotebook | None:
+    """Try to auto-detect the current notebook (VS Code, Colab, Jupyter, or the only one in the cwd).
+
+    Every lookup is bounded by *timeout* seconds. What was found for the running kernel is
+    remembered, so repeated calls only re-fetch the content on Colab, where it lives in the
+    browser, and never query Jupyter servers again.
+    """
+    path = vscode_notebook_path()
+    if path is not None:
+        return DetectedNotebook(path)
+
+    kernel = kernel_id()
+    cached = _detected.get(kernel) if kernel is not None else None
+    if cached is not None and cached != COLAB and Path(cached).exists():
+        return DetectedNotebook(cached)
+
+    if cached in (None, COLAB):
+        notebook = fetch_colab_notebook(timeout=timeout)
+        if notebook is not None:
+            if kernel is not None:
+                _detected[kernel] = COLAB
+            return DetectedNotebook(colab_notebook_name(notebook), notebook)
+
+    if kernel is not None:
+        path = find_session_path(running_servers(), kernel, timeout=timeout)
+        if path is not None:
+            _detected[kernel] = path
+            return DetectedNotebook(path)
+
+    notebooks = list(Path.cwd().glob("*.ipynb"))
+    if len(notebooks) == 1:
+        return DetectedNotebook(str(notebooks[0]))
+    return None
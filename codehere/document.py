@@ -0,0 +1,161 @@
+import os
+from typing import TYPE_CHECKING
+
+from codehere.converter import Block, Converter
+from codehere.exceptions import TagError
+from codehere.output import write_output
+from codehere.stats import stage
+from codehere.utils import split_lines
+
+if TYPE_CHECKING:
+    from codehere.prune import PrunePolicy
+
+TARGETS = ("task", "solution")
+
+
+def cell_error(error: TagError, cell_index: int) -> TagError:
+    """Return a copy of *error* that also names the notebook cell it was raised for."""
+    return type(error)(
+        (error.message or "") + " in cell: " + str(cell_index),
+        line=error.line,
+        cell=cell_index,
+    )
+
+
+def _source_lines(source: str | list[str]) -> list[str]:
+    # nbformat allows a cell source to be a single string as well as a list of lines.
+    return split_lines(source) if isinstance(source, str) else source
+
+
+class CompiledDocument:
+    """A parsed document whose tags have been found and checked once.
+
+    Rendering a variant (task or solution, any replacement banner) only rewrites
+    the tagged lines, so a document can be rendered many times cheaply.
+    """
+
+    def __init__(
+        self,
+        format: str,
+        *,
+        lines: list[str] | None = None,
+        blocks: list[Block] | None = None,
+        notebook: dict | None = None,
+        cell_blocks: dict[int, list[Block]] | None = None,
+        converter: Converter | None = None,
+        json_backend: str | None = None,
+    ) -> None:
+        self.format = format
+        self.lines = lines
+        self.blocks = blocks
+        self.notebook = notebook
+        self.cell_blocks = cell_blocks
+        self.converter = converter or Converter()
+        # The JSON backend able to write the notebook back, see codehere.jsonio.loads.
+        self.json_backend = json_backend
+
+    @classmethod
+    def from_lines(
+        cls, lines: list[str], format: str = "py", *, fenced: bool = False, converter: Converter | None = None
+    ) -> "CompiledDocument":
+        """With *fenced*, *lines* are Markdown whose tags only count inside fenced code blocks."""
+        converter = converter or Converter()
+        if fenced:
+            from codehere import markdown
+
+            return cls(format, lines=lines, blocks=markdown.find_blocks(converter, lines), converter=converter)
+        return cls(format, lines=lines, blocks=converter.find_blocks(lines), converter=converter)
+
+    @classmethod
+    def from_notebook(
+        cls, notebook: dict, *, converter: Converter | None = None, json_backend: str | None = None
+    ) -> "CompiledDocument":
+        converter = converter or Converter()
+        cell_blocks: dict[int, list[Block]] = {}
+        for cell_index, cell in enumerate(notebook["cells"]):
+            if cell["cell_type"] == "code":
+                try:
+                    cell_blocks[cell_index] = converter.find_blocks(_source_lines(cell["source"]))
+                except TagError as e:
+                    raise cell_error(e, cell_index) from e
+        if converter.stats is not None:
+            converter.stats.add("cells", len(cell_blocks))
+        return cls("ipynb", notebook=notebook, cell_blocks=cell_blocks, converter=converter, json_backend=json_backend)
+
+    def render(
+        self,
+        *,
+        solution: bool = False,
+        clear: bool = False,
+        replacement: str = " Your code here ",
+        prune: "PrunePolicy | None" = None,
+    ) -> list[str] | dict:
+        """Render lines for text documents, or a new notebook dict sharing unchanged cells."""
+        if self.notebook is None:
+            return self.converter.render_blocks(self.lines, self.blocks, solution=solution, replacement=replacement)
+
+        notebook = {**self.notebook}
+        if prune is not None:
+            from codehere.prune import prune_cell, prune_notebook_metadata
+
+            if prune.strip_metadata and "metadata" in notebook:
+                notebook["metadata"] = prune_notebook_metadata(notebook["metadata"])
+        cells = list(self.notebook["cells"])
+        for cell_index, blocks in self.cell_blocks.items():
+            if not blocks and not clear and prune is None:
+                continue
+            cell = dict(cells[cell_index])
+            if blocks:
+                source = cell["source"]
+                rendered = self.converter.render_blocks(
+                    _source_lines(source), blocks, solution=solution, replacement=replacement
+                )
+                cell["source"] = "".join(rendered) if isinstance(source, str) else rendered
+            if clear:
+                cell["outputs"] = []
+            if prune is not None:
+                prune_cell(cell, prune)
+            cells[cell_index] = cell
+        notebook["cells"] = cells
+        return notebook
+
+    def serialize(
+        self,
+        *,
+        solution: bool = False,
+        clear: bool = False,
+        replacement: str = " Your code here ",
+        prune: "PrunePolicy | None" = None,
+        canonical: bool = False,
+    ) -> str | bytes:
+        """Render a variant as it is written to a file: text for text documents, UTF-8 JSON for notebooks."""
+        rendered = self.render(solution=solution, clear=clear, replacement=replacement, prune=prune)
+        if self.notebook is None:
+            return "".join(rendered)
+        from codehere.jsonio import dumps
+
+        with stage(self.converter.stats, "serialize"):
+            return dumps(rendered, canonical=canonical, backend=self.json_backend)
+
+    def write(
+        self,
+        outfile: str,
+        *,
+        solution: bool = False,
+        clear: bool = False,
+        replacement: str = " Your code here ",
+        prune: "PrunePolicy | None" = None,
+        canonical: bool = False,
+    ) -> bool:
+        """Render a variant into *outfile*; return whether it was written or left unchanged.
+
+        Notebooks are written by :func:`codehere.jsonio.dumps`, in Jupyter's layout with *canonical*.
+        """
+        stats = self.converter.stats
+        text = self.serialize(solution=solution, clear=clear, replacement=replacement, prune=prune, canonical=canonical)
+        with stage(stats, "write"):
+            written = write_output(outfile, text)
+        if stats is not None:
+            stats.add("files")
+            stats.add("bytes_written", os.path.getsize(outfile))
+        return written
@@ -0,0 +1,65 @@
+"""Encoding of notebooks to JSON, with orjson when it is installed, see :func:`dumps` and :func:`loads`."""
+
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ("orjson", "json")
+
+
+def default_backend() -> str:
+    """``"orjson"`` when it is installed, unless the ``CODEHERE_JSON=json`` environment variable asks for the stdlib."""
+    if orjson is not None and os.environ.get("CODEHERE_JSON") != "json":
+        return "orjson"
+    return "json"
+
+
+def loads(data: str | bytes) -> tuple[Any, str | None]:
+    """Decode *data* with the stdlib; return the object and the backend to encode it back with.
+
+    The backend is ``"json"`` when *data* holds ``NaN`` or ``Infinity``, which orjson would
+    write as ``null``, and ``None`` (the default one) otherwise. They are spotted as they are
+    parsed, which costs nothing for the documents that do not hold them.
+    """
+    constants = []
+
+    def parse_constant(name: str) -> float:
+        constants.append(name)
+        return float(name)
+
+    obj = json.loads(data, parse_constant=parse_constant)
+    return obj, "json" if constants else None
+
+
+def dumps(obj, *, canonical: bool = False, backend: str | None = None) -> bytes:
+    """Encode *obj* as UTF-8 JSON.
+
+    The layout is compact by default. With *canonical*, it is the one of notebooks saved by
+    Jupyter: one-space indentation, sorted keys and a final newline, so outputs diff well.
+    The bytes only depend on *obj*. Both backends write the same ones, except for floats in
+    exponent notation (``1e20`` and ``1e-7`` with orjson, ``1e+20`` and ``1e-07`` with the
+    stdlib) and for non-finite floats: the stdlib writes ``NaN`` and ``Infinity``, which Jupyter
+    reads back, while orjson writes ``null``. Pass the *backend* given by :func:`loads` to
+    write such values back as they were read.
+    """
+    if canonical:
+        # Indentation sends the stdlib to its pure-Python encoder, but re-indenting orjson's
+        # two-space output costs as much, so this layout is always written by the stdlib.
+        return json.dumps(obj, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8") + b"\n"
+    backend = backend or default_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown JSON backend: {backend!r}. Expected one of: {', '.join(BACKENDS)}.")
+    if backend == "orjson":
+        if orjson is None:
+            raise ImportError("The orjson JSON backend is not installed")
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # orjson only encodes 64-bit integers, the stdlib takes the others.
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,118 @@
+"""Markdown documents whose tags only count inside fenced code blocks, see :func:`render_text`.
+
+Fences are found by substring searches over the whole text, so prose is never split into
+lines nor matched against the tags.
+"""
+
+from bisect import bisect_right
+from itertools import accumulate
+
+from codehere.converter import Block, Converter
+from codehere.exceptions import TagError
+from codehere.utils import split_lines
+
+FENCES = ("```", "~~~")
+
+
+def _fence_lines(text: str) -> list[tuple[int, int, str, str]]:
+    """``(start, end, fence, info)`` of every line of *text* starting with a fence, in order."""
+    lines = []
+    for marker in FENCES:
+        position = text.find(marker)
+        while position != -1:
+            start = text.rfind("\n", 0, position) + 1
+            end = text.find("\n", position)
+            end = len(text) if end == -1 else end
+            if not text[start:position].strip(" \t"):
+                line = text[position:end]
+                fence = line[: len(line) - len(line.lstrip(marker[0]))]
+                lines.append((start, end, fence, line[len(fence) :]))
+            position = text.find(marker, end)
+    lines.sort()
+    return lines
+
+
+def code_ranges(text: str) -> list[tuple[int, int]]:
+    """``(start, stop)`` offsets of the content of the fenced code blocks of *text*.
+
+    As in CommonMark, a fence of three or more backticks or tildes is closed by a fence of the
+    same character, at least as long and without an info string, and an unclosed fence runs to
+    the end of the document. Fences may be indented, like those of list items.
+    """
+    ranges = []
+    fence = None
+    for start, end, marker, info in _fence_lines(text):
+        if fence is None:
+            if marker[0] == "`" and "`" in info:
+                # Backticks in the info string make it inline code, not a fence.
+                continue
+            fence, content = marker, min(end + 1, len(text))
+        elif marker[0] == fence[0] and len(marker) >= len(fence) and not info.strip():
+            ranges.append((content, start))
+            fence = None
+    if fence is not None:
+        ranges.append((content, len(text)))
+    return ranges
+
+
+def code_spans(lines: list[str]) -> list[tuple[int, int]]:
+    """``(start, stop)`` line ranges of the content of the fenced code blocks of *lines*."""
+    # Code blocks start and stop at line boundaries, found back from the offsets of the lines.
+    starts = list(accumulate(map(len, lines), initial=0))
+    ranges = code_ranges("".join(lines))
+    return [(bisect_right(starts, start) - 1, bisect_right(starts, stop) - 1) for start, stop in ranges]
+
+
+def _shifted(error: TagError, offset: int) -> TagError:
+    """Copy of *error*, raised for a code block starting at line *offset*, numbering the lines of the document."""
+    line = error.line + offset
+    message = (error.message or "").rsplit(": ", 1)[0]
+    return type(error)(f"{message}: {line}", line=line, cell=error.cell)
+
+
+def render_text(
+    converter: Converter, text: str, *, solution: bool = False, replacement: str = " Your code here "
+) -> str:
+    """Render the tags of the fenced code blocks of *text*; the prose is copied as it is."""
+    if not converter.has_tags(text):
+        return text
+    pieces = []
+    position = 0
+    for start, stop in code_ranges(text):
+        code = split_lines(text[start:stop])
+        try:
+            rendered = converter.render_tagged(code, solution=solution, replacement=replacement)
+        except TagError as e:
+            raise _shifted(e, text.count("\n", 0, start)) from e
+        if rendered is not None:
+            pieces += (text[position:start], "".join(rendered))
+            position = stop
+    if not pieces:
+        return text
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def find_blocks(converter: Converter, lines: list[str]) -> list[Block]:
+    """Like :meth:`Converter.find_blocks`, but only tags inside fenced code blocks count.
+
+    Blocks cannot span several code blocks.
+    """
+    if not converter.has_tags(lines):
+        return []
+    blocks: list[Block] = []
+    for start, stop in code_spans(lines):
+        try:
+            found = converter.find_blocks(lines[start:stop])
+        except TagError as e:
+            raise _shifted(e, start) from e
+        blocks += [Block(begin + start, end + start, kind) for begin, end, kind in found]
+    return blocks
+
+
+def check_lines(converter: Converter, lines: list[str]) -> list[TagError]:
+    """Every tag error of the fenced code blocks of *lines*, in line order."""
+    if not converter.has_tags(lines):
+        return []
+    spans = code_spans(lines)
+    return [_shifted(error, start) for start, stop in spans for error in converter.check_lines(lines[start:stop])]
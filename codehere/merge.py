@@ -0,0 +1,319 @@
+"""Merging of students' answers back into the instructor's source, see :func:`merge_many`.
+
+A submission is a task rendered by codehere and filled in by a student: each answer sits
+between the two banners that replaced the tags of a codehere block. Merging puts those
+answers into the blocks of the template, which keeps its comment blocks (the tests), so
+the result can be executed for grading.
+"""
+
+import json
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import NamedTuple
+
+from codehere.converter import Block, Converter
+from codehere.document import CompiledDocument, _source_lines
+from codehere.exceptions import CodehereError
+from codehere.output import write_output
+from codehere.processors import compile_file
+
+# Below this many submissions, starting worker processes costs more than merging them.
+MIN_FILES_PER_JOB = 64
+# Stripped from lines before they are compared to the banners, like the tags allow around them.
+_BANNER_PADDING = " \t\r\n;"
+
+# A line outside the answer regions: its code cell (None outside notebooks), index and text.
+Located = tuple[int | None, int, str]
+
+
+class MergeProblem(NamedTuple):
+    """Part of a submission that could not be merged as it is.
+
+    *kind* is ``"unmatched"`` for an answer region without a block in the template or a
+    block without an answer region, and ``"edited"`` for lines changed outside the answer
+    regions, which the merge replaces with those of the template. *line* and *cell* locate
+    the problem in the submission, or in the template for blocks without an answer.
+    """
+
+    kind: str
+    message: str
+    line: int
+    cell: int | None = None
+
+
+class MergeReport(NamedTuple):
+    total: int
+    merged: int
+    problems: list[tuple[str, MergeProblem]]
+    failures: list[tuple[str, Exception]]
+
+
+def _answer_blocks(blocks: list[Block]) -> list[Block]:
+    """Codehere blocks that are not inside a comment block, which students never see."""
+    answers = []
+    covered_until = -1
+    for block in blocks:
+        if block.kind == Converter.COMMENT:
+            covered_until = max(covered_until, block.end)
+        elif block.begin > covered_until:
+            answers.append(block)
+    return answers
+
+
+def _normalized(lines: Iterable[str]) -> list[str]:
+    # Compared like the lines of submissions, see MergeTemplate.match.
+    return [line.rstrip() for line in lines if line.strip()]
+
+
+class MergeTemplate:
+    """The answer slots of a template, indexed once to merge any number of submissions.
+
+    Slots are the codehere blocks outside comment blocks, in document order. Between them,
+    the template keeps the lines a student sees in the task, to tell which submissions were
+    edited elsewhere. *replacement* must be the banner text the task was rendered with.
+    """
+
+    def __init__(self, document: CompiledDocument, *, replacement: str = " Your code here ") -> None:
+        self.document = document
+        converter = document.converter
+        self.begin_banner = converter.get_replacement(inner_string=replacement).strip(_BANNER_PADDING)
+        self.end_banner = converter.get_replacement(inner_string="").strip(_BANNER_PADDING)
+        # Both banners hold this prefix, so other lines are ruled out without being stripped.
+        self._sentinel = os.path.commonprefix([self.begin_banner, self.end_banner])
+        # (cell, block) of every slot; the cell is None for text documents.
+        self.slots: list[tuple[int | None, Block]] = []
+        # Normalized task lines before the first slot, between slots, and after the last one.
+        self.gaps: list[list[str]] = [[]]
+        for cell, lines, blocks in self._sources():
+            position = 0
+            for block in _answer_blocks(blocks):
+                self.gaps[-1] += _normalized(converter.process_lines(lines[position : block.begin]))
+                self.slots.append((cell, block))
+                self.gaps.append([])
+                position = block.end + 1
+            self.gaps[-1] += _normalized(converter.process_lines(lines[position:]))
+
+    @classmethod
+    def from_file(cls, template: str, *, replacement: str = " Your code here ") -> "MergeTemplate":
+        return cls(compile_file(template), replacement=replacement)
+
+    def _sources(self) -> Iterator[tuple[int | None, list[str], list[Block]]]:
+        document = self.document
+        if document.notebook is None:
+            yield None, document.lines, document.blocks
+            return
+        cells = document.notebook["cells"]
+        for cell_index, blocks in document.cell_blocks.items():
+            yield cell_index, _source_lines(cells[cell_index]["source"]), blocks
+
+    def match(
+        self, sources: Iterable[tuple[int | None, Iterable[str]]]
+    ) -> tuple[list[list[str] | None], list[MergeProblem]]:
+        """Map the answer regions of a submission onto the slots, in one pass over its lines.
+
+        *sources* are the ``(cell, lines)`` of the code cells of a notebook, or ``(None, lines)``.
+        Returns the answer lines of each slot (``None`` for slots left without one) and the
+        problems found. Regions are matched to slots in order; a region whose end banner was
+        deleted leaves its slot without an answer.
+        """
+        problems: list[MergeProblem] = []
+        # An unclosed region is kept without its lines, so that the next ones keep their slots.
+        regions: list[tuple[int | None, int, list[str] | None]] = []
+        # Lines outside the regions, each gap starting where the previous region was closed;
+        # where an unclosed region ends is unknown, so the gap after it is not checked.
+        gaps: list[list[Located] | None] = [[]]
+        anchors: list[tuple[int | None, int]] = [(None, 0)]
+        gap: list[Located] = gaps[0]
+        region: list[str] | None = None
+        opened = (None, 0)
+        begin_banner, end_banner, sentinel = self.begin_banner, self.end_banner, self._sentinel
+        for cell, lines in sources:
+            for index, line in enumerate(lines):
+                mark = line.strip(_BANNER_PADDING) if sentinel in line else None
+                if region is None:
+                    if mark == begin_banner:
+                        region, opened = [], (cell, index)
+                    else:
+                        # Editors strip trailing spaces, comment blocks render to blank lines.
+                        stripped = line.rstrip()
+                        if stripped:
+                            gap.append((cell, index, stripped))
+                elif mark == end_banner:
+                    regions.append((*opened, region))
+                    gap = []
+                    gaps.append(gap)
+                    anchors.append((cell, index))
+                    region = None
+                elif mark == begin_banner:
+                    problems.append(_unclosed(opened))
+                    regions.append((*opened, None))
+                    gaps.append(None)
+                    anchors.append(opened)
+                    region, opened = [], (cell, index)
+                else:
+                    region.append(line)
+        if region is not None:
+            problems.append(_unclosed(opened))
+            regions.append((*opened, None))
+
+        for (cell, index), gap, expected in zip(anchors, gaps, self.gaps):
+            problem = None if gap is None else _edited(gap, expected, cell, index)
+            if problem is not None:
+                problems.append(problem)
+        for cell, index, _ in regions[len(self.slots) :]:
+            problems.append(MergeProblem("unmatched", "Answer region without a block in the template", index, cell))
+        for cell, block in self.slots[len(regions) :]:
+            message = f"No answer region for the template block in line: {block.begin}"
+            if cell is not None:
+                message += f" in cell: {cell}"
+            problems.append(MergeProblem("unmatched", message, block.begin, cell))
+        answers = [lines for _, _, lines in regions[: len(self.slots)]]
+        answers += [None] * (len(self.slots) - len(answers))
+        return answers, problems
+
+    def render(self, answers: list[list[str] | None]) -> list[str] | dict:
+        """The template with the body of each slot replaced by its answer, tags kept.
+
+        Slots without an answer raise ``NotImplementedError``, as in the task.
+        """
+        converter = self.document.converter
+        edits: dict[int | None, list[tuple[int, int, list[str]]]] = {}
+        for (cell, block), answer in zip(self.slots, answers):
+            lines = self._cell_lines(cell)
+            if answer is None:
+                answer = [lines[block.begin].replace(converter.begin_sep, converter.CODE_REPLACEMENT)]
+            edits.setdefault(cell, []).append((block.begin + 1, block.end, answer))
+
+        document = self.document
+        if document.notebook is None:
+            return converter.splice(document.lines, edits.get(None, []))
+        cells = list(document.notebook["cells"])
+        for cell_index, cell_edits in edits.items():
+            cell = dict(cells[cell_index])
+            source = cell["source"]
+            merged = converter.splice(_source_lines(source), cell_edits)
+            cell["source"] = "".join(merged) if isinstance(source, str) else merged
+            cells[cell_index] = cell
+        return {**document.notebook, "cells": cells}
+
+    def _cell_lines(self, cell: int | None) -> list[str]:
+        if cell is None:
+            return self.document.lines
+        return _source_lines(self.document.notebook["cells"][cell]["source"])
+
+    def merge(self, submission: str) -> tuple[str | bytes, list[MergeProblem]]:
+        """Merge the answers of the *submission* file; return the merged content and the problems."""
+        format = os.path.splitext(submission)[1].lstrip(".")
+        if format != self.document.format:
+            raise ValueError(f"Submission is not a .{self.document.format} file like the template: {submission}")
+        if self.document.notebook is None:
+            with open(submission) as f:
+                answers, problems = self.match([(None, f)])
+            return "".join(self.render(answers)), problems
+
+        with open(submission, "rb") as f:
+            notebook = json.loads(f.read())
+        answers, problems = self.match(_code_cells(notebook))
+        from codehere.jsonio import dumps
+
+        return dumps(self.render(answers), backend=self.document.json_backend), problems
+
+
+def _code_cells(notebook: dict) -> Iterator[tuple[int, list[str]]]:
+    for cell_index, cell in enumerate(notebook["cells"]):
+        if cell["cell_type"] == "code":
+            lines = _source_lines(cell["source"])
+            if lines and not lines[-1].endswith("\n"):
+                # Answers are spliced into the template, where more lines follow them.
+                lines = [*lines[:-1], lines[-1] + "\n"]
+            yield cell_index, lines
+
+
+def _unclosed(opened: tuple[int | None, int]) -> MergeProblem:
+    cell, index = opened
+    return MergeProblem("unmatched", "Answer region is never closed", index, cell)
+
+
+def _edited(found: list[Located], expected: list[str], cell: int | None, index: int) -> MergeProblem | None:
+    """Problem for the first line *found* in a gap that differs from the *expected* template lines, if any."""
+    for (line_cell, line_index, line), other in zip(found, expected):
+        if line != other:
+            return MergeProblem("edited", "Edited outside the answer regions", line_index, line_cell)
+    if len(found) > len(expected):
+        line_cell, line_index, _ = found[len(expected)]
+        return MergeProblem("edited", "Lines added outside the answer regions", line_index, line_cell)
+    if len(found) < len(expected):
+        return MergeProblem("edited", "Lines removed outside the answer regions", index, cell)
+    return None
+
+
+def merge_one(template: MergeTemplate, submission: str, outfile: str) -> tuple[Exception | None, list[MergeProblem]]:
+    """Merge *submission* into *outfile*; return the error instead of raising it, and the problems."""
+    try:
+        merged, problems = template.merge(submission)
+        os.makedirs(os.path.dirname(outfile) or ".", exist_ok=True)
+        write_output(outfile, merged)
+    except (CodehereError, OSError, ValueError, KeyError) as e:
+        # A notebook without cells or cell types is reported like invalid JSON.
+        return e, []
+    return None, problems
+
+
+def _merge_job(pairs: list[tuple[str, str]], template: MergeTemplate) -> list[tuple[Exception | None, list]]:
+    return [merge_one(template, submission, outfile) for submission, outfile in pairs]
+
+
+def merge_many(
+    template: str | MergeTemplate,
+    paths: list[str],
+    outdir: str,
+    *,
+    jobs: int | None = 1,
+    replacement: str = " Your code here ",
+) -> MergeReport:
+    """Merge submissions found in files, directories and glob patterns into *template*.
+
+    Merged files mirror the submissions under *outdir*. The template is indexed once, then
+    submissions are spread over *jobs* worker processes (all CPUs when ``None``) when there
+    are enough of them. Every submission is merged, and its problems reported, unless it
+    cannot be read or parsed: it is then reported as a failure.
+    """
+    from codehere.batch import plan_outputs
+
+    if not isinstance(template, MergeTemplate):
+        template = MergeTemplate.from_file(template, replacement=replacement)
+    pairs = [(infile, outfile) for infile, ((_, outfile),) in plan_outputs(paths, outdir)]
+    jobs = min(jobs or os.cpu_count() or 1, len(pairs) // MIN_FILES_PER_JOB)
+    if jobs <= 1:
+        results = _merge_job(pairs, template)
+    else:
+        # Contiguous chunks keep the results in input order, and send the template once per chunk.
+        size = -(-len(pairs) // (jobs * 4))
+        chunks = [pairs[start : start + size] for start in range(0, len(pairs), size)]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = [result for chunk in executor.map(_merge_job, chunks, repeat(template)) for result in chunk]
+
+    problems = []
+    failures = []
+    for (submission, _), (error, found) in zip(pairs, results):
+        if error is not None:
+            failures.append((submission, error))
+        problems += [(submission, problem) for problem in found]
+    return MergeReport(len(pairs), len(pairs) - len(failures), problems, failures)
+
+
+def format_merge_report(report: MergeReport) -> str:
+    """One line per problem and failure, then a summary line."""
+    lines = []
+    for submission, problem in report.problems:
+        where = f"line {problem.line}" if problem.cell is None else f"cell {problem.cell}, line {problem.line}"
+        lines.append(f"{submission}: {where}: {problem.kind}: {problem.message}")
+    lines += [f"{submission}: {type(error).__name__}: {error}" for submission, error in report.failures]
+    with_problems = len({submission for submission, _ in report.problems})
+    lines.append(
+        f"Merged {report.merged} of {report.total} submissions, {with_problems} with problems, "
+        f"{len(report.failures)} failed"
+    )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,79 @@
+"""Atomic writing of outputs that leaves unchanged files untouched, see :class:`AtomicOutput`."""
+
+import os
+import stat
+from _thread import get_ident
+from typing import IO
+
+_CHUNK_SIZE = 1 << 20
+
+
+def _same_content(path: str, other: str) -> bool:
+    """Whether two files hold the same bytes: sizes are compared first, then SHA-256 digests."""
+    try:
+        if os.path.getsize(path) != os.path.getsize(other):
+            return False
+    except FileNotFoundError:
+        return False
+    import hashlib
+
+    digests = []
+    for name in (path, other):
+        digest = hashlib.sha256()
+        with open(name, "rb") as f:
+            while chunk := f.read(_CHUNK_SIZE):
+                digest.update(chunk)
+        digests.append(digest.digest())
+    return digests[0] == digests[1]
+
+
+class AtomicOutput:
+    """Context manager writing *outfile* through a temporary file renamed over it once complete.
+
+    A failed or interrupted write removes the temporary file and never leaves *outfile*
+    truncated. When the new content is identical to the existing *outfile*, the temporary
+    file is dropped instead, so the output keeps its mtime and does not wake up anything
+    watching it. ``written`` tells which of the two happened::
+
+        with AtomicOutput("task.ipynb", "wb") as output:
+            output.file.write(data)
+        if output.written: ...
+    """
+
+    def __init__(self, outfile: str, mode: str = "w") -> None:
+        directory, name = os.path.split(outfile)
+        self.outfile = outfile
+        self.mode = mode
+        # Threads of one process may write the same outfile, so the name includes both ids.
+        self.tmp = os.path.join(directory, f".{name}.{os.getpid()}.{get_ident()}.tmp")
+        self.file: IO | None = None
+        self.written = False
+
+    def __enter__(self) -> "AtomicOutput":
+        self.file = open(self.tmp, self.mode)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            self.file.close()
+            if exc_type is None and not _same_content(self.tmp, self.outfile):
+                self._keep_mode()
+                os.replace(self.tmp, self.outfile)
+                self.written = True
+        finally:
+            if os.path.exists(self.tmp):
+                os.remove(self.tmp)
+
+    def _keep_mode(self) -> None:
+        try:
+            mode = stat.S_IMODE(os.stat(self.outfile).st_mode)
+        except FileNotFoundError:
+            return
+        os.chmod(self.tmp, mode)
+
+
+def write_output(outfile: str, data: str | bytes) -> bool:
+    """Atomically write *data* to *outfile*, unless it already holds it; return whether it was written."""
+    with AtomicOutput(outfile, "wb" if isinstance(data, bytes) else "w") as output:
+        output.file.write(data)
+    return output.written
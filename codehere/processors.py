@@ -1,8 +1,102 @@
-import json
+import copy
+import os
+from collections.abc import Callable
+from typing import TYPE_CHECKING, BinaryIO
 
+from codehere import markdown
 from codehere.converter import Converter
+from codehere.document import CompiledDocument, cell_error
 from codehere.exceptions import TagError, UnsupportedExtensionError
-from codehere.utils import SUPPORTED_EXTENSIONS
+from codehere.output import AtomicOutput, write_output
+from codehere.stats import Stats, current_stats, stage
+from codehere.utils import FORMATS, SUPPORTED_EXTENSIONS, split_lines
+
+if TYPE_CHECKING:
+    from codehere.cache import BuildCache
+    from codehere.prune import PrunePolicy
+
+# json, mmap, the notebook scanner, pruning and the build cache are imported where they are used,
+# so that converting a single .py or .md file from the CLI does not pay for them.
+
+
+def _instrumented(converter: Converter | None, stats: Stats | None) -> Converter:
+    """*converter* (or a new one) reporting to *stats*, sharing its patterns and render cache."""
+    if converter is None:
+        return Converter(stats=stats)
+    if stats is None or converter.stats is stats:
+        return converter
+    converter = copy.copy(converter)
+    converter.stats = stats
+    return converter
+
+
+def convert_text(
+    text: str | bytes,
+    *,
+    solution: bool = False,
+    replacement: str = " Your code here ",
+    fenced: bool = False,
+    converter: Converter | None = None,
+    stats: Stats | None = None,
+) -> str | bytes:
+    """Convert the content of a .py or .md file held in memory, returned as the same type.
+
+    Bytes are decoded and encoded back as UTF-8. Line endings are kept as they are. With
+    *fenced*, the text is Markdown whose tags only count inside fenced code blocks, see
+    :mod:`codehere.markdown`.
+    """
+    if isinstance(text, bytes):
+        return convert_text(
+            text.decode("utf-8"),
+            solution=solution,
+            replacement=replacement,
+            fenced=fenced,
+            converter=converter,
+            stats=stats,
+        ).encode("utf-8")
+    stats = stats if stats is not None else current_stats()
+    converter = _instrumented(converter, stats)
+    if fenced:
+        return markdown.render_text(converter, text, solution=solution, replacement=replacement)
+    return "".join(converter.process_lines(split_lines(text), solution=solution, replacement=replacement))
+
+
+def _process_text(
+    infile: str,
+    outfile: str,
+    *,
+    solution: bool,
+    replacement: str,
+    fenced: bool,
+    converter: Converter | None,
+    stats: Stats | None,
+) -> bool:
+    stats = stats if stats is not None else current_stats()
+    if stats is None and fenced:
+        # Fences are searched in the whole text, which beats going through the prose line by line.
+        with open(infile) as src:
+            text = src.read()
+        converter = converter or Converter()
+        return write_output(outfile, markdown.render_text(converter, text, solution=solution, replacement=replacement))
+    if stats is None:
+        # Lines are read, rendered and written as they come; only an open block is held in memory.
+        converter = converter or Converter()
+        with open(infile) as src, AtomicOutput(outfile) as output:
+            output.file.writelines(converter.iter_lines(src, solution=solution, replacement=replacement))
+        return output.written
+
+    # Streaming interleaves every stage, so instrumented runs read the whole file to time them apart.
+    with stats.stage("read"), open(infile) as src:
+        text = src.read()
+    text = convert_text(
+        text, solution=solution, replacement=replacement, fenced=fenced, converter=converter, stats=stats
+    )
+    with stats.stage("write"):
+        written = write_output(outfile, text)
+    stats.add("files")
+    stats.add("bytes_read", os.path.getsize(infile))
+    stats.add("bytes_written", os.path.getsize(outfile))
+    return written
 
 
 def process_py(
@@ -11,14 +105,13 @@ def process_py(
     *,
     solution: bool = False,
     replacement: str = " Your code here ",
-) -> None:
-    with open(infile) as f:
-        lines = f.readlines()
-
-    result = Converter().process_lines(lines, solution=solution, replacement=replacement)
-
-    with open(outfile, "w") as f:
-        f.writelines(result)
+    converter: Converter | None = None,
+    stats: Stats | None = None,
+) -> bool:
+    """Convert a Python file; return whether *outfile* was written, see :func:`process_file`."""
+    return _process_text(
+        infile, outfile, solution=solution, replacement=replacement, fenced=False, converter=converter, stats=stats
+    )
 
 
 def process_notebook(
@@ -28,26 +121,206 @@ def process_notebook(
     solution: bool = False,
     clear: bool = False,
     replacement: str = " Your code here ",
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    converter: Converter | None = None,
+    stats: Stats | None = None,
+) -> bool:
+    """Convert a notebook; return whether *outfile* was written, see :func:`process_file`.
+
+    With *clear*, code cells' outputs are removed. A *prune* policy drops only part of them,
+    see :class:`~codehere.prune.PrunePolicy`. The notebook is written compactly, or in
+    Jupyter's own layout with *canonical*, see :func:`codehere.jsonio.dumps`.
+
+    With *stream*, only cell types and code cell sources are decoded: the rest of the file,
+    outputs included, is copied through as raw bytes (or dropped with *clear*), keeping the
+    original layout, so output-heavy notebooks are never loaded as Python objects.
+
+    Passing a *converter* that has a :class:`~codehere.converter.RenderCache` lets cells seen
+    before, in this or earlier notebooks, be rendered with a single lookup.
+    """
+    stats = stats if stats is not None else current_stats()
+    if stream and canonical:
+        raise ValueError("A notebook rewritten with stream keeps its layout, it cannot be made canonical")
+    if stream:
+        import mmap
+
+        # Reading, scanning the JSON and writing happen together as the bytes are copied: all
+        # of it is timed as parsing, except the tag scan and render of each cell.
+        with open(infile, "rb") as src, mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            with AtomicOutput(outfile, "wb") as output:
+                _rewrite_notebook(
+                    buf,
+                    output.file.write,
+                    solution=solution,
+                    clear=clear,
+                    replacement=replacement,
+                    prune=prune,
+                    converter=converter,
+                    stats=stats,
+                )
+        written = output.written
+    else:
+        with stage(stats, "read"), open(infile, "rb") as f:
+            data = f.read()
+        data = convert_notebook_json(
+            data,
+            solution=solution,
+            clear=clear,
+            replacement=replacement,
+            prune=prune,
+            canonical=canonical,
+            converter=converter,
+            stats=stats,
+        )
+        with stage(stats, "write"):
+            written = write_output(outfile, data)
+    if stats is not None:
+        stats.add("files")
+        stats.add("bytes_read", os.path.getsize(infile))
+        stats.add("bytes_written", os.path.getsize(outfile))
+    return written
+
+
+def convert_notebook_dict(
+    notebook: dict,
+    *,
+    solution: bool = False,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    inplace: bool = False,
+    prune: "PrunePolicy | None" = None,
+    converter: Converter | None = None,
+    stats: Stats | None = None,
+) -> dict:
+    """Convert a notebook already loaded as a dict.
+
+    With *inplace*, the cells of *notebook* are changed and it is returned. Otherwise a new
+    dict is returned, and *notebook* is left untouched. Cells and outputs that need no change
+    are shared with *notebook*, not copied. *prune* is applied to the outputs left by *clear*.
+    """
+    stats = stats if stats is not None else current_stats()
+    converter = _instrumented(converter, stats)
+    if not inplace:
+        notebook = {**notebook, "cells": list(notebook["cells"])}
+    cells = notebook["cells"]
+    if prune is not None:
+        from codehere.prune import prune_cell, prune_notebook_metadata
+
+        if prune.strip_metadata and "metadata" in notebook:
+            notebook["metadata"] = prune_notebook_metadata(notebook["metadata"])
+
+    code_cells = 0
+    for cell_index, cell in enumerate(cells):
+        if cell["cell_type"] != "code":
+            continue
+        code_cells += 1
+        source = cell["source"]
+        lines = split_lines(source) if isinstance(source, str) else source
+        try:
+            rendered = converter.render_tagged(lines, solution=solution, replacement=replacement)
+        except TagError as e:
+            raise cell_error(e, cell_index) from e
+        if rendered is None and not clear and prune is None:
+            continue
+        if not inplace:
+            cell = cells[cell_index] = dict(cell)
+        if rendered is not None:
+            cell["source"] = "".join(rendered) if isinstance(source, str) else rendered
+        if clear:
+            cell["outputs"] = []
+        if prune is not None:
+            prune_cell(cell, prune)
+    if stats is not None:
+        stats.add("cells", code_cells)
+    return notebook
+
+
+def convert_notebook_json(
+    data: str | bytes,
+    *,
+    solution: bool = False,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    converter: Converter | None = None,
+    stats: Stats | None = None,
+) -> str | bytes:
+    """Convert a notebook held in memory as JSON text, returned as the same type.
+
+    With *stream*, only code cell sources are decoded and the rest is copied as it is,
+    see :func:`process_notebook`. Otherwise the output is written by :func:`codehere.jsonio.dumps`,
+    in Jupyter's layout with *canonical*.
+    """
+    stats = stats if stats is not None else current_stats()
+    if stream and canonical:
+        raise ValueError("A notebook rewritten with stream keeps its layout, it cannot be made canonical")
+    if stream:
+        chunks: list[bytes] = []
+        _rewrite_notebook(
+            data.encode("utf-8") if isinstance(data, str) else data,
+            chunks.append,
+            solution=solution,
+            clear=clear,
+            replacement=replacement,
+            prune=prune,
+            converter=converter,
+            stats=stats,
+        )
+        result = b"".join(chunks)
+        return result.decode("utf-8") if isinstance(data, str) else result
+
+    from codehere.jsonio import dumps, loads
+
+    with stage(stats, "parse"):
+        notebook, backend = loads(data)
+    convert_notebook_dict(
+        notebook,
+        solution=solution,
+        clear=clear,
+        replacement=replacement,
+        inplace=True,
+        prune=prune,
+        converter=converter,
+        stats=stats,
+    )
+    with stage(stats, "serialize"):
+        encoded = dumps(notebook, canonical=canonical, backend=backend)
+    return encoded.decode("utf-8") if isinstance(data, str) else encoded
+
+
+def _rewrite_notebook(
+    buf,
+    write: Callable[[memoryview | bytes], object],
+    *,
+    solution: bool,
+    clear: bool,
+    replacement: str,
+    prune: "PrunePolicy | None",
+    converter: Converter | None,
+    stats: Stats | None,
 ) -> None:
-    with open(infile) as f:
-        notebook = json.load(f)
-
-    converter = Converter()
-    for cell_index, cell in enumerate(notebook["cells"]):
-        if cell["cell_type"] == "code":
-            try:
-                cell["source"] = converter.process_lines(cell["source"], solution=solution, replacement=replacement)
-                if clear:
-                    cell["outputs"] = []
-            except TagError as e:
-                raise type(e)(
-                    (e.message or "") + " in cell: " + str(cell_index),
-                    line=e.line,
-                    cell=cell_index,
-                ) from e
-
-    with open(outfile, "w") as f:
-        json.dump(notebook, f, ensure_ascii=False)
+    from codehere.streaming import rewrite_notebook
+
+    converter = _instrumented(converter, stats)
+    cells = 0
+
+    def render_source(lines: list[str], cell_index: int) -> list[str] | None:
+        nonlocal cells
+        cells += 1
+        try:
+            rendered = converter.render_tagged(lines, solution=solution, replacement=replacement)
+        except TagError as e:
+            raise cell_error(e, cell_index) from e
+        return None if rendered == lines else rendered
+
+    with stage(stats, "parse"):
+        rewrite_notebook(buf, write, render_source, clear=clear, prune=prune)
+    if stats is not None:
+        stats.add("cells", cells)
 
 
 def process_markdown(
@@ -56,14 +329,121 @@ def process_markdown(
     *,
     solution: bool = False,
     replacement: str = " Your code here ",
+    fenced: bool = False,
+    converter: Converter | None = None,
+    stats: Stats | None = None,
+) -> bool:
+    """Convert a Markdown file; return whether *outfile* was written, see :func:`process_file`.
+
+    With *fenced*, only tags inside fenced code blocks are rendered: prose is copied as it is,
+    without being scanned, even when it quotes a tag.
+    """
+    return _process_text(
+        infile, outfile, solution=solution, replacement=replacement, fenced=fenced, converter=converter, stats=stats
+    )
+
+
+def process_stream(
+    src: BinaryIO,
+    dst: BinaryIO,
+    format: str,
+    *,
+    solution: bool = False,
+    clear: bool = False,
+    replacement: str = " Your code here ",
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    fenced: bool = False,
+    converter: Converter | None = None,
+    stats: Stats | None = None,
 ) -> None:
-    with open(infile) as f:
-        lines = f.readlines()
+    """Convert content of *format* (``py``, ``md`` or ``ipynb``) read from *src* into *dst*, e.g. stdin to stdout.
+
+    Both are binary file objects, and nothing touches the disk. Python and Markdown files are
+    rendered line by line as they are read, like :func:`process_py`, so a tag error can end
+    the output early; notebooks and *fenced* Markdown are read whole first. The other options
+    are those of :func:`process_file`.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format: {format!r}. Expected one of: {', '.join(FORMATS)}.")
+    stats = stats if stats is not None else current_stats()
+    if format == "ipynb":
+        with stage(stats, "read"):
+            data = src.read()
+        rendered = convert_notebook_json(
+            data,
+            solution=solution,
+            clear=clear,
+            replacement=replacement,
+            stream=stream,
+            prune=prune,
+            canonical=canonical,
+            converter=converter,
+            stats=stats,
+        )
+    elif stats is not None or (fenced and format == "md"):
+        with stage(stats, "read"):
+            data = src.read()
+        rendered = convert_text(
+            data,
+            solution=solution,
+            replacement=replacement,
+            fenced=fenced and format == "md",
+            converter=converter,
+            stats=stats,
+        )
+    else:
+        converter = converter or Converter()
+        # Binary lines end at b"\n" only, like split_lines, and UTF-8 never splits a character there.
+        lines = (line.decode("utf-8") for line in src)
+        rendered_lines = converter.iter_lines(lines, solution=solution, replacement=replacement)
+        dst.writelines(line.encode("utf-8") for line in rendered_lines)
+        dst.flush()
+        return
+    with stage(stats, "write"):
+        dst.write(rendered)
+        dst.flush()
+    if stats is not None:
+        stats.add("files")
+        stats.add("bytes_read", len(data))
+        stats.add("bytes_written", len(rendered))
+
+
+def _unsupported(infile: str) -> UnsupportedExtensionError:
+    return UnsupportedExtensionError(
+        f"File with unrecognized extension: {infile}\n"
+        f"Codehere supports only {', '.join(sorted(SUPPORTED_EXTENSIONS))} files."
+    )
 
-    result = Converter().process_lines(lines, solution=solution, replacement=replacement)
 
-    with open(outfile, "w") as f:
-        f.writelines(result)
+def compile_file(
+    infile: str, *, fenced: bool = False, converter: Converter | None = None, stats: Stats | None = None
+) -> CompiledDocument:
+    """Read and parse *infile* once, ready to be rendered into any number of variants.
+
+    With *stats*, the document also reports the rendering and writing of its variants.
+    *fenced* only applies to Markdown files, see :func:`process_markdown`.
+    """
+    if not infile.endswith((".ipynb", ".py", ".md")):
+        raise _unsupported(infile)
+    stats = stats if stats is not None else current_stats()
+    converter = _instrumented(converter, stats)
+    if stats is not None:
+        stats.add("bytes_read", os.path.getsize(infile))
+
+    if infile.endswith(".ipynb"):
+        from codehere.jsonio import loads
+
+        with stage(stats, "read"), open(infile, "rb") as f:
+            data = f.read()
+        with stage(stats, "parse"):
+            notebook, backend = loads(data)
+        return CompiledDocument.from_notebook(notebook, converter=converter, json_backend=backend)
+    with stage(stats, "read"), open(infile) as f:
+        lines = f.readlines()
+    format = infile.rsplit(".", 1)[1]
+    return CompiledDocument.from_lines(lines, format, fenced=fenced and format == "md", converter=converter)
 
 
 def process_file(
@@ -73,15 +453,69 @@ def process_file(
     solution: bool = False,
     clear: bool = False,
     replacement: str = " Your code here ",
-) -> None:
+    cache: "BuildCache | None" = None,
+    stream: bool = False,
+    prune: "PrunePolicy | None" = None,
+    canonical: bool = False,
+    fenced: bool = False,
+    converter: Converter | None = None,
+    stats: Stats | None = None,
+) -> bool:
+    """Convert *infile* into *outfile*; return whether the output was written.
+
+    The output is replaced atomically, and left untouched, mtime included, when the new
+    content is identical to it. With a *cache*, the conversion itself is skipped when
+    *outfile* is the unmodified result of the same input content, codehere version and
+    options. *stats* collects timings and counters, see :class:`~codehere.stats.Stats`.
+    *prune* and *canonical* only apply to notebooks, see :func:`process_notebook`, and *fenced*
+    to Markdown files, see :func:`process_markdown`.
+    """
+    if cache is not None:
+        from codehere.cache import file_digest, make_options
+
+        options = make_options(
+            solution=solution,
+            clear=clear,
+            replacement=replacement,
+            prune=prune,
+            canonical=canonical,
+            fenced=fenced,
+            stream=stream,
+        )
+        input_digest = file_digest(infile)
+        if cache.is_fresh(infile, outfile, options, input_digest):
+            return False
+
     if infile.endswith(".py"):
-        process_py(infile, outfile, solution=solution, replacement=replacement)
+        written = process_py(
+            infile, outfile, solution=solution, replacement=replacement, converter=converter, stats=stats
+        )
     elif infile.endswith(".ipynb"):
-        process_notebook(infile, outfile, solution=solution, clear=clear, replacement=replacement)
+        written = process_notebook(
+            infile,
+            outfile,
+            solution=solution,
+            clear=clear,
+            replacement=replacement,
+            stream=stream,
+            prune=prune,
+            canonical=canonical,
+            converter=converter,
+            stats=stats,
+        )
     elif infile.endswith(".md"):
-        process_markdown(infile, outfile, solution=solution, replacement=replacement)
-    else:
-        raise UnsupportedExtensionError(
-            f"File with unrecognized extension: {infile}\n"
-            f"Codehere supports only {', '.join(sorted(SUPPORTED_EXTENSIONS))} files."
+        written = process_markdown(
+            infile,
+            outfile,
+            solution=solution,
+            replacement=replacement,
+            fenced=fenced,
+            converter=converter,
+            stats=stats,
         )
+    else:
+        raise _unsupported(infile)
+
+    if cache is not None:
+        cache.record(infile, outfile, options, input_digest)
+    return written
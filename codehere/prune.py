@@ -0,0 +1,122 @@
+"""Selective pruning of notebook outputs and metadata, finer grained than clearing, see :class:`PrunePolicy`."""
+
+import json
+from fnmatch import fnmatchcase
+from typing import NamedTuple
+
+from codehere.utils import split_lines
+
+# Cell metadata kept by strip_metadata: what changes how the notebook behaves for students.
+KEPT_CELL_METADATA = ("deletable", "editable", "jupyter", "nbgrader", "slideshow", "tags")
+# Notebook metadata dropped by strip_metadata: saved widget state can weigh megabytes.
+HEAVY_NOTEBOOK_METADATA = ("widgets",)
+
+
+class PrunePolicy(NamedTuple):
+    """What to drop from code cell outputs, applied to every code cell of a notebook.
+
+    * *max_output_bytes*: MIME items of rich outputs larger than this are dropped, and stream
+      text is truncated to it. Error outputs are kept whole.
+    * *allow_mime*: only MIME types matching one of these patterns (like ``image/*``) are kept.
+    * *deny_mime*: MIME types matching one of these patterns are dropped.
+    * *max_stream_lines*: stream outputs are truncated to their first lines.
+    * *strip_execution_count*: execution counts of cells and results are reset to ``null``.
+    * *strip_metadata*: output metadata is emptied, cell metadata keeps only
+      :data:`KEPT_CELL_METADATA`, and widget state is removed from the notebook metadata.
+
+    Rich outputs left without any MIME item are removed.
+    """
+
+    max_output_bytes: int | None = None
+    allow_mime: tuple[str, ...] | None = None
+    deny_mime: tuple[str, ...] = ()
+    max_stream_lines: int | None = None
+    strip_execution_count: bool = False
+    strip_metadata: bool = False
+
+    def as_options(self) -> dict:
+        """JSON-friendly form, as stored in the build cache manifest."""
+        return {key: list(value) if isinstance(value, tuple) else value for key, value in self._asdict().items()}
+
+    def keeps_mime(self, mime: str) -> bool:
+        if self.allow_mime is not None and not any(fnmatchcase(mime, pattern) for pattern in self.allow_mime):
+            return False
+        return not any(fnmatchcase(mime, pattern) for pattern in self.deny_mime)
+
+
+def _size(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, list) and all(isinstance(line, str) for line in value):
+        return sum(len(line.encode("utf-8")) for line in value)
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def _truncate(text: str, max_lines: int | None, max_bytes: int | None) -> str:
+    lines = split_lines(text)
+    kept = lines if max_lines is None else lines[:max_lines]
+    if max_bytes is not None:
+        size = 0
+        for count, line in enumerate(kept):
+            size += len(line.encode("utf-8"))
+            if size > max_bytes:
+                kept = kept[:count]
+                break
+    if len(kept) == len(lines):
+        return text
+    ending = "" if not kept or kept[-1].endswith("\n") else "\n"
+    return f"{''.join(kept)}{ending}[... {len(lines) - len(kept)} more lines]\n"
+
+
+def prune_output(output: dict, policy: PrunePolicy) -> dict | None:
+    """Pruned copy of *output* (or *output* itself when nothing changes), ``None`` to remove it."""
+    pruned = output
+    output_type = output.get("output_type")
+    if output_type == "stream":
+        text = output.get("text", "")
+        joined = text if isinstance(text, str) else "".join(text)
+        truncated = _truncate(joined, policy.max_stream_lines, policy.max_output_bytes)
+        if truncated is not joined:
+            pruned = {**output, "text": truncated if isinstance(text, str) else split_lines(truncated)}
+    elif output_type in ("display_data", "execute_result"):
+        data = output.get("data", {})
+        kept = {
+            mime: value
+            for mime, value in data.items()
+            if policy.keeps_mime(mime) and (policy.max_output_bytes is None or _size(value) <= policy.max_output_bytes)
+        }
+        if not kept:
+            return None
+        if len(kept) != len(data):
+            pruned = {**output, "data": kept}
+        if policy.strip_metadata and pruned.get("metadata"):
+            pruned = {**pruned, "metadata": {}}
+        if policy.strip_execution_count and pruned.get("execution_count") is not None:
+            pruned = {**pruned, "execution_count": None}
+    return pruned
+
+
+def prune_outputs(outputs: list[dict], policy: PrunePolicy) -> list[dict]:
+    pruned = (prune_output(output, policy) for output in outputs)
+    return [output for output in pruned if output is not None]
+
+
+def prune_cell(cell: dict, policy: PrunePolicy) -> None:
+    """Prune the outputs and metadata of code *cell*, by assigning its keys, never mutating their values.
+
+    A shallow copy of a cell can thus be pruned without changing the original.
+    """
+    if "outputs" in cell:
+        cell["outputs"] = prune_outputs(cell["outputs"], policy)
+    if policy.strip_execution_count and "execution_count" in cell:
+        cell["execution_count"] = None
+    if policy.strip_metadata and "metadata" in cell:
+        cell["metadata"] = prune_cell_metadata(cell["metadata"])
+
+
+def prune_cell_metadata(metadata: dict) -> dict:
+    return {key: value for key, value in metadata.items() if key in KEPT_CELL_METADATA}
+
+
+def prune_notebook_metadata(metadata: dict) -> dict:
+    return {key: value for key, value in metadata.items() if key not in HEAVY_NOTEBOOK_METADATA}
@@ -0,0 +1,221 @@
+"""Long-running conversion service speaking JSON lines, see :class:`Service`.
+
+Each request is one JSON object per line; each response is one JSON object per line,
+carrying the request's ``id``. Responses are sent as soon as their job is done, so they
+may come back in a different order than the requests.
+
+A conversion request names an input file, or carries the input itself::
+
+    {"id": 1, "infile": "hw.ipynb", "outfile": "hw-task.ipynb", "clear": true}
+    {"id": 2, "content": "...", "format": "py", "solution": true}
+
+A notebook's ``content`` is either its JSON text or the notebook itself as a JSON object.
+Options (``solution``, ``clear``, ``stream``) are ``true`` or ``false``. A request is answered
+with ``{"id": 1, "ok": true, "outfile": ..., "written": true}`` or, for inline content
+without an ``outfile``, ``{"id": 2, "ok": true, "content": ...}``, of the same type. Failed
+jobs answer ``{"id": ..., "ok": false, "error": {"type": ..., "message": ..., "line": ...,
+"cell": ...}}``. Other operations are ``{"op": "ping"}``, ``{"op": "info"}`` (render cache
+statistics) and ``{"op": "shutdown"}``.
+"""
+
+import functools
+import json
+import os
+import socketserver
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+from codehere.converter import Converter, RenderCache
+from codehere.exceptions import TagError
+from codehere.output import write_output
+from codehere.processors import convert_notebook_dict, convert_notebook_json, convert_text, process_file
+from codehere.utils import FORMATS, get_outfile_path
+
+
+def error_details(error: Exception) -> dict:
+    """JSON-friendly description of *error*, with the tag line and cell of tag errors."""
+    details = {"type": type(error).__name__, "message": str(error)}
+    if isinstance(error, TagError):
+        details["line"] = error.line
+        details["cell"] = error.cell
+    return details
+
+
+def _flag(request: dict, name: str) -> bool:
+    value = request.get(name, False)
+    if not isinstance(value, bool):
+        raise ValueError(f"Option {name!r} must be true or false, not {value!r}")
+    return value
+
+
+class Service:
+    """Run conversion requests on a pool of *jobs* threads sharing one warm converter.
+
+    The converter's :class:`~codehere.converter.RenderCache` keeps rendered cells across
+    requests, so the same template rendered for many students is only scanned once.
+    """
+
+    def __init__(self, *, jobs: int | None = None, render_cache: RenderCache | None = None) -> None:
+        self.converter = Converter(render_cache=render_cache if render_cache is not None else RenderCache())
+        self.executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="codehere-serve")
+        self.stopped = threading.Event()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    def handle(self, request: dict) -> dict:
+        """Answer one request; errors are reported in the response, never raised."""
+        response = {"id": request.get("id"), "ok": True}
+        try:
+            response.update(self._dispatch(request))
+        except Exception as e:
+            # Malformed content fails in many ways (a notebook without cells raises KeyError),
+            # and every one of them must be answered, not end the job silently.
+            response.update(ok=False, error=error_details(e))
+        return response
+
+    def _dispatch(self, request: dict) -> dict:
+        op = request.get("op", "convert")
+        if op == "ping":
+            return {}
+        if op == "info":
+            return {"render_cache": self.converter.render_cache.info()._asdict()}
+        if op == "convert":
+            return self.convert(request)
+        raise ValueError(f"Unknown op: {op}")
+
+    def convert(self, request: dict) -> dict:
+        solution = _flag(request, "solution")
+        clear = _flag(request, "clear")
+        replacement = request.get("replacement", " Your code here ")
+        stream = _flag(request, "stream")
+        outfile = request.get("outfile")
+
+        if "content" not in request:
+            infile = request.get("infile")
+            if infile is None:
+                raise ValueError("A convert request needs an 'infile' or a 'content'")
+            outfile = outfile or get_outfile_path(infile, solution=solution)
+            written = process_file(
+                infile,
+                outfile,
+                solution=solution,
+                clear=clear,
+                replacement=replacement,
+                stream=stream,
+                converter=self.converter,
+            )
+            return {"outfile": outfile, "written": written}
+
+        content = request["content"]
+        format = request.get("format") or os.path.splitext(request.get("infile") or outfile or "")[1].lstrip(".")
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format: {format!r}. Expected one of: {', '.join(FORMATS)}.")
+        if isinstance(content, dict):
+            if format != "ipynb":
+                raise ValueError(f"Only notebook content can be sent as a JSON object, not {format!r} content")
+            if stream:
+                raise ValueError("A notebook sent as a JSON object has no layout to stream, send its text instead")
+            notebook = convert_notebook_dict(
+                content, solution=solution, clear=clear, replacement=replacement, inplace=True, converter=self.converter
+            )
+            if outfile is None:
+                return {"content": notebook}
+            from codehere.jsonio import dumps
+
+            return {"outfile": outfile, "written": write_output(outfile, dumps(notebook))}
+        if not isinstance(content, str):
+            raise ValueError(f"Content must be text or, for notebooks, a JSON object, not {type(content).__name__}")
+        if format == "ipynb":
+            rendered = convert_notebook_json(
+                content,
+                solution=solution,
+                clear=clear,
+                replacement=replacement,
+                stream=stream,
+                converter=self.converter,
+            )
+        else:
+            rendered = convert_text(content, solution=solution, replacement=replacement, converter=self.converter)
+        if outfile is None:
+            return {"content": rendered}
+        return {"outfile": outfile, "written": write_output(outfile, rendered)}
+
+    def serve(self, rfile: BinaryIO, wfile: BinaryIO) -> None:
+        """Answer the JSON lines read from *rfile* on *wfile* until EOF or a shutdown request."""
+        lock = threading.Lock()
+        idle = threading.Condition()
+        outstanding = 0
+        shutdown = None
+
+        def respond(response: dict) -> None:
+            data = json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n"
+            with lock:
+                wfile.write(data)
+                wfile.flush()
+
+        def done(request: dict, future) -> None:
+            nonlocal outstanding
+            try:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    response = {"id": request.get("id"), "ok": False, "error": error_details(e)}
+                respond(response)
+            finally:
+                with idle:
+                    outstanding -= 1
+                    idle.notify_all()
+
+        for line in rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("A request must be a JSON object")
+            except ValueError as e:
+                respond({"id": None, "ok": False, "error": error_details(e)})
+                continue
+            if request.get("op") == "shutdown":
+                shutdown = request
+                self.stopped.set()
+                break
+            with idle:
+                outstanding += 1
+            self.executor.submit(self.handle, request).add_done_callback(functools.partial(done, request))
+
+        # Answer every accepted request before returning, and the shutdown request last.
+        with idle:
+            idle.wait_for(lambda: outstanding == 0)
+        if shutdown is not None:
+            respond({"id": shutdown.get("id"), "ok": True})
+
+
+class _ConnectionHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        service: Service = self.server.service
+        service.serve(self.rfile, self.wfile)
+        if service.stopped.is_set():
+            # shutdown() waits for serve_forever(), which runs in another thread.
+            threading.Thread(target=self.server.shutdown).start()
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    """Serve every connection to the socket at *path*, each one like stdin/stdout, with one shared service."""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, service: Service) -> None:
+        self.service = service
+        # A socket left behind by a server that did not exit cleanly would make bind() fail.
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+        super().__init__(path, _ConnectionHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
@@ -0,0 +1,98 @@
+"""Per-stage timings and counters of conversions, see :class:`Stats`."""
+
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+STAGES = ("read", "parse", "scan", "render", "serialize", "write")
+COUNTERS = ("files", "cells", "lines", "blocks", "bytes_read", "bytes_written")
+
+_active: ContextVar["Stats | None"] = ContextVar("codehere_stats", default=None)
+
+
+class Stats:
+    """Time spent in each stage of the conversions it is given to, and how much they handled.
+
+    Pass it as ``stats=`` to :func:`~codehere.processors.process_file` and friends, or use it
+    as a context manager to collect everything converted inside the ``with`` block::
+
+        with Stats() as stats:
+            codehere.convert("lesson.ipynb", targets=["task", "solution"])
+        print(stats.format())
+
+    Stages do not overlap: time spent in a stage nested in another, like the tag scan of a
+    cell while a notebook is streamed, only counts for the inner one. *callback* is called
+    with each stage name and its duration in seconds as the stage ends. Without stats,
+    instrumented code only pays for an ``is None`` check per file and per cell.
+    """
+
+    def __init__(self, callback: Callable[[str, float], object] | None = None) -> None:
+        self.callback = callback
+        self.timings = dict.fromkeys(STAGES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self._nested: list[float] = []
+        self._tokens: list = []
+
+    def __enter__(self) -> "Stats":
+        self._tokens.append(_active.set(self))
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _active.reset(self._tokens.pop())
+
+    def __getstate__(self) -> dict:
+        # Sent back from batch workers: only the numbers travel.
+        return {"timings": self.timings, "counts": self.counts}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__()
+        self.timings.update(state["timings"])
+        self.counts.update(state["counts"])
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = perf_counter()
+        self._nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - started
+            own = elapsed - self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self.timings[name] += own
+            if self.callback is not None:
+                self.callback(name, own)
+
+    def add(self, counter: str, amount: int = 1) -> None:
+        self.counts[counter] += amount
+
+    def merge(self, other: "Stats") -> None:
+        for name, seconds in other.timings.items():
+            self.timings[name] += seconds
+        for counter, amount in other.counts.items():
+            self.counts[counter] += amount
+
+    def as_dict(self) -> dict:
+        return {"stages": dict(self.timings), "total": sum(self.timings.values()), "counts": dict(self.counts)}
+
+    def format(self) -> str:
+        total = sum(self.timings.values())
+        lines = [
+            f"{name:<10} {seconds * 1000:10.2f} ms {seconds / total if total else 0:7.1%}"
+            for name, seconds in self.timings.items()
+        ]
+        lines.append(f"{'total':<10} {total * 1000:10.2f} ms")
+        lines.append("  ".join(f"{counter}={amount}" for counter, amount in self.counts.items()))
+        return "\n".join(lines)
+
+
+def current_stats() -> Stats | None:
+    """The :class:`Stats` of the innermost ``with Stats()`` block, if any."""
+    return _active.get()
+
+
+def stage(stats: Stats | None, name: str) -> AbstractContextManager:
+    """Time *name* in *stats*, or do nothing without stats."""
+    return stats.stage(name) if stats is not None else nullcontext()
@@ -0,0 +1,202 @@
+"""Rewrite notebook JSON in place, without building Python objects for anything but cell sources."""
+
+import json
+import re
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from codehere.utils import split_lines
+
+if TYPE_CHECKING:
+    from codehere.prune import PrunePolicy
+
+_WHITESPACE = re.compile(rb"[ \t\n\r]*")
+_SCALAR = re.compile(rb"[^,\]}\s]+")
+_STRUCTURE = re.compile(rb'["\[\]{}]')
+_BACKSLASH = 0x5C
+
+
+def _error(pos: int) -> ValueError:
+    return ValueError(f"Malformed notebook JSON at byte {pos}")
+
+
+def _ws(buf, pos: int) -> int:
+    return _WHITESPACE.match(buf, pos).end()
+
+
+def _expect(buf, pos: int, char: bytes) -> int:
+    pos = _ws(buf, pos)
+    if buf[pos : pos + 1] != char:
+        raise _error(pos)
+    return pos + 1
+
+
+def _string_end(buf, pos: int) -> int:
+    # Jump between quotes with find(), which is much faster than a regex over long base64 strings.
+    end = pos + 1
+    while True:
+        end = buf.find(b'"', end)
+        if end < 0:
+            raise _error(pos)
+        escape = end - 1
+        while buf[escape] == _BACKSLASH:
+            escape -= 1
+        if (end - 1 - escape) % 2 == 0:
+            return end + 1
+        end += 1
+
+
+def skip_value(buf, pos: int) -> int:
+    """Return the end of the JSON value starting at *pos*, scanning it without decoding."""
+    head = buf[pos : pos + 1]
+    if head == b'"':
+        return _string_end(buf, pos)
+    if head not in (b"[", b"{"):
+        match = _SCALAR.match(buf, pos)
+        if match is None:
+            raise _error(pos)
+        return match.end()
+
+    depth = 0
+    search = _STRUCTURE.search
+    while True:
+        match = search(buf, pos)
+        if match is None:
+            raise _error(pos)
+        token = match.group()
+        if token == b'"':
+            pos = _string_end(buf, match.start())
+            continue
+        pos = match.end()
+        if token in (b"[", b"{"):
+            depth += 1
+        elif token in (b"]", b"}"):
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+def _members(buf, pos: int, on_member: Callable[[str, int], int]) -> int:
+    """Walk the object at *pos*; *on_member(key, value_start)* returns the value end."""
+    pos = _expect(buf, pos, b"{")
+    pos = _ws(buf, pos)
+    if buf[pos : pos + 1] == b"}":
+        return pos + 1
+    while True:
+        pos = _ws(buf, pos)
+        key_end = skip_value(buf, pos)
+        key = json.loads(bytes(buf[pos:key_end]))
+        pos = _ws(buf, _expect(buf, key_end, b":"))
+        pos = _ws(buf, on_member(key, pos))
+        char = buf[pos : pos + 1]
+        if char == b"}":
+            return pos + 1
+        if char != b",":
+            raise _error(pos)
+        pos += 1
+
+
+def _elements(buf, pos: int, on_element: Callable[[int], int]) -> int:
+    """Walk the array at *pos*; *on_element(value_start)* returns the value end."""
+    pos = _expect(buf, pos, b"[")
+    pos = _ws(buf, pos)
+    if buf[pos : pos + 1] == b"]":
+        return pos + 1
+    while True:
+        pos = _ws(buf, on_element(_ws(buf, pos)))
+        char = buf[pos : pos + 1]
+        if char == b"]":
+            return pos + 1
+        if char != b",":
+            raise _error(pos)
+        pos += 1
+
+
+def rewrite_notebook(
+    buf,
+    write: Callable[[memoryview | bytes], object],
+    render_source: Callable[[list[str], int], list[str] | None],
+    *,
+    clear: bool = False,
+    prune: "PrunePolicy | None" = None,
+) -> None:
+    """Copy the notebook JSON in *buf* to *write*, changing only code cells' sources and outputs.
+
+    *render_source(lines, cell_index)* returns the new source lines, or ``None`` to keep them.
+    With *clear*, code cells' outputs are replaced by ``[]`` without being scanned into objects.
+    With a *prune* policy, outputs (and the metadata it strips) are decoded, pruned and written
+    back compactly when they change. Everything else, including the original layout, is copied
+    through byte for byte, and is written out cell by cell as the scan goes.
+    """
+    # Cell members the prune policy may change: only those are decoded.
+    pruned_keys: tuple[str, ...] = ()
+    if prune is not None:
+        from codehere.prune import prune_cell, prune_notebook_metadata
+
+        wanted = (not clear, prune.strip_execution_count, prune.strip_metadata)
+        pruned_keys = tuple(key for key, value in zip(("outputs", "execution_count", "metadata"), wanted) if value)
+
+    with memoryview(buf) as view:
+        position = 0
+        cell_index = 0
+
+        def replace(start: int, stop: int, replacement: bytes) -> None:
+            nonlocal position
+            write(view[position:start])
+            write(replacement)
+            position = stop
+
+        def decode(span: tuple[int, int]):
+            return json.loads(bytes(view[slice(*span)]))
+
+        def encode(value) -> bytes:
+            return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+        def on_cell(start: int) -> int:
+            nonlocal cell_index
+            spans: dict[str, tuple[int, int]] = {}
+
+            def on_member(key: str, value_start: int) -> int:
+                value_end = skip_value(buf, value_start)
+                if key in ("cell_type", "source", "outputs") or key in pruned_keys:
+                    spans[key] = (value_start, value_end)
+                return value_end
+
+            end = _members(buf, start, on_member)
+            index, cell_index = cell_index, cell_index + 1
+            if "cell_type" not in spans or decode(spans["cell_type"]) != "code":
+                return end
+
+            edits: list[tuple[int, int, bytes]] = []
+            if "source" in spans:
+                source = decode(spans["source"])
+                lines = split_lines(source) if isinstance(source, str) else source
+                rendered = render_source(lines, index)
+                if rendered is not None:
+                    new_source = "".join(rendered) if isinstance(source, str) else rendered
+                    edits.append((*spans["source"], encode(new_source)))
+            if clear and "outputs" in spans:
+                edits.append((*spans["outputs"], b"[]"))
+            if pruned_keys:
+                cell = {key: decode(spans[key]) for key in pruned_keys if key in spans}
+                original = dict(cell)
+                prune_cell(cell, prune)
+                edits.extend((*spans[key], encode(value)) for key, value in cell.items() if value != original[key])
+
+            for edit in sorted(edits):
+                replace(*edit)
+            return end
+
+        def on_top_member(key: str, value_start: int) -> int:
+            if key == "cells":
+                return _elements(buf, value_start, on_cell)
+            value_end = skip_value(buf, value_start)
+            if key == "metadata" and prune is not None and prune.strip_metadata:
+                metadata = decode((value_start, value_end))
+                pruned = prune_notebook_metadata(metadata)
+                if pruned != metadata:
+                    replace(value_start, value_end, encode(pruned))
+            return value_end
+
+        _members(buf, _ws(buf, 0), on_top_member)
+        write(view[position:])
@@ -1,18 +1,91 @@
+import glob
+import io
 from pathlib import Path
 
 SUPPORTED_EXTENSIONS = {".py", ".ipynb", ".md"}
+# Names of the supported formats, for content that comes without a file name.
+FORMATS = ("py", "md", "ipynb")
+# Archives that outputs can be bundled into, see codehere.archive.
+ARCHIVE_FORMATS = ("zip", "tar", "tar.gz")
+
+GLOB_CHARS = "*?["
+# Manifest of the builds of --incremental, see codehere.cache.
+DEFAULT_CACHE_FILE = ".codehere-cache.json"
+
+
+def split_lines(text: str) -> list[str]:
+    """Split *text* into lines at ``\\n`` only, keeping the line endings."""
+    return io.StringIO(text).readlines()
 
 
 def is_supported_file(path: str | Path) -> bool:
     return Path(path).suffix in SUPPORTED_EXTENSIONS
 
 
-def get_outfile_path(file: str, *, solution: bool = False) -> str:
+def get_outfile_path(file: str, *, solution: bool = False, unique: bool = True) -> str:
     p = Path(file)
     suffix = "-solution" if solution else "-task"
+    if not unique:
+        return str(p.with_stem(p.stem + suffix))
     attempts = 100
     for number in ["", *map(str, range(1, attempts))]:
         candidate = p.with_stem(p.stem + suffix + number)
         if not candidate.exists():
             return str(candidate)
     raise FileExistsError("Cannot get unique outfile name in " + str(attempts) + " attempts")
+
+
+def glob_root(pattern: str) -> Path:
+    parts = Path(pattern).parts
+    for index, part in enumerate(parts):
+        if any(char in part for char in GLOB_CHARS):
+            return Path(*parts[:index]) if index else Path()
+    return Path(pattern).parent
+
+
+def _walk(root: Path) -> list[Path]:
+    return sorted(
+        path
+        for path in root.rglob("*")
+        if path.is_file()
+        and is_supported_file(path)
+        and not any(part.startswith(".") for part in path.relative_to(root).parts)
+    )
+
+
+def collect_inputs(paths: list[str]) -> list[tuple[Path, Path]]:
+    """Expand files, directories and glob patterns into ``(input, path relative to its root)`` pairs.
+
+    Directories are walked recursively for supported files, skipping hidden entries such as
+    ``.ipynb_checkpoints``. Plain files are kept as given, so unsupported ones can be reported.
+    """
+    found: dict[Path, Path] = {}
+    for path in paths:
+        if any(char in path for char in GLOB_CHARS):
+            root = glob_root(path)
+            for match in sorted(map(Path, glob.glob(path, recursive=True))):
+                if match.is_dir():
+                    found.update((file, file.relative_to(root)) for file in _walk(match))
+                elif is_supported_file(match):
+                    found.setdefault(match, match.relative_to(root))
+        elif Path(path).is_dir():
+            root = Path(path)
+            found.update((file, file.relative_to(root)) for file in _walk(root))
+        else:
+            found.setdefault(Path(path), Path(Path(path).name))
+    return list(found.items())
+
+
+def check_collisions(inputs: list[tuple[Path, Path]]) -> None:
+    """Raise ``ValueError`` when two inputs from :func:`collect_inputs` share a relative path.
+
+    Their outputs would land on the same file, or archive entry, and the last one would win.
+    """
+    seen: dict[Path, Path] = {}
+    for infile, relative in inputs:
+        other = seen.setdefault(relative, infile)
+        if other != infile:
+            raise ValueError(
+                f"{other} and {infile} would both be written to {relative}; "
+                "convert them separately or pass a directory that holds both."
+            )
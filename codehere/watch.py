@@ -0,0 +1,259 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from codehere.batch import plan_outputs
+from codehere.converter import Converter, RenderCache
+from codehere.exceptions import CodehereError
+from codehere.processors import process_file
+from codehere.utils import GLOB_CHARS, collect_inputs, get_outfile_path, glob_root, is_supported_file
+
+if TYPE_CHECKING:
+    from codehere.prune import PrunePolicy
+
+
+class PollingBackend:
+    """Detect changed inputs by comparing their size and mtime every *interval* seconds."""
+
+    def __init__(self, paths: list[str], interval: float = 0.1) -> None:
+        self.paths = paths
+        self.interval = interval
+        self.state = self._snapshot()
+
+    def _snapshot(self) -> dict[Path, tuple[int, int]]:
+        state = {}
+        for infile, _ in collect_inputs(self.paths):
+            try:
+                stat = infile.stat()
+            except OSError:
+                continue
+            state[infile] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def wait(self, timeout: float) -> set[Path]:
+        time.sleep(min(timeout, self.interval))
+        state = self._snapshot()
+        changed = {path for path, signature in state.items() if self.state.get(path) != signature}
+        self.state = state
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyBackend:
+    """Detect saved files with Linux inotify, watching the directories that hold the inputs."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, paths: list[str]) -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories: dict[int, tuple[Path, bool]] = {}
+        for path in paths:
+            if any(char in path for char in GLOB_CHARS):
+                self._add_tree(glob_root(path))
+            elif Path(path).is_dir():
+                self._add_tree(Path(path))
+            else:
+                self._add(Path(path).parent, recursive=False)
+
+    @classmethod
+    def available(cls) -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        library = ctypes.util.find_library("c") or "libc.so.6"
+        try:
+            return hasattr(ctypes.CDLL(library), "inotify_init1")
+        except OSError:
+            return False
+
+    def _add(self, directory: Path, *, recursive: bool) -> None:
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd >= 0:
+            self.directories[wd] = (directory, recursive)
+
+    def _add_tree(self, root: Path) -> None:
+        self._add(root, recursive=True)
+        for directory in root.rglob("*"):
+            if directory.is_dir() and not any(part.startswith(".") for part in directory.relative_to(root).parts):
+                self._add(directory, recursive=True)
+
+    def wait(self, timeout: float) -> set[Path]:
+        changed: set[Path] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                if wd not in self.directories:
+                    continue
+                directory, recursive = self.directories[wd]
+                path = directory / name
+                if mask & self.IN_ISDIR:
+                    if recursive and not name.startswith("."):
+                        self._add_tree(path)
+                elif mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                    changed.add(path)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def make_backend(paths: list[str], *, polling: bool = False) -> "InotifyBackend | PollingBackend":
+    """Use inotify when the platform provides it, and stat polling otherwise."""
+    if not polling and InotifyBackend.available():
+        return InotifyBackend(paths)
+    return PollingBackend(paths)
+
+
+class RenderResult(NamedTuple):
+    """An outfile and whether it was written or left unchanged, or a failed input and its error."""
+
+    path: str
+    written: bool
+    error: Exception | None
+
+
+class Watcher:
+    """Re-render the outputs of watched inputs whenever they are saved.
+
+    Without *outdir*, *paths* must be files and each one is rendered next to itself under a
+    fixed ``-task``/``-solution`` name. One converter and its render cache are kept warm across
+    renders, so only the cells edited since the last save are scanned again.
+    """
+
+    def __init__(
+        self,
+        paths: list[str],
+        outdir: str | None = None,
+        *,
+        targets: list[str] | tuple[str, ...] = ("task",),
+        clear: bool = False,
+        replacement: str = " Your code here ",
+        stream: bool = False,
+        prune: "PrunePolicy | None" = None,
+        canonical: bool = False,
+        fenced: bool = False,
+        debounce: float = 0.025,
+        backend: "InotifyBackend | PollingBackend | None" = None,
+    ) -> None:
+        self.paths = paths
+        self.outdir = outdir
+        self.targets = targets
+        self.clear = clear
+        self.replacement = replacement
+        self.stream = stream
+        self.prune = prune
+        self.canonical = canonical
+        self.fenced = fenced
+        self.debounce = debounce
+        self.converter = Converter(render_cache=RenderCache())
+        self.outputs: dict[Path, list[tuple[str, str]]] = {}
+        self.plan()
+        self.backend = backend or make_backend(paths)
+
+    def plan(self) -> None:
+        """Refresh the mapping from inputs to outputs, e.g. after a new file appeared."""
+        if self.outdir is not None:
+            plan = plan_outputs(self.paths, self.outdir, targets=self.targets)
+            self.outputs = {Path(infile): outputs for infile, outputs in plan}
+        else:
+            self.outputs = {
+                infile: [
+                    (target, get_outfile_path(str(infile), solution=target == "solution", unique=False))
+                    for target in self.targets
+                ]
+                for infile, _ in collect_inputs(self.paths)
+            }
+        self.outfiles = {Path(outfile) for outputs in self.outputs.values() for _, outfile in outputs}
+
+    def _in_outdir(self, path: Path) -> bool:
+        return self.outdir is not None and Path(self.outdir).resolve() in path.resolve().parents
+
+    def render(self, infiles: list[Path]) -> list[RenderResult]:
+        """Render every output of *infiles*; return a result per outfile, or per failed input."""
+        results: list[RenderResult] = []
+        for infile in infiles:
+            try:
+                for target, outfile in self.outputs[infile]:
+                    os.makedirs(os.path.dirname(outfile) or ".", exist_ok=True)
+                    written = process_file(
+                        str(infile),
+                        outfile,
+                        solution=target == "solution",
+                        clear=self.clear,
+                        replacement=self.replacement,
+                        stream=self.stream,
+                        prune=self.prune,
+                        canonical=self.canonical,
+                        fenced=self.fenced,
+                        converter=self.converter,
+                    )
+                    results.append(RenderResult(outfile, written, None))
+            except (CodehereError, OSError, ValueError, KeyError) as e:
+                # A notebook without cells or cell types is reported like invalid JSON.
+                results.append(RenderResult(str(infile), False, e))
+        return results
+
+    def affected(self, changed: set[Path]) -> list[Path]:
+        changed = {path for path in changed if path not in self.outfiles and not self._in_outdir(path)}
+        if any(path not in self.outputs and is_supported_file(path) for path in changed):
+            try:
+                self.plan()
+            except ValueError as e:
+                # A new input colliding with another one: keep rendering the others.
+                print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return sorted(path for path in changed if path in self.outputs)
+
+    def poll(self, timeout: float = 0.5) -> list[RenderResult]:
+        """Wait up to *timeout* for changes, let a burst of saves settle, then render what changed."""
+        changed = self.backend.wait(timeout)
+        if not changed:
+            return []
+        while more := self.backend.wait(self.debounce):
+            changed |= more
+        return self.render(self.affected(changed))
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        """Render everything once, then keep re-rendering changed inputs until *stop* is set."""
+        report(self.render(sorted(self.outputs)))
+        try:
+            while stop is None or not stop.is_set():
+                report(self.poll())
+        finally:
+            self.backend.close()
+
+
+def report(results: list[RenderResult]) -> None:
+    for path, written, error in results:
+        if error is None:
+            print("Saved in:" if written else "Up to date:", path, file=sys.stderr)
+        else:
+            print(f"{path}: {type(error).__name__}: {error}", file=sys.stderr)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from codehere import aio
+from codehere.aio import ConvertResult, aconvert, aconvert_many
+from codehere.exceptions import UnclosedTagError, UnsupportedExtensionError
+from codehere.processors import process_file
+
+
+class TestAconvert:
+    @pytest.mark.parametrize("name", ["sample_py", "sample_md", "sample_ipynb"])
+    def test_matches_process_file(self, name, request, tmp_path):
+        infile = request.getfixturevalue(name)
+        suffix = infile.rsplit(".", 1)[1]
+        expected, actual = tmp_path / f"expected.{suffix}", tmp_path / f"actual.{suffix}"
+        process_file(infile, str(expected), clear=True)
+        assert asyncio.run(aconvert(infile, str(actual), clear=True)) == str(actual)
+        assert actual.read_bytes() == expected.read_bytes()
+
+    def test_stream(self, sample_ipynb, tmp_path):
+        outfile = tmp_path / "out.ipynb"
+        asyncio.run(aconvert(sample_ipynb, str(outfile), clear=True, stream=True))
+        assert json.loads(outfile.read_text())["cells"][1]["outputs"] == []
+
+    def test_unsupported(self, tmp_path):
+        with pytest.raises(UnsupportedExtensionError):
+            asyncio.run(aconvert(str(tmp_path / "a.txt")))
+
+    def test_process_pool(self, sample_py, tmp_path):
+        outfile = tmp_path / "out.py"
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            asyncio.run(aconvert(sample_py, str(outfile), executor=executor))
+        assert "raise NotImplementedError" in outfile.read_text()
+
+
+@pytest.fixture
+def inputs(sample_py, tmp_path):
+    paths = []
+    for index in range(20):
+        path = tmp_path / f"in{index}.py"
+        path.write_text(open(sample_py).read())
+        paths.append(str(path))
+    return paths
+
+
+class TestAconvertMany:
+    def test_results_per_input(self, inputs, tmp_path):
+        broken = tmp_path / "broken.py"
+        broken.write_text('"""<codehere>"""\n')
+        items = [*inputs[:3], (str(broken), str(tmp_path / "broken-out.py")), str(tmp_path / "missing.py")]
+        results = asyncio.run(aconvert_many(items))
+        assert [result.infile for result in results[:3]] == inputs[:3]
+        assert all(result.error is None for result in results[:3])
+        assert isinstance(results[3].error, UnclosedTagError)
+        assert results[3] == ConvertResult(str(broken), str(tmp_path / "broken-out.py"), results[3].error)
+        assert isinstance(results[4].error, FileNotFoundError)
+
+    def test_limit(self, inputs, monkeypatch):
+        active = peak = 0
+        lock = threading.Lock()
+        read = aio._read
+
+        def slow_read(infile):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+            return read(infile)
+
+        monkeypatch.setattr(aio, "_read", slow_read)
+        results = asyncio.run(aconvert_many(inputs, limit=4))
+        assert all(result.error is None for result in results)
+        assert 1 < peak <= 4
+
+    def test_cancel(self, inputs, monkeypatch):
+        read = aio._read
+        monkeypatch.setattr(aio, "_read", lambda infile: time.sleep(0.05) or read(infile))
+
+        async def main():
+            task = asyncio.create_task(aconvert_many(inputs, limit=2))
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
@@ -0,0 +1,213 @@
+import io
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from codehere.archive import ArchiveWriter, archive_format, archive_many, plan_entries
+from codehere.batch import convert_many
+from codehere.cli import main
+from codehere.exceptions import UnclosedTagError
+from codehere.stats import Stats
+
+
+@pytest.fixture
+def course(tmp_path, sample_py, sample_ipynb, sample_md):
+    root = tmp_path / "course"
+    (root / "week1").mkdir(parents=True)
+    (root / "week2").mkdir()
+    (root / "week1" / "hw.py").write_text(Path(sample_py).read_text())
+    (root / "week1" / "notes.md").write_text(Path(sample_md).read_text())
+    (root / "week2" / "seminar.ipynb").write_text(Path(sample_ipynb).read_text())
+    return root
+
+
+def read_zip(data: bytes) -> dict[str, bytes]:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return {name: archive.read(name) for name in archive.namelist()}
+
+
+def read_tar(data: bytes) -> dict[str, bytes]:
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        return {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+
+
+class TestArchiveFormat:
+    @pytest.mark.parametrize(
+        "name, format", [("out.zip", "zip"), ("out.tar", "tar"), ("out.tar.gz", "tar.gz"), ("out.tgz", "tar.gz")]
+    )
+    def test_from_name(self, name, format):
+        assert archive_format(name) == format
+
+    def test_unknown(self):
+        with pytest.raises(ValueError, match="Cannot tell the archive format"):
+            archive_format("out.7z")
+
+
+class TestArchiveWriter:
+    @pytest.mark.parametrize("format", ["zip", "tar", "tar.gz"])
+    def test_entries_are_deterministic(self, format):
+        outputs = []
+        for _ in range(2):
+            buffer = io.BytesIO()
+            with ArchiveWriter(buffer, format) as writer:
+                writer.add("a/task.py", b"x = 1\n")
+            outputs.append(buffer.getvalue())
+        assert outputs[0] == outputs[1]
+
+    def test_zip_metadata(self):
+        buffer = io.BytesIO()
+        with ArchiveWriter(buffer, "zip") as writer:
+            writer.add("task.py", b"x = 1\n")
+        (info,) = zipfile.ZipFile(buffer).infolist()
+        assert info.date_time == (1980, 1, 1, 0, 0, 0)
+        assert info.external_attr >> 16 == 0o644
+
+    def test_tar_metadata(self):
+        buffer = io.BytesIO()
+        with ArchiveWriter(buffer, "tar.gz") as writer:
+            writer.add("task.py", b"x = 1\n")
+        (member,) = tarfile.open(fileobj=io.BytesIO(buffer.getvalue())).getmembers()
+        assert (member.mode, member.uid, member.gid, member.uname) == (0o644, 0, 0, "")
+        assert member.mtime == 315532800
+
+    def test_unseekable_output(self, tmp_path):
+        class Pipe(io.RawIOBase):
+            def __init__(self):
+                self.data = bytearray()
+
+            def writable(self):
+                return True
+
+            def write(self, data):
+                self.data += data
+                return len(data)
+
+        pipe = Pipe()
+        with ArchiveWriter(pipe, "zip") as writer:
+            writer.add("task.py", b"x = 1\n")
+        assert read_zip(bytes(pipe.data)) == {"task.py": b"x = 1\n"}
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError, match="Unknown archive format"):
+            ArchiveWriter(io.BytesIO(), "rar")
+
+
+class TestArchiveMany:
+    def test_entries_match_convert_many(self, course, tmp_path):
+        targets = ["task", "solution"]
+        convert_many([str(course)], str(tmp_path / "render"), targets=targets, clear=True)
+        buffer = io.BytesIO()
+        report = archive_many([str(course)], buffer, format="zip", targets=targets, clear=True)
+        assert report == (3, 6, [])
+        entries = read_zip(buffer.getvalue())
+        assert list(entries) == [
+            f"{target}/{name}"
+            for name in ("week1/hw.py", "week1/notes.md", "week2/seminar.ipynb")
+            for target in targets
+        ]
+        for name, data in entries.items():
+            assert (tmp_path / "render" / name).read_bytes() == data
+
+    @pytest.mark.parametrize("format", ["zip", "tar.gz"])
+    def test_process_pool_gives_same_bytes(self, course, format):
+        outputs = []
+        for jobs in (1, 2):
+            buffer = io.BytesIO()
+            archive_many([str(course)], buffer, format=format, targets=["task", "solution"], jobs=jobs)
+            outputs.append(buffer.getvalue())
+        assert outputs[0] == outputs[1]
+
+    @pytest.mark.parametrize("options", [{"stream": True}, {"canonical": True}])
+    def test_notebook_options(self, course, tmp_path, options):
+        convert_many([str(course / "week2")], str(tmp_path / "render"), **options)
+        buffer = io.BytesIO()
+        archive_many([str(course / "week2")], buffer, format="tar", **options)
+        assert read_tar(buffer.getvalue()) == {"seminar.ipynb": (tmp_path / "render" / "seminar.ipynb").read_bytes()}
+
+    def test_named_archive(self, course, tmp_path):
+        archive = tmp_path / "release.tar.gz"
+        report = archive_many([str(course)], str(archive))
+        assert report.written == 3
+        assert sorted(read_tar(archive.read_bytes())) == ["week1/hw.py", "week1/notes.md", "week2/seminar.ipynb"]
+        mtime = archive.stat().st_mtime_ns
+        archive_many([str(course)], str(archive))
+        assert archive.stat().st_mtime_ns == mtime
+
+    def test_failures_are_left_out(self, course):
+        (course / "week1" / "broken.py").write_text('"""<codehere>"""\nx = 1\n')
+        buffer = io.BytesIO()
+        report = archive_many([str(course)], buffer, format="zip")
+        assert report.total == 4 and report.written == 3
+        ((infile, error),) = report.failures
+        assert infile.endswith("broken.py") and isinstance(error, UnclosedTagError)
+        assert "week1/broken.py" not in read_zip(buffer.getvalue())
+
+    def test_malformed_notebook_is_left_out(self, course):
+        (course / "week2" / "broken.ipynb").write_text('{"nbformat": 4}')
+        buffer = io.BytesIO()
+        report = archive_many([str(course)], buffer, format="zip")
+        assert (report.total, report.written) == (4, 3)
+        ((infile, error),) = report.failures
+        assert infile.endswith("broken.ipynb") and isinstance(error, KeyError)
+
+    def test_stats(self, course):
+        stats = Stats()
+        archive_many([str(course)], io.BytesIO(), format="zip", jobs=2, stats=stats)
+        assert stats.counts["files"] == 3
+        assert stats.counts["blocks"] > 0
+
+    def test_colliding_entries_are_rejected(self, course, tmp_path):
+        (tmp_path / "other").mkdir()
+        (tmp_path / "other" / "hw.py").write_text("x = 1\n")
+        buffer = io.BytesIO()
+        with pytest.raises(ValueError, match="would both be written to hw.py"):
+            archive_many([str(course / "week1" / "hw.py"), str(tmp_path / "other" / "hw.py")], buffer, format="zip")
+        assert buffer.getvalue() == b""
+
+    def test_format_of_file_object_is_required(self, course):
+        with pytest.raises(ValueError, match="must be given"):
+            archive_many([str(course)], io.BytesIO())
+
+    def test_plan_entries(self, course):
+        plan = plan_entries([str(course / "week1" / "hw.py")], targets=["task", "solution"])
+        assert plan == [(str(course / "week1" / "hw.py"), [("task", "task/hw.py"), ("solution", "solution/hw.py")])]
+
+
+class TestArchiveCli:
+    def test_named_archive(self, course, tmp_path, capsys):
+        archive = tmp_path / "release.zip"
+        main([str(course), "--archive", str(archive), "--both"])
+        assert len(read_zip(archive.read_bytes())) == 6
+        assert "Saved 6 outputs of 3 files in:" in capsys.readouterr().err
+
+    def test_stdout(self, course, capsysbinary):
+        main([str(course), "--archive", "-", "--archive-format", "tar"])
+        assert sorted(read_tar(capsysbinary.readouterr().out)) == [
+            "week1/hw.py",
+            "week1/notes.md",
+            "week2/seminar.ipynb",
+        ]
+
+    def test_failures_exit_with_status_1(self, course, tmp_path):
+        (course / "broken.py").write_text('"""<codehere>"""\n')
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(course), "--archive", str(tmp_path / "release.zip")])
+        assert exc_info.value.code == 1
+
+    @pytest.mark.parametrize(
+        "extra, message",
+        [
+            (["--archive", "-"], "--archive-format is required"),
+            (["--archive", "out.7z"], "Cannot tell the archive format"),
+            (["--archive", "out.zip", "--outdir", "render"], "--outdir cannot be used with --archive"),
+            (["--archive", "out.zip", "--incremental"], "--incremental cannot be used with --archive"),
+            (["--archive-format", "zip"], "--archive-format only applies to --archive"),
+            (["--archive", "-", "--archive-format", "zip", "--stats", "--stats-format", "json"], "--stats-format json"),
+        ],
+    )
+    def test_rejected_options(self, course, extra, message, capsys):
+        with pytest.raises(SystemExit):
+            main([str(course), *extra])
+        assert message in capsys.readouterr().err
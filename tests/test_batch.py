@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from codehere.batch import convert_many, format_failures, plan_outputs
+from codehere.cache import BuildCache
+from codehere.exceptions import UnclosedTagError
+from codehere.utils import collect_inputs
+
+
+@pytest.fixture
+def course(tmp_path, sample_py, sample_ipynb, sample_md):
+    root = tmp_path / "course"
+    (root / "week1").mkdir(parents=True)
+    (root / "week2" / ".ipynb_checkpoints").mkdir(parents=True)
+    (root / "week1" / "hw.py").write_text(Path(sample_py).read_text())
+    (root / "week1" / "notes.md").write_text(Path(sample_md).read_text())
+    (root / "week2" / "seminar.ipynb").write_text(Path(sample_ipynb).read_text())
+    (root / "week2" / ".ipynb_checkpoints" / "seminar-checkpoint.ipynb").write_text(Path(sample_ipynb).read_text())
+    (root / "week2" / "data.csv").write_text("a,b\n")
+    return root
+
+
+class TestCollectInputs:
+    def test_directory(self, course):
+        found = collect_inputs([str(course)])
+        assert [str(relative) for _, relative in found] == [
+            str(Path("week1/hw.py")),
+            str(Path("week1/notes.md")),
+            str(Path("week2/seminar.ipynb")),
+        ]
+
+    def test_glob(self, course):
+        found = collect_inputs([str(course / "*" / "*.py")])
+        assert [(path.name, str(relative)) for path, relative in found] == [("hw.py", str(Path("week1/hw.py")))]
+
+    def test_plain_file_kept(self, tmp_path):
+        found = collect_inputs([str(tmp_path / "notes.txt")])
+        assert found == [(tmp_path / "notes.txt", Path("notes.txt"))]
+
+
+class TestConvertMany:
+    def test_mirrors_tree(self, course, tmp_path):
+        outdir = tmp_path / "render"
+        report = convert_many([str(course)], str(outdir), clear=True)
+        assert report == (3, 3, [])
+        assert "raise NotImplementedError" in (outdir / "week1" / "hw.py").read_text()
+        notebook = json.loads((outdir / "week2" / "seminar.ipynb").read_text())
+        assert all(cell.get("outputs", []) == [] for cell in notebook["cells"])
+
+    def test_process_pool(self, course, tmp_path):
+        outdir = tmp_path / "render"
+        report = convert_many([str(course)], str(outdir), targets=["task", "solution"], jobs=2)
+        assert report == (3, 6, [])
+        assert "math.pi * radius ** 2" in (outdir / "solution" / "week1" / "hw.py").read_text()
+        assert "math.pi * radius ** 2" not in (outdir / "task" / "week1" / "hw.py").read_text()
+
+    def test_skips_outdir_inside_inputs(self, course):
+        convert_many([str(course)], str(course / "render"))
+        assert len(plan_outputs([str(course)], str(course / "render"))) == 3
+
+    @pytest.mark.parametrize("inputs", [["a", "b"], ["a/x.py", "b/x.py"]])
+    def test_colliding_outputs_are_rejected(self, tmp_path, inputs):
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "x.py").write_text(f"{name} = 1\n")
+        outdir = tmp_path / "render"
+        with pytest.raises(ValueError, match="would both be written to x.py"):
+            convert_many([str(tmp_path / path) for path in inputs], str(outdir))
+        assert not outdir.exists()
+
+    def test_failures_keep_cell_details(self, course, tmp_path):
+        notebook = {"cells": [{"cell_type": "code", "source": ["x\n", '"""<codehere>"""\n'], "outputs": []}]}
+        (course / "week2" / "broken.ipynb").write_text(json.dumps(notebook))
+        total, written, failures = convert_many([str(course)], str(tmp_path / "render"), jobs=2)
+        assert (total, written) == (4, 3)
+        [(infile, error)] = failures
+        assert infile.endswith("broken.ipynb")
+        assert isinstance(error, UnclosedTagError)
+        assert (error.line, error.cell) == (1, 0)
+        assert "Unclosed tag in line: 1 in cell: 0" in format_failures(failures, total)
+
+    @pytest.mark.parametrize("notebook", [{"nbformat": 4}, {"cells": [{"source": []}]}])
+    def test_malformed_notebook_does_not_stop_the_others(self, course, tmp_path, notebook):
+        (course / "week2" / "broken.ipynb").write_text(json.dumps(notebook))
+        total, written, failures = convert_many([str(course)], str(tmp_path / "render"))
+        assert (total, written) == (4, 3)
+        [(infile, error)] = failures
+        assert infile.endswith("broken.ipynb") and isinstance(error, KeyError)
+
+    def test_incremental(self, course, tmp_path):
+        outdir = tmp_path / "render"
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        assert convert_many([str(course)], str(outdir), jobs=2, cache=cache).written == 3
+
+        (course / "week1" / "hw.py").write_text("x = 1\n")
+        (outdir / "week1" / "notes.md").write_text("edited by hand\n")
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        assert convert_many([str(course)], str(outdir), cache=cache).written == 2
+        assert (outdir / "week1" / "hw.py").read_text() == "x = 1\n"
+        assert "edited by hand" not in (outdir / "week1" / "notes.md").read_text()
+
+        assert convert_many([str(course)], str(outdir), cache=cache).written == 0
+        assert convert_many([str(course)], str(outdir), cache=cache, clear=True).written == 3
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from benchmarks import workloads
+from benchmarks.run import BENCHMARKS, Result, compare, main, run_benchmarks, to_baseline
+from codehere.converter import Converter
+
+
+class TestWorkloads:
+    def test_code_lines_are_valid(self):
+        lines = workloads.code_lines(10)
+        assert len(Converter().find_blocks(lines)) == 10
+
+    def test_notebook_shape(self, tmp_path):
+        path = tmp_path / "nb.ipynb"
+        workloads.notebook_file(str(path), 3, 2, output_bytes=1000)
+        notebook = json.loads(path.read_text())
+        code = [cell for cell in notebook["cells"] if cell["cell_type"] == "code"]
+        assert len(code) == 3
+        assert len(code[0]["outputs"][1]["data"]["image/png"]) >= 1000
+
+
+def result(throughput: float, peak: int | None = 1_000_000) -> Result:
+    return Result("process_py", 1.0, throughput, "MB/s", peak)
+
+
+class TestCompare:
+    @pytest.fixture
+    def baseline(self):
+        return to_baseline([result(100.0)], scale=1.0)
+
+    def test_within_threshold(self, baseline):
+        assert compare([result(80.0)], baseline, threshold=0.3) == []
+
+    def test_slower(self, baseline):
+        (regression,) = compare([result(60.0)], baseline, threshold=0.3)
+        assert "process_py" in regression
+
+    def test_more_memory(self, baseline):
+        assert compare([result(100.0, peak=2_000_000)], baseline, threshold=0.3)
+
+    def test_unknown_benchmark_ignored(self, baseline):
+        assert compare([Result("new", 1.0, 1.0, "MB/s", None)], baseline) == []
+
+
+class TestRun:
+    def test_every_benchmark_runs(self):
+        results = run_benchmarks(sorted(BENCHMARKS), scale=0.01, repeat=1)
+        assert [r.name for r in results] == sorted(BENCHMARKS)
+        assert all(r.throughput > 0 for r in results)
+
+    def test_check_fails_on_regression(self, tmp_path, capsys):
+        path = tmp_path / "baseline.json"
+        main(["process_lines", "--scale", "0.01", "--repeat", "1", "--baseline", str(path), "--save"])
+        baseline = json.loads(path.read_text())
+        baseline["results"]["process_lines"]["throughput"] *= 1000
+        path.write_text(json.dumps(baseline))
+        with pytest.raises(SystemExit) as exc_info:
+            main(["process_lines", "--scale", "0.01", "--repeat", "1", "--baseline", str(path), "--check"])
+        assert exc_info.value.code == 1
+        assert "process_lines" in capsys.readouterr().err
@@ -0,0 +1,73 @@
+import os
+
+from codehere.cache import BuildCache, make_options
+from codehere.processors import process_file
+
+
+class TestProcessFileCache:
+    def test_skips_unchanged(self, sample_py, tmp_path):
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        out = str(tmp_path / "out.py")
+        assert process_file(sample_py, out, cache=cache) is True
+        assert process_file(sample_py, out, cache=cache) is False
+
+    def test_options_are_part_of_key(self, sample_py, tmp_path):
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        out = str(tmp_path / "out.py")
+        process_file(sample_py, out, cache=cache)
+        assert process_file(sample_py, out, replacement=" TODO ", cache=cache) is True
+        assert "TODO" in open(out).read()
+
+    def test_stream_is_part_of_key(self, sample_ipynb, tmp_path):
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        out = tmp_path / "out.ipynb"
+        process_file(sample_ipynb, str(out), stream=True, cache=cache)
+        streamed = out.read_bytes()
+        assert process_file(sample_ipynb, str(out), cache=cache) is True
+        process_file(sample_ipynb, str(tmp_path / "plain.ipynb"))
+        assert out.read_bytes() == (tmp_path / "plain.ipynb").read_bytes() != streamed
+
+    def test_rewrites_modified_output(self, sample_py, tmp_path):
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        out = tmp_path / "out.py"
+        process_file(sample_py, str(out), cache=cache)
+        out.write_text("edited\n")
+        assert process_file(sample_py, str(out), cache=cache) is True
+        out.unlink()
+        assert process_file(sample_py, str(out), cache=cache) is True
+
+    def test_touched_output_checks_hash(self, sample_py, tmp_path):
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        out = tmp_path / "out.py"
+        process_file(sample_py, str(out), cache=cache)
+        os.utime(out, ns=(0, 0))
+        assert process_file(sample_py, str(out), cache=cache) is False
+
+    def test_input_change(self, sample_py, tmp_path):
+        infile = tmp_path / "in.py"
+        infile.write_text(open(sample_py).read())
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        out = str(tmp_path / "out.py")
+        process_file(str(infile), out, cache=cache)
+        infile.write_text("x = 1\n")
+        assert process_file(str(infile), out, cache=cache) is True
+
+
+class TestBuildCache:
+    def test_save_and_load(self, sample_py, tmp_path):
+        path = str(tmp_path / "cache.json")
+        out = str(tmp_path / "out.py")
+        cache = BuildCache(path)
+        process_file(sample_py, out, cache=cache)
+        cache.save()
+        assert BuildCache(path).is_fresh(sample_py, out, make_options())
+
+    def test_invalidate(self, sample_py, tmp_path):
+        cache = BuildCache(str(tmp_path / "cache.json"))
+        out = str(tmp_path / "out.py")
+        process_file(sample_py, out, cache=cache)
+        assert cache.invalidate([str(tmp_path / "other.py")]) == 0
+        assert cache.invalidate([sample_py]) == 1
+        assert not cache.is_fresh(sample_py, out, make_options())
+        process_file(sample_py, out, cache=cache)
+        assert cache.is_fresh(sample_py, out, make_options())
@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from codehere import check
+from codehere.check import CheckReport, check_file, check_many, check_text, format_problems
+from codehere.cli import main
+from codehere.converter import Converter
+from codehere.exceptions import NoOpenTagError, UnclosedTagError
+
+BEGIN, END = '"""<codehere>"""\n', '"""</codehere>"""\n'
+COMMENT_BEGIN, COMMENT_END = '"""<comment>"""\n', '"""</comment>"""\n'
+
+
+def errors(lines):
+    return [(type(error), error.line) for error in Converter().check_lines(lines)]
+
+
+class TestCheckLines:
+    def test_valid(self):
+        assert errors([BEGIN, "x\n", END, COMMENT_BEGIN, COMMENT_END]) == []
+
+    def test_collects_every_error(self):
+        lines = [END, BEGIN, "x\n", END, END, BEGIN]
+        assert errors(lines) == [(NoOpenTagError, 0), (NoOpenTagError, 4), (UnclosedTagError, 5)]
+
+    @pytest.mark.parametrize(
+        "lines",
+        [
+            [BEGIN, BEGIN, END],
+            [COMMENT_BEGIN, BEGIN, COMMENT_END],
+            [BEGIN, COMMENT_BEGIN, END, END],
+            [END, BEGIN],
+            [COMMENT_BEGIN, "a\n", BEGIN],
+        ],
+    )
+    def test_error_of_find_blocks_is_reported(self, lines):
+        with pytest.raises((NoOpenTagError, UnclosedTagError)) as exc_info:
+            Converter().find_blocks(lines)
+        assert (type(exc_info.value), exc_info.value.line) in errors(lines)
+
+    def test_errors_are_in_line_order(self):
+        # find_blocks stops at the block still open at the end, the innermost one, in line 2.
+        assert errors([COMMENT_BEGIN, "a\n", BEGIN]) == [(UnclosedTagError, 0), (UnclosedTagError, 2)]
+
+    def test_check_text(self):
+        assert [error.line for error in check_text("x = 1\n" + BEGIN)] == [1]
+
+
+class TestCheckFile:
+    def test_samples_are_valid(self, sample_py, sample_md, sample_ipynb):
+        assert check_file(sample_py) == check_file(sample_md) == check_file(sample_ipynb) == []
+
+    def test_notebook_errors_name_cells(self, sample_ipynb, tmp_path):
+        notebook = json.loads(open(sample_ipynb).read())
+        code = [index for index, cell in enumerate(notebook["cells"]) if cell["cell_type"] == "code"]
+        notebook["cells"][code[0]]["source"] = [END]
+        notebook["cells"][code[1]]["source"] = "x = 1\n" + BEGIN
+        path = tmp_path / "broken.ipynb"
+        path.write_text(json.dumps(notebook))
+        found = [(type(error), error.cell, error.line) for error in check_file(str(path))]
+        assert found == [(NoOpenTagError, code[0], 0), (UnclosedTagError, code[1], 1)]
+
+    def test_writes_nothing(self, sample_py, tmp_path):
+        check_many([str(tmp_path)])
+        assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / "ok.py").write_text(BEGIN + END)
+    (tmp_path / "bad.py").write_text(END + BEGIN)
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "bad.md").write_text(BEGIN)
+    (tmp_path / "sub" / "broken.ipynb").write_text("{")
+    return tmp_path
+
+
+class TestCheckMany:
+    def test_reports_every_problem(self, tree):
+        report = check_many([str(tree)], jobs=1)
+        assert report.total == 4
+        found = sorted((infile.rsplit("/", 1)[1], type(error).__name__) for infile, error in report.problems)
+        assert found == [
+            ("bad.md", "UnclosedTagError"),
+            ("bad.py", "NoOpenTagError"),
+            ("bad.py", "UnclosedTagError"),
+            ("broken.ipynb", "JSONDecodeError"),
+        ]
+
+    def test_parallel_matches_serial(self, tree, monkeypatch):
+        monkeypatch.setattr(check, "MIN_FILES_PER_JOB", 1)
+        def summary(report):
+            return [(infile, type(error), str(error)) for infile, error in report.problems]
+
+        assert summary(check_many([str(tree)], jobs=2)) == summary(check_many([str(tree)], jobs=1))
+
+    def test_format(self):
+        assert format_problems(CheckReport(3, [])) == "Checked 3 files: no problems\n"
+        text = format_problems(CheckReport(3, [("a.py", NoOpenTagError("No open tag for line: 0", line=0))]))
+        assert text == "a.py: NoOpenTagError: No open tag for line: 0\n1 problems in 1 of 3 files\n"
+
+
+class TestCliCheck:
+    def test_ok(self, sample_py, capsys):
+        main([sample_py, "--check"])
+        assert "no problems" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("extra, jobs", [([], None), (["-j", "0"], None), (["-j", "1"], 1), (["-j", "3"], 3)])
+    def test_jobs(self, tree, monkeypatch, extra, jobs):
+        calls = []
+
+        def check_many(paths, **kwargs):
+            calls.append(kwargs["jobs"])
+            return CheckReport(0, [])
+
+        monkeypatch.setattr(check, "check_many", check_many)
+        main([str(tree), "--check", *extra])
+        assert calls == [jobs]
+
+    def test_problems_exit_non_zero(self, tree, capsys):
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(tree), "--check"])
+        assert exc_info.value.code == 1
+        assert "4 problems in 3 of 4 files" in capsys.readouterr().err
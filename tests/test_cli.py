@@ -1,6 +1,10 @@
+import io
+import json
+
 import pytest
 
 from codehere.cli import build_parser, main
+from codehere.processors import convert_text
 
 
 class TestBuildParser:
@@ -20,11 +24,20 @@ class TestBuildParser:
     def test_defaults(self):
         parser = build_parser()
         args = parser.parse_args(["file.py"])
-        assert args.file == "file.py"
+        assert args.file == ["file.py"]
+        assert args.outdir is None
+        assert args.jobs is None
         assert args.solution is False
         assert args.clear is False
         assert args.outfile is None
         assert args.replacement == " Your code here "
+        assert args.both is False
+        assert args.stream is False
+
+    def test_both_excludes_solution(self):
+        parser = build_parser()
+        with pytest.raises(SystemExit):
+            parser.parse_args(["file.py", "--both", "--solution"])
 
 
 class TestMain:
@@ -49,3 +62,116 @@ class TestMain:
         main([sample_py, "--outfile", out, "--replacement", "TODO"])
         text = open(out).read()
         assert "TODO" in text
+
+    def test_both_flag(self, sample_py, tmp_path):
+        infile = tmp_path / "hw.py"
+        infile.write_text(open(sample_py).read())
+        main([str(infile), "--both"])
+        assert "raise NotImplementedError" in (tmp_path / "hw-task.py").read_text()
+        assert "math.pi * radius ** 2" in (tmp_path / "hw-solution.py").read_text()
+
+    def test_both_rejects_outfile(self, sample_py, tmp_path):
+        with pytest.raises(SystemExit):
+            main([sample_py, "--both", "--outfile", str(tmp_path / "out.py")])
+
+    def test_directory_batch(self, fixtures_dir, tmp_path):
+        outdir = tmp_path / "out"
+        main([str(fixtures_dir), "--outdir", str(outdir), "--both"])
+        assert "raise NotImplementedError" in (outdir / "task" / "sample.py").read_text()
+        assert "return 42" in (outdir / "solution" / "sample.md").read_text()
+        assert (outdir / "task" / "sample.ipynb").exists()
+
+    def test_batch_requires_outdir(self, fixtures_dir):
+        with pytest.raises(SystemExit):
+            main([str(fixtures_dir)])
+
+    def test_batch_rejects_colliding_outputs(self, tmp_path, capsys):
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "x.py").write_text("x = 1\n")
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(tmp_path / "a"), str(tmp_path / "b"), "--outdir", str(tmp_path / "out")])
+        assert exc_info.value.code == 2
+        assert "would both be written to x.py" in capsys.readouterr().err
+        assert not (tmp_path / "out").exists()
+
+    @pytest.mark.parametrize("extra, jobs", [([], 1), (["-j", "0"], None), (["-j", "3"], 3)])
+    def test_batch_jobs(self, fixtures_dir, tmp_path, monkeypatch, extra, jobs):
+        from codehere import batch
+
+        calls = []
+
+        def convert_many(paths, outdir, **kwargs):
+            calls.append(kwargs["jobs"])
+            return batch.BatchReport(0, 0, [])
+
+        monkeypatch.setattr(batch, "convert_many", convert_many)
+        main([str(fixtures_dir), "--outdir", str(tmp_path / "out"), *extra])
+        assert calls == [jobs]
+
+    def test_batch_reports_failures(self, sample_py, tmp_path, capsys):
+        broken = tmp_path / "broken.py"
+        broken.write_text('"""<codehere>"""\nx = 1\n')
+        with pytest.raises(SystemExit) as exc_info:
+            main([sample_py, str(broken), "--outdir", str(tmp_path / "out")])
+        assert exc_info.value.code == 1
+        err = capsys.readouterr().err
+        assert "broken.py: UnclosedTagError: Unclosed tag in line: 0" in err
+        assert "1 of 2 files failed" in err
+
+    def test_incremental(self, sample_py, tmp_path, capsys, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        infile = tmp_path / "hw.py"
+        infile.write_text(open(sample_py).read())
+        main([str(infile), "--incremental"])
+        main([str(infile), "--incremental"])
+        assert "Up to date:" in capsys.readouterr().err
+        assert not (tmp_path / "hw-task1.py").exists()
+
+        main([str(infile), "--invalidate"])
+        main([str(infile), "--incremental"])
+        assert "Saved in:" in capsys.readouterr().err
+
+
+class TestPipe:
+    @pytest.fixture
+    def stdin(self, monkeypatch):
+        def feed(data: bytes) -> None:
+            monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(data)))
+
+        return feed
+
+    def test_stdin_to_stdout(self, sample_py, stdin, capsysbinary, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        stdin(open(sample_py, "rb").read())
+        main(["-", "--format", "py"])
+        captured = capsysbinary.readouterr()
+        assert captured.out == convert_text(open(sample_py, "rb").read())
+        assert captured.err == b""
+        assert list(tmp_path.iterdir()) == []
+
+    def test_notebook(self, sample_ipynb, stdin, capsysbinary):
+        stdin(open(sample_ipynb, "rb").read())
+        main(["-", "--format", "ipynb", "--clear", "--solution"])
+        cells = json.loads(capsysbinary.readouterr().out)["cells"]
+        assert all(cell.get("outputs", []) == [] for cell in cells)
+
+    def test_file_to_stdout(self, sample_md, capsysbinary):
+        main([sample_md, "--outfile", "-", "--solution"])
+        assert b"return 42" in capsysbinary.readouterr().out
+
+    def test_stdin_to_outfile(self, sample_py, stdin, tmp_path, capsys):
+        stdin(open(sample_py, "rb").read())
+        main(["-", "--format", "py", "--outfile", str(tmp_path / "out.py")])
+        assert "raise NotImplementedError" in (tmp_path / "out.py").read_text()
+        assert "Saved in:" in capsys.readouterr().err
+
+    @pytest.mark.parametrize(
+        "argv",
+        [["-"], ["file.py", "--format", "py"], ["-", "--format", "py", "--both"], ["-", "x.py", "--format", "py"]],
+    )
+    def test_rejected(self, argv, stdin):
+        stdin(b"")
+        with pytest.raises(SystemExit) as exc_info:
+            main(argv)
+        assert exc_info.value.code == 2
@@ -32,6 +32,20 @@ class TestConvertAPI:
         text = open(out).read()
         assert "TODO" in text
 
+    def test_convert_targets(self, sample_py, tmp_path):
+        task, solution = str(tmp_path / "task.py"), str(tmp_path / "solution.py")
+        convert(file=sample_py, outfile={"task": task, "solution": solution}, targets=["task", "solution"])
+        assert "raise NotImplementedError" in open(task).read()
+        assert "math.pi * radius ** 2" in open(solution).read()
+
+    def test_convert_unknown_target(self, sample_py):
+        with pytest.raises(ValueError):
+            convert(file=sample_py, targets=["answers"])
+
+    def test_convert_single_outfile_many_targets(self, sample_py, tmp_path):
+        with pytest.raises(ValueError):
+            convert(file=sample_py, outfile=str(tmp_path / "out.py"), targets=["task", "solution"])
+
 
 class TestPublicExports:
     def test_all_exports(self):
@@ -40,6 +54,8 @@ class TestPublicExports:
         assert hasattr(codehere, "Converter")
         assert hasattr(codehere, "convert")
         assert hasattr(codehere, "process_file")
+        assert hasattr(codehere, "compile_file")
+        assert hasattr(codehere, "CompiledDocument")
         assert hasattr(codehere, "CodehereError")
         assert hasattr(codehere, "TagError")
         assert hasattr(codehere, "UnclosedTagError")
@@ -1,6 +1,8 @@
+import time
+
 import pytest
 
-from codehere.converter import Converter
+from codehere.converter import Block, Converter, RenderCache
 from codehere.exceptions import NoOpenTagError, UnclosedTagError
 
 
@@ -49,6 +51,60 @@ class TestConsistency:
             c.check_separators_consistency(lines)
 
 
+class TestFindBlocks:
+    def test_blocks_of_both_kinds(self):
+        lines = ['"""<codehere>"""', "code", '"""</codehere>"""', '"""<comment>"""', "grading", '"""</comment>"""']
+        assert Converter().find_blocks(lines) == [Block(0, 2, "codehere"), Block(3, 5, "comment")]
+
+    def test_nested_blocks_ordered_by_begin(self):
+        lines = ['"""<codehere>"""', '"""<comment>"""', "x", '"""</comment>"""', '"""</codehere>"""']
+        assert Converter().find_blocks(lines) == [Block(0, 4, "codehere"), Block(1, 3, "comment")]
+
+    def test_tags_are_escaped(self):
+        c = Converter(sep_begin="[*]", sep_end="[/*]")
+        assert c.find_blocks(["[*]", "x", "[/*]"]) == [Block(0, 2, "codehere")]
+        assert c.find_blocks(["*", "x", "/*"]) == []
+
+    def test_interleaved_kinds(self):
+        lines = ['"""<comment>"""', '"""<codehere>"""', '"""</comment>"""', '"""</codehere>"""']
+        with pytest.raises(UnclosedTagError) as exc_info:
+            Converter().find_blocks(lines)
+        assert exc_info.value.line == 1
+
+    def test_no_open_tag_reports_line(self):
+        lines = ['"""<comment>"""', '"""</comment>"""', "x", '"""</codehere>"""']
+        with pytest.raises(NoOpenTagError) as exc_info:
+            Converter().find_blocks(lines)
+        assert exc_info.value.line == 3
+
+
+class TestPrefilter:
+    def test_has_tags(self):
+        c = Converter()
+        assert c.has_tags(["x = 1\n", '    """<comment>"""\n'])
+        assert c.has_tags('"""</codehere>"""')
+        assert not c.has_tags(["x = 1\n", '"""docstring"""\n'])
+
+    def test_sentinel_in_lines_that_are_not_tags(self):
+        lines = ['"""<b>bold</b>"""\n', '"""<codehere>"""\n', 'x = """<codehere>"""\n', '"""</codehere>"""\n']
+        assert Converter().find_blocks(lines) == [Block(1, 3, "codehere")]
+
+    def test_sentinel_across_lines(self):
+        lines = ['x = \'""', '"<codehere>"""\'\n', "", '"""<comment>"""\n', '"""</comment>"""']
+        assert Converter().find_blocks(lines) == [Block(3, 4, "comment")]
+
+    def test_tags_without_common_prefix(self):
+        c = Converter(sep_begin="# begin", sep_end="# end")
+        assert c.has_tags(["# begin\n"])
+        assert c.find_blocks(["# begin\n", "x\n", "# end\n"]) == [Block(0, 2, "codehere")]
+        assert list(c.iter_lines(["# begin\n", "x\n", "# end\n"], solution=True))[1] == "x\n"
+
+    def test_render_tagged(self):
+        c = Converter()
+        assert c.render_tagged(["x = 1\n"]) is None
+        assert c.render_tagged(['"""<codehere>"""\n', "x\n", '"""</codehere>"""\n'])[1] == "raise NotImplementedError\n"
+
+
 class TestRenderTextBlock:
     def test_task_mode(self):
         c = Converter()
@@ -76,6 +132,35 @@ class TestRenderTextBlock:
         c.render_text_block(lines, begin_rep="", end_rep="")
         assert lines == original
 
+    def test_multiple_blocks(self):
+        c = Converter()
+        lines = ['"""<codehere>"""\n', "a\n", '"""</codehere>"""\n', "b\n", '    """<codehere>"""\n', "c\n", '    """</codehere>"""\n']
+        result = c.render_text_block(lines, begin_rep="# BEGIN", end_rep="# END")
+        assert result == [
+            "# BEGIN\n",
+            "raise NotImplementedError\n",
+            "# END\n",
+            "b\n",
+            "    # BEGIN\n",
+            "    raise NotImplementedError\n",
+            "    # END\n",
+        ]
+
+    @pytest.mark.parametrize("code_replacement", [Converter.CODE_REPLACEMENT, None])
+    def test_linear_in_number_of_blocks(self, code_replacement):
+        def best_time(blocks):
+            lines = ['"""<codehere>"""\n', "code\n", '"""</codehere>"""\n', "text\n"] * blocks
+            c = Converter(code_replacement=code_replacement)
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                c.render_text_block(lines, begin_rep="", end_rep="")
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        # Quadratic rewriting makes 10x more blocks take ~100x longer.
+        assert best_time(10_000) < 30 * best_time(1_000)
+
 
 class TestProcessLines:
     def test_task_strips_both_tags(self):
@@ -101,6 +186,116 @@ class TestProcessLines:
         result = Converter().process_lines(lines, solution=True)
         assert "code\n" in result
 
+    def test_solution_removes_nested_comment(self):
+        lines = [
+            '"""<codehere>"""\n',
+            "code\n",
+            '"""<comment>"""\n',
+            "# grading\n",
+            '"""</comment>"""\n',
+            '"""</codehere>"""\n',
+        ]
+        result = Converter().process_lines(lines, solution=True)
+        assert "code\n" in result
+        assert "# grading\n" not in result
+        assert len(result) == 6
+
+
+class TestIterLines:
+    LINES = [
+        "before\n",
+        '"""<codehere>"""\n',
+        "code\n",
+        '"""<comment>"""\n',
+        "# grading\n",
+        '"""</comment>"""\n',
+        '"""</codehere>"""\n',
+        '"""<comment>"""\n',
+        "# hidden\n",
+        '"""</comment>"""\n',
+        "after\n",
+    ]
+
+    @pytest.mark.parametrize("solution", [False, True])
+    def test_matches_process_lines(self, solution):
+        c = Converter()
+        expected = c.process_lines(self.LINES, solution=solution)
+        assert list(c.iter_lines(iter(self.LINES), solution=solution)) == expected
+
+    def test_yields_before_reading_everything(self):
+        consumed = []
+
+        def source():
+            for line in ["a\n", "b\n"]:
+                consumed.append(line)
+                yield line
+            raise AssertionError("read past the first line")
+
+        assert next(Converter().iter_lines(source())) == "a\n"
+        assert consumed == ["a\n"]
+
+    def test_error_line_numbers(self):
+        lines = ["x\n", "y\n", '"""<codehere>"""\n', "z\n"]
+        with pytest.raises(UnclosedTagError) as exc_info:
+            list(Converter().iter_lines(iter(lines)))
+        assert exc_info.value.line == 2
+
+
+class TestRenderCache:
+    LINES = ['"""<codehere>"""\n', "code\n", '"""</codehere>"""\n']
+
+    def test_hits_and_misses(self):
+        c = Converter(render_cache=RenderCache())
+        first = c.process_lines(self.LINES)
+        second = c.process_lines(list(self.LINES))
+        assert first == second == Converter().process_lines(self.LINES)
+        assert c.render_cache.info()[:3] == (1, 1, 1)
+
+    def test_options_are_part_of_key(self):
+        c = Converter(render_cache=RenderCache())
+        task = c.process_lines(self.LINES)
+        solution = c.process_lines(self.LINES, solution=True)
+        todo = c.process_lines(self.LINES, replacement=" TODO ")
+        assert len({tuple(task), tuple(solution), tuple(todo)}) == 3
+        assert c.render_cache.hits == 0
+
+    def test_returns_copies(self):
+        c = Converter(render_cache=RenderCache())
+        c.process_lines(self.LINES).append("mutated\n")
+        assert "mutated\n" not in c.process_lines(self.LINES)
+
+    @staticmethod
+    def source(code: str) -> list[str]:
+        return ['"""<comment>"""\n', code, '"""</comment>"""\n']
+
+    def test_evicts_least_recently_used(self):
+        cache = RenderCache(maxsize=2, max_bytes=None)
+        c = Converter(render_cache=cache)
+        a, b = self.source("a\n"), self.source("b\n")
+        c.process_lines(a)
+        c.process_lines(b)
+        c.process_lines(a)
+        c.process_lines(self.source("c\n"))
+        assert cache.get((c.begin_sep, c.end_sep, False, " Your code here ", tuple(b))) is None
+        assert cache.get((c.begin_sep, c.end_sep, False, " Your code here ", tuple(a))) == Converter().process_lines(a)
+
+    def test_byte_cap(self):
+        c = Converter(render_cache=RenderCache(maxsize=None, max_bytes=None))
+        c.process_lines(self.source("1234\n"))
+        size = c.render_cache.bytes
+        cache = c.render_cache = RenderCache(maxsize=None, max_bytes=size)
+        c.process_lines(self.source("1234\n"))
+        c.process_lines(self.source("5678\n"))
+        assert cache.info().entries == 1
+        assert cache.bytes == size
+        c.process_lines(self.source("x" * size))
+        assert cache.info().entries == 1
+
+    def test_skips_sources_without_tags(self):
+        c = Converter(render_cache=RenderCache())
+        assert c.process_lines(["a\n"]) == ["a\n"]
+        assert c.render_cache.info() == (0, 0, 0, 0)
+
 
 class TestGetReplacement:
     def test_default(self):
@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from codehere import convert, detect
+from codehere.detect import DetectedNotebook, detect_notebook, find_session_path, session_path
+
+KERNEL = "0f1e2d3c-aaaa-bbbb-cccc-123456789abc"
+
+
+class SessionsServer(ThreadingHTTPServer):
+    """Stand-in for a Jupyter server that only answers ``GET /api/sessions``."""
+
+    daemon_threads = True
+    block_on_close = False
+
+    def __init__(self, sessions: list[dict], *, delay: float = 0.0, token: str | None = None) -> None:
+        self.sessions = sessions
+        self.delay = delay
+        self.token = token
+        self.requests = 0
+        super().__init__(("127.0.0.1", 0), SessionsHandler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class SessionsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        if self.server.token and self.headers.get("Authorization") != "token " + self.server.token:
+            self.send_error(403)
+            return
+        body = json.dumps(self.server.sessions).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def start_server():
+    servers = []
+
+    def start(sessions, **kwargs):
+        server = SessionsServer(sessions, **kwargs)
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def notebook_root(tmp_path, sample_ipynb):
+    (tmp_path / "lesson.ipynb").write_text(open(sample_ipynb).read())
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def clear_detected(monkeypatch):
+    monkeypatch.setattr(detect, "_detected", {})
+
+
+def session(kernel: str, path: str) -> dict:
+    return {"kernel": {"id": kernel}, "notebook": {"path": path}, "path": path}
+
+
+class TestSessionPath:
+    def test_finds_kernel_notebook(self, start_server, notebook_root):
+        server = start_server([session("other", "x.ipynb"), session(KERNEL, "lesson.ipynb")])
+        info = {"url": server.url, "root_dir": str(notebook_root)}
+        assert session_path(info, KERNEL) == str(notebook_root / "lesson.ipynb")
+
+    def test_sends_token(self, start_server, notebook_root):
+        server = start_server([session(KERNEL, "lesson.ipynb")], token="secret")
+        info = {"url": server.url, "token": "secret", "root_dir": str(notebook_root)}
+        assert session_path(info, KERNEL) == str(notebook_root / "lesson.ipynb")
+
+    def test_missing_file(self, start_server, notebook_root):
+        server = start_server([session(KERNEL, "gone.ipynb")])
+        assert session_path({"url": server.url, "root_dir": str(notebook_root)}, KERNEL) is None
+
+
+class TestFindSessionPath:
+    def test_hung_server_does_not_block(self, start_server, notebook_root):
+        hung = start_server([], delay=5)
+        good = start_server([session(KERNEL, "lesson.ipynb")], delay=0.05)
+        servers = [{"url": server.url, "root_dir": str(notebook_root)} for server in (hung, good)]
+        started = time.monotonic()
+        assert find_session_path(servers, KERNEL, timeout=2) == str(notebook_root / "lesson.ipynb")
+        assert time.monotonic() - started < 1
+
+    def test_gives_up_at_deadline(self, start_server, notebook_root):
+        hung = start_server([session(KERNEL, "lesson.ipynb")], delay=5)
+        started = time.monotonic()
+        assert find_session_path([{"url": hung.url, "root_dir": str(notebook_root)}], KERNEL, timeout=0.2) is None
+        assert time.monotonic() - started < 1
+
+    def test_unreachable_server(self, notebook_root):
+        assert find_session_path([{"url": "http://127.0.0.1:1/"}], KERNEL, timeout=1) is None
+
+
+class TestDetectNotebook:
+    def test_cached_per_kernel(self, start_server, notebook_root, monkeypatch):
+        server = start_server([session(KERNEL, "lesson.ipynb")])
+        monkeypatch.setattr(detect, "kernel_id", lambda: KERNEL)
+        monkeypatch.setattr(detect, "running_servers", lambda: [{"url": server.url, "root_dir": str(notebook_root)}])
+        expected = DetectedNotebook(str(notebook_root / "lesson.ipynb"))
+        assert detect_notebook() == expected
+        assert detect_notebook() == expected
+        assert server.requests == 1
+
+    def test_colab_payload(self, sample_ipynb, monkeypatch):
+        notebook = json.load(open(sample_ipynb))
+        notebook["metadata"]["colab"] = {"name": "Seminar 1.ipynb"}
+        monkeypatch.setattr(detect, "fetch_colab_notebook", lambda timeout: notebook)
+        assert detect_notebook() == DetectedNotebook("Seminar 1.ipynb", notebook)
+
+    def test_single_notebook_in_cwd(self, notebook_root, monkeypatch):
+        monkeypatch.chdir(notebook_root)
+        assert detect_notebook() == DetectedNotebook(str(notebook_root / "lesson.ipynb"))
+
+    def test_nothing_found(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        assert detect_notebook() is None
+
+
+class TestConvertDetected:
+    def test_colab_writes_without_temp_file(self, sample_ipynb, tmp_path, monkeypatch):
+        notebook = json.load(open(sample_ipynb))
+        notebook["metadata"]["colab"] = {"name": "lesson.ipynb"}
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(detect, "fetch_colab_notebook", lambda timeout: notebook)
+        convert(targets=["task", "solution"])
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["lesson-solution.ipynb", "lesson-task.ipynb"]
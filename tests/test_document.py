@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from codehere.document import CompiledDocument
+from codehere.exceptions import UnclosedTagError
+from codehere.processors import compile_file, process_file
+
+
+class TestCompileFile:
+    @pytest.mark.parametrize("fixture", ["sample_py", "sample_md", "sample_ipynb"])
+    @pytest.mark.parametrize("solution", [False, True])
+    def test_matches_process_file(self, fixture, solution, request, tmp_path):
+        infile = request.getfixturevalue(fixture)
+        suffix = infile.rsplit(".", 1)[1]
+        expected, actual = tmp_path / f"expected.{suffix}", tmp_path / f"actual.{suffix}"
+        process_file(infile, str(expected), solution=solution, clear=True)
+        compile_file(infile).write(str(actual), solution=solution, clear=True)
+        assert actual.read_text() == expected.read_text()
+
+    def test_renders_many_variants(self, sample_py):
+        document = compile_file(sample_py)
+        task = "".join(document.render())
+        solution = "".join(document.render(solution=True))
+        todo = "".join(document.render(replacement=" TODO "))
+        assert "raise NotImplementedError" in task
+        assert "math.pi * radius ** 2" in solution
+        assert "TODO" in todo
+
+
+class TestCompiledNotebook:
+    def test_render_does_not_mutate(self, sample_ipynb):
+        with open(sample_ipynb) as f:
+            notebook = json.load(f)
+        original = json.loads(json.dumps(notebook))
+        document = CompiledDocument.from_notebook(notebook)
+        document.render(clear=True)
+        document.render(solution=True)
+        assert notebook == original
+
+    def test_tag_error_names_cell(self):
+        notebook = {"cells": [{"cell_type": "code", "source": ['"""<codehere>"""\n'], "outputs": []}]}
+        with pytest.raises(UnclosedTagError) as exc_info:
+            CompiledDocument.from_notebook(notebook)
+        assert exc_info.value.cell == 0
+        assert exc_info.value.line == 0
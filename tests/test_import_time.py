@@ -0,0 +1,86 @@
+import subprocess
+import sys
+
+import pytest
+
+# Budgets for the cumulative import time reported by ``python -X importtime``, in microseconds.
+# They are a few times the measured cost, and the best of several runs is compared, so that a
+# slow CI machine passes while an accidental eager import of the converter stack does not.
+IMPORT_BUDGETS_US = {
+    "codehere": 20_000,
+    "codehere.cli": 40_000,
+}
+RUNS = 7
+
+
+def import_time_us(module: str) -> int:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines look like "import time:  self [us] | cumulative | name", nested names are indented.
+    for line in result.stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if name.strip() == module:
+            return int(cumulative)
+    raise AssertionError(f"{module} not found in -X importtime output")
+
+
+def loaded_modules(statement: str) -> set[str]:
+    """Modules imported by *statement* in a fresh interpreter, beyond those loaded at startup."""
+    report = "print(*sys.modules, sep='\\n')"
+    before = subprocess.run([sys.executable, "-c", f"import sys; {report}"], capture_output=True, text=True, check=True)
+    after = subprocess.run(
+        [sys.executable, "-c", f"import sys; {statement}; {report}"], capture_output=True, text=True, check=True
+    )
+    return set(after.stdout.split()) - set(before.stdout.split())
+
+
+class TestLazyImport:
+    def test_import_loads_no_submodules(self):
+        loaded = loaded_modules("import codehere")
+        assert not {module for module in loaded if module.startswith("codehere.")}
+        assert not {"json", "re"} & loaded
+
+    def test_attribute_access_loads_its_module(self):
+        loaded = loaded_modules("from codehere import Converter")
+        assert "codehere.converter" in loaded
+        assert "codehere.processors" not in loaded
+
+    def test_cli_does_not_load_converter(self):
+        loaded = loaded_modules("import codehere.cli")
+        assert "codehere.converter" not in loaded
+        assert "codehere.processors" not in loaded
+        assert not {"codehere.cache", "json", "hashlib"} & loaded
+
+    def test_single_py_conversion_skips_notebook_modules(self, sample_py, tmp_path):
+        outfile = tmp_path / "out.py"
+        argv = [str(sample_py), "--outfile", str(outfile)]
+        loaded = loaded_modules(f"from codehere.cli import main; main({argv!r})")
+        assert "codehere.streaming" not in loaded
+        assert "mmap" not in loaded
+
+    def test_unknown_attribute(self):
+        import codehere
+
+        with pytest.raises(AttributeError):
+            codehere.does_not_exist
+
+    def test_dir_lists_lazy_attributes(self):
+        import codehere
+
+        assert set(codehere.__all__) <= set(dir(codehere))
+
+    def test_lazy_attributes_are_exported(self):
+        import codehere
+
+        assert set(codehere._LAZY_ATTRIBUTES) <= set(codehere.__all__)
+
+
+class TestImportBudget:
+    @pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS_US))
+    def test_within_budget(self, module):
+        best = min(import_time_us(module) for _ in range(RUNS))
+        assert best <= IMPORT_BUDGETS_US[module], f"import {module} took {best} us"
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from codehere import jsonio
+from codehere.cli import main
+from codehere.processors import compile_file, convert_notebook_json, process_notebook
+
+VALUES = {"b": [1, 2.5, None, True], "a": {"text": "é   \x1f \"quoted\" \\", "empty": [], "nested": {}}}
+
+
+requires_orjson = pytest.mark.skipif(jsonio.orjson is None, reason="orjson is not installed")
+
+
+@pytest.fixture(params=["json", pytest.param("orjson", marks=requires_orjson)])
+def backend(request):
+    return request.param
+
+
+class TestDumps:
+    def test_compact(self, backend):
+        assert jsonio.dumps(VALUES, backend=backend) == json.dumps(
+            VALUES, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+
+    def test_canonical_is_jupyter_layout(self, backend):
+        data = jsonio.dumps(VALUES, canonical=True, backend=backend)
+        assert data == (json.dumps(VALUES, ensure_ascii=False, indent=1, sort_keys=True) + "\n").encode("utf-8")
+        assert data.startswith(b'{\n "a": {\n  "empty": []')
+
+    def test_deterministic(self, backend, sample_ipynb):
+        notebook = json.loads(open(sample_ipynb, "rb").read())
+        for canonical in (False, True):
+            first = jsonio.dumps(notebook, canonical=canonical, backend=backend)
+            assert first == jsonio.dumps(json.loads(first), canonical=canonical, backend=backend)
+
+    def test_big_integers(self, backend):
+        assert jsonio.dumps({"n": 2**70}, backend=backend) == b'{"n":1180591620717411303424}'
+
+    def test_exponent_floats(self, backend):
+        expected = {"json": b"[1e+20,1e-07]", "orjson": b"[1e20,1e-7]"}[backend]
+        assert jsonio.dumps([1e20, 1e-7], backend=backend) == expected
+
+    def test_non_finite_floats(self, backend):
+        expected = {"json": b"[NaN,Infinity]", "orjson": b"[null,null]"}[backend]
+        assert jsonio.dumps([float("nan"), float("inf")], backend=backend) == expected
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError):
+            jsonio.dumps({}, backend="simdjson")
+
+    def test_environment_selects_stdlib(self, monkeypatch):
+        monkeypatch.setenv("CODEHERE_JSON", "json")
+        assert jsonio.default_backend() == "json"
+
+
+class TestNonFiniteFloats:
+    def test_loads_picks_stdlib(self):
+        assert jsonio.loads('{"a": 1.5}') == ({"a": 1.5}, None)
+        values, backend = jsonio.loads(b'[NaN, Infinity, -Infinity]')
+        assert backend == "json"
+        assert jsonio.dumps(values, backend=backend) == b"[NaN,Infinity,-Infinity]"
+
+    @pytest.mark.parametrize("canonical", [False, True])
+    def test_kept_in_converted_notebooks(self, sample_ipynb, tmp_path, canonical):
+        notebook = json.loads(open(sample_ipynb).read())
+        notebook["cells"][1]["outputs"] = [
+            {"output_type": "display_data", "metadata": {}, "data": {"application/json": {"x": float("nan")}}}
+        ]
+        text = json.dumps(notebook)
+        assert '"x":NaN' in convert_notebook_json(text, canonical=canonical).replace(" ", "")
+        infile = tmp_path / "nan.ipynb"
+        infile.write_text(text)
+        outfile = tmp_path / "out.ipynb"
+        compile_file(str(infile)).write(str(outfile), canonical=canonical)
+        assert '"x":NaN' in outfile.read_text().replace(" ", "")
+
+
+class TestCanonicalNotebooks:
+    def test_process_notebook(self, sample_ipynb, tmp_path):
+        outfile = tmp_path / "out.ipynb"
+        process_notebook(sample_ipynb, str(outfile), canonical=True)
+        notebook = json.loads(outfile.read_text())
+        assert outfile.read_bytes() == jsonio.dumps(notebook, canonical=True)
+
+    def test_convert_notebook_json_keeps_type(self, sample_ipynb):
+        text = open(sample_ipynb).read()
+        assert convert_notebook_json(text, canonical=True).endswith("}\n")
+
+    def test_stream_rejected(self, sample_ipynb, tmp_path):
+        with pytest.raises(ValueError):
+            process_notebook(sample_ipynb, str(tmp_path / "out.ipynb"), stream=True, canonical=True)
+
+    def test_cli(self, sample_ipynb, tmp_path):
+        outfile = tmp_path / "out.ipynb"
+        main([sample_ipynb, "--outfile", str(outfile), "--canonical"])
+        assert outfile.read_text().startswith('{\n "cells": [\n  {\n')
+        with pytest.raises(SystemExit):
+            main([sample_ipynb, "--canonical", "--stream"])
@@ -0,0 +1,138 @@
+import pytest
+
+from codehere import markdown
+from codehere.batch import convert_many
+from codehere.check import check_file
+from codehere.cli import main
+from codehere.converter import Block, Converter
+from codehere.exceptions import NoOpenTagError, UnclosedTagError
+from codehere.processors import compile_file, convert_text, process_markdown
+from codehere.stats import Stats
+
+BEGIN = '"""<codehere>"""\n'
+END = '"""</codehere>"""\n'
+
+LECTURE = f"""# Lecture
+
+Write the opening tag as `{BEGIN.strip()}` on its own line:
+
+{BEGIN}
+```python
+def solve():
+    {BEGIN}    return 42
+    {END}```
+
+~~~~
+{BEGIN}~~~
+still code
+{END}~~~~
+
+{END}"""
+
+
+@pytest.fixture
+def lecture_md(tmp_path):
+    path = tmp_path / "lecture.md"
+    path.write_text(LECTURE)
+    return str(path)
+
+
+class TestCodeSpans:
+    def test_offsets(self):
+        text = "a\n```\nx\ny\n```\nb"
+        ((start, stop),) = markdown.code_ranges(text)
+        assert text[start:stop] == "x\ny\n"
+
+    def test_backticks_and_tildes(self):
+        lines = ["text\n", "```python\n", "x\n", "```\n", "  ~~~\n", "y\n", "~~~\n"]
+        assert markdown.code_spans(lines) == [(2, 3), (5, 6)]
+
+    def test_closing_fence_must_match(self):
+        lines = ["````\n", "```\n", "~~~~\n", "```` not a close\n", "`````\n", "after\n"]
+        assert markdown.code_spans(lines) == [(1, 4)]
+
+    def test_inline_backticks_are_not_a_fence(self):
+        assert markdown.code_spans(["```a` b```\n", "x\n"]) == []
+
+    def test_unclosed_fence_runs_to_the_end(self):
+        assert markdown.code_spans(["```\n", "x\n"]) == [(1, 2)]
+
+
+class TestFindBlocks:
+    def test_only_tags_inside_fences(self):
+        lines = LECTURE.splitlines(keepends=True)
+        assert markdown.find_blocks(Converter(), lines) == [Block(8, 10, "codehere"), Block(14, 17, "codehere")]
+
+    def test_error_lines_number_the_document(self):
+        lines = ["# Title\n", "\n", "```\n", "x\n", BEGIN, "```\n", END]
+        with pytest.raises(UnclosedTagError) as exc_info:
+            markdown.find_blocks(Converter(), lines)
+        assert exc_info.value.line == 4
+        assert str(exc_info.value) == "Unclosed tag in line: 4"
+
+    def test_only_code_lines_are_scanned(self):
+        stats = Stats()
+        markdown.find_blocks(Converter(stats=stats), LECTURE.splitlines(keepends=True))
+        assert stats.counts["lines"] == 8
+        assert stats.counts["blocks"] == 2
+
+
+class TestRenderText:
+    def test_prose_is_copied(self):
+        rendered = convert_text(LECTURE, fenced=True)
+        assert rendered.count("raise NotImplementedError") == 2
+        assert "return 42" not in rendered and "still code" not in rendered
+        assert rendered.startswith(f"# Lecture\n\nWrite the opening tag as `{BEGIN.strip()}`")
+        assert rendered.endswith(f"~~~~\n\n{END}")
+
+    def test_matches_compiled_document(self):
+        lines = LECTURE.splitlines(keepends=True)
+        blocks = markdown.find_blocks(Converter(), lines)
+        for solution in (False, True):
+            expected = "".join(Converter().render_blocks(lines, blocks, solution=solution))
+            assert markdown.render_text(Converter(), LECTURE, solution=solution) == expected
+
+    def test_without_tags_returns_text(self):
+        text = "# Title\n```\nx\n```\n"
+        assert markdown.render_text(Converter(), text) is text
+
+    def test_error_in_unclosed_fence(self):
+        with pytest.raises(NoOpenTagError) as exc_info:
+            markdown.render_text(Converter(), "text\n```\n" + END)
+        assert exc_info.value.line == 2
+
+    def test_without_fenced_prose_tags_count(self, lecture_md, tmp_path):
+        with pytest.raises(UnclosedTagError):
+            process_markdown(lecture_md, str(tmp_path / "out.md"))
+
+
+class TestFencedOption:
+    def test_process_markdown(self, lecture_md, tmp_path):
+        out = tmp_path / "out.md"
+        process_markdown(lecture_md, str(out), fenced=True)
+        assert out.read_text() == convert_text(LECTURE, fenced=True)
+
+    def test_compiled_document(self, lecture_md, tmp_path):
+        out = tmp_path / "out.md"
+        compile_file(lecture_md, fenced=True).write(str(out), solution=True)
+        assert out.read_text() == convert_text(LECTURE, solution=True, fenced=True)
+
+    def test_batch(self, lecture_md, tmp_path):
+        report = convert_many([lecture_md], str(tmp_path / "out"), fenced=True)
+        assert report.failures == []
+        assert (tmp_path / "out" / "lecture.md").read_text() == convert_text(LECTURE, fenced=True)
+
+    def test_check(self, lecture_md):
+        assert check_file(lecture_md, fenced=True) == []
+        assert check_file(lecture_md) != []
+
+    def test_cli(self, lecture_md, tmp_path):
+        out = tmp_path / "out.md"
+        main([lecture_md, "--fenced", "--outfile", str(out)])
+        assert out.read_text() == convert_text(LECTURE, fenced=True)
+
+    def test_cli_both_with_stream(self, lecture_md, tmp_path):
+        main([lecture_md, "--both", "--stream", "--fenced", "--incremental", "--cache-file", str(tmp_path / "c.json")])
+        for suffix, solution in (("task", False), ("solution", True)):
+            rendered = (tmp_path / f"lecture-{suffix}.md").read_text()
+            assert rendered == convert_text(LECTURE, solution=solution, fenced=True)
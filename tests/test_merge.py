@@ -0,0 +1,182 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from codehere import merge as merge_module
+from codehere.cli import main
+from codehere.merge import MergeProblem, MergeTemplate, format_merge_report, merge_many
+from codehere.processors import convert_notebook_json, convert_text
+
+AREA = "    return math.pi * radius ** 2\n"
+PERIMETER = "    return 2 * math.pi * radius\n"
+
+
+def answered(task: str, *answers: str) -> str:
+    for answer in answers:
+        task = task.replace("    raise NotImplementedError\n", answer, 1)
+    return task
+
+
+@pytest.fixture
+def task_py(sample_py):
+    return convert_text(Path(sample_py).read_text())
+
+
+@pytest.fixture
+def submit(tmp_path):
+    def submit(content: str, name: str = "alice/sample.py") -> str:
+        path = tmp_path / "submissions" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        return str(path)
+
+    return submit
+
+
+class TestMatch:
+    def test_answers_are_merged_into_template(self, sample_py, task_py, submit):
+        template = MergeTemplate.from_file(sample_py)
+        merged, problems = template.merge(submit(answered(task_py, "    return 1\n", "    return 2\n")))
+        assert problems == []
+        expected = Path(sample_py).read_text().replace(AREA, "    return 1\n").replace(PERIMETER, "    return 2\n")
+        assert merged == expected
+
+    def test_merged_source_runs_the_tests(self, sample_py, task_py, submit):
+        merged, _ = MergeTemplate.from_file(sample_py).merge(submit(answered(task_py, AREA, PERIMETER)))
+        namespace = {}
+        exec(merged, namespace)
+        assert namespace["perimeter"](1) == pytest.approx(6.283185307)
+
+    def test_multiline_answers(self, sample_py, task_py, submit):
+        answer = "    r2 = radius * radius\n\n    return math.pi * r2\n"
+        merged, problems = MergeTemplate.from_file(sample_py).merge(submit(answered(task_py, answer)))
+        assert problems == []
+        assert answer in merged
+
+    def test_whitespace_outside_regions_is_ignored(self, sample_py, task_py, submit):
+        edited = "\n".join(line.rstrip() for line in task_py.splitlines()) + "\n\n\n"
+        _, problems = MergeTemplate.from_file(sample_py).merge(submit(edited))
+        assert problems == []
+
+    def test_edits_outside_regions_are_reported(self, sample_py, task_py, submit):
+        edited = task_py.replace("def perimeter(radius):", "def perimeter(r):")
+        merged, problems = MergeTemplate.from_file(sample_py).merge(submit(edited))
+        assert problems == [MergeProblem("edited", "Edited outside the answer regions", 14)]
+        assert "def perimeter(radius):" in merged
+
+    def test_added_lines_are_reported(self, sample_py, task_py, submit):
+        _, problems = MergeTemplate.from_file(sample_py).merge(submit(task_py + "print(area_of_circle(2))\n"))
+        assert problems == [MergeProblem("edited", "Lines added outside the answer regions", 18)]
+
+    def test_missing_region(self, sample_py, task_py, submit):
+        first, _, _ = task_py.partition("def perimeter")
+        merged, problems = MergeTemplate.from_file(sample_py).merge(submit(answered(first, AREA)))
+        assert [problem.kind for problem in problems] == ["edited", "unmatched"]
+        assert problems[1].message == "No answer region for the template block in line: 16"
+        assert merged.endswith('    """<codehere>"""\n    raise NotImplementedError\n    """</codehere>"""\n')
+        assert AREA in merged
+
+    def test_extra_region(self, sample_py, task_py, submit):
+        extra = "    ####### Your code here #######\n    pass\n    ##############################\n"
+        _, problems = MergeTemplate.from_file(sample_py).merge(submit(task_py + extra))
+        assert MergeProblem("unmatched", "Answer region without a block in the template", 18) in problems
+
+    def test_deleted_end_banner_keeps_next_answers_in_place(self, sample_py, task_py, submit):
+        edited = answered(task_py, AREA, PERIMETER).replace("    ##############################\n", "", 1)
+        merged, problems = MergeTemplate.from_file(sample_py).merge(submit(edited))
+        assert problems == [MergeProblem("unmatched", "Answer region is never closed", 4)]
+        assert PERIMETER in merged and AREA not in merged
+
+    def test_codehere_inside_comment_is_not_a_slot(self, tmp_path, submit):
+        source = (
+            'x = 1\n"""<comment>"""\n"""<codehere>"""\nhidden = 1\n"""</codehere>"""\n"""</comment>"""\n'
+            '"""<codehere>"""\ny = 2\n"""</codehere>"""\n'
+        )
+        template_path = tmp_path / "template.py"
+        template_path.write_text(source)
+        template = MergeTemplate.from_file(str(template_path))
+        assert len(template.slots) == 1
+        submission = submit(convert_text(source).replace("raise NotImplementedError\n", "y = 3\n"))
+        merged, problems = template.merge(submission)
+        assert problems == []
+        assert merged == source.replace("y = 2\n", "y = 3\n")
+
+    def test_custom_replacement(self, sample_py, submit):
+        task = convert_text(Path(sample_py).read_text(), replacement=" TODO ")
+        template = MergeTemplate.from_file(sample_py, replacement=" TODO ")
+        _, problems = template.merge(submit(answered(task, AREA, PERIMETER)))
+        assert problems == []
+
+    def test_other_format_is_rejected(self, sample_py, submit):
+        with pytest.raises(ValueError, match="not a .py file"):
+            MergeTemplate.from_file(sample_py).merge(submit("x = 1\n", "alice/sample.md"))
+
+
+class TestNotebook:
+    def test_answers_are_merged_into_cells(self, sample_ipynb, submit):
+        task = json.loads(convert_notebook_json(Path(sample_ipynb).read_text()))
+        task["cells"][1]["source"][3] = "x = 2.0\n"
+        task["cells"].insert(2, {"cell_type": "markdown", "metadata": {}, "source": ["Done"]})
+        merged, problems = MergeTemplate.from_file(sample_ipynb).merge(submit(json.dumps(task), "alice/hw.ipynb"))
+        assert problems == []
+        notebook = json.loads(merged)
+        assert notebook["cells"][1]["source"][2:5] == ['"""<codehere>"""\n', "x = 2.0\n", '"""</codehere>"""\n']
+        assert notebook["cells"][2]["source"][1] == "# grading cell\n"
+
+    def test_non_finite_floats_are_kept(self, sample_ipynb, submit, tmp_path):
+        notebook = json.loads(Path(sample_ipynb).read_text())
+        notebook["metadata"]["threshold"] = float("inf")
+        template = tmp_path / "template.ipynb"
+        template.write_text(json.dumps(notebook))
+        task = convert_notebook_json(template.read_text())
+        merged, _ = MergeTemplate.from_file(str(template)).merge(submit(task, "alice/hw.ipynb"))
+        assert json.loads(merged)["metadata"]["threshold"] == float("inf")
+
+    def test_added_cell_is_reported(self, sample_ipynb, submit):
+        task = json.loads(convert_notebook_json(Path(sample_ipynb).read_text()))
+        task["cells"].append({"cell_type": "code", "metadata": {}, "outputs": [], "source": "print(1)"})
+        _, problems = MergeTemplate.from_file(sample_ipynb).merge(submit(json.dumps(task), "alice/hw.ipynb"))
+        assert problems == [MergeProblem("edited", "Lines added outside the answer regions", 0, 3)]
+
+
+class TestMergeMany:
+    def test_mirrors_submissions(self, sample_py, task_py, submit, tmp_path):
+        submit(answered(task_py, AREA, PERIMETER), "alice/sample.py")
+        submit(task_py.replace("import math", "import cmath"), "bob/sample.py")
+        outdir = tmp_path / "merged"
+        report = merge_many(sample_py, [str(tmp_path / "submissions")], str(outdir))
+        assert (report.total, report.merged, report.failures) == (2, 2, [])
+        ((submission, problem),) = report.problems
+        assert submission.endswith("bob/sample.py") and problem.kind == "edited"
+        assert (outdir / "alice" / "sample.py").read_text() == Path(sample_py).read_text()
+
+    def test_failures(self, sample_py, submit, tmp_path):
+        submit("x = 1\n", "alice/sample.md")
+        report = merge_many(sample_py, [str(tmp_path / "submissions")], str(tmp_path / "merged"))
+        assert report.merged == 0
+        ((submission, error),) = report.failures
+        assert isinstance(error, ValueError)
+        assert format_merge_report(report).endswith("Merged 0 of 1 submissions, 0 with problems, 1 failed\n")
+
+    def test_process_pool(self, sample_py, task_py, submit, tmp_path, monkeypatch):
+        monkeypatch.setattr(merge_module, "MIN_FILES_PER_JOB", 1)
+        for index in range(5):
+            submit(answered(task_py, f"    return {index}\n"), f"student{index}/sample.py")
+        report = merge_many(sample_py, [str(tmp_path / "submissions")], str(tmp_path / "merged"), jobs=2)
+        assert (report.total, report.merged, report.failures) == (5, 5, [])
+        assert "return 3\n" in (tmp_path / "merged" / "student3" / "sample.py").read_text()
+
+
+class TestMergeCli:
+    def test_merge(self, sample_py, task_py, submit, tmp_path, capsys):
+        submit(answered(task_py, AREA, PERIMETER))
+        main(["merge", sample_py, str(tmp_path / "submissions"), "--outdir", str(tmp_path / "merged")])
+        assert "Merged 1 of 1 submissions, 0 with problems, 0 failed" in capsys.readouterr().err
+        assert (tmp_path / "merged" / "alice" / "sample.py").read_text() == Path(sample_py).read_text()
+
+    def test_failures_exit_with_status_1(self, sample_py, submit, tmp_path):
+        submit("{}", "alice/sample.ipynb")
+        with pytest.raises(SystemExit) as exc_info:
+            main(["merge", sample_py, str(tmp_path / "submissions"), "--outdir", str(tmp_path / "merged")])
+        assert exc_info.value.code == 1
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from codehere.output import AtomicOutput, write_output
+from codehere.processors import process_file
+
+
+def listing(directory) -> list[str]:
+    return sorted(os.listdir(directory))
+
+
+class TestWriteOutput:
+    def test_new_file(self, tmp_path):
+        path = tmp_path / "out.py"
+        assert write_output(str(path), "x = 1\n") is True
+        assert path.read_text() == "x = 1\n"
+        assert listing(tmp_path) == ["out.py"]
+
+    def test_unchanged_is_untouched(self, tmp_path):
+        path = tmp_path / "out.py"
+        path.write_text("x = 1\n")
+        os.utime(path, ns=(0, 0))
+        assert write_output(str(path), "x = 1\n") is False
+        assert path.stat().st_mtime_ns == 0
+        assert listing(tmp_path) == ["out.py"]
+
+    @pytest.mark.parametrize("data", ["x = 2\n", "x = 10\n"])
+    def test_changed_is_replaced(self, tmp_path, data):
+        path = tmp_path / "out.py"
+        path.write_text("x = 1\n")
+        assert write_output(str(path), data) is True
+        assert path.read_text() == data
+
+    def test_bytes(self, tmp_path):
+        path = tmp_path / "out.ipynb"
+        assert write_output(str(path), b"{}") is True
+        assert write_output(str(path), b"{}") is False
+
+    def test_keeps_mode(self, tmp_path):
+        path = tmp_path / "out.py"
+        path.write_text("x = 1\n")
+        path.chmod(0o640)
+        write_output(str(path), "x = 2\n")
+        assert path.stat().st_mode & 0o777 == 0o640
+
+
+class TestAtomicOutput:
+    def test_error_keeps_existing_file(self, tmp_path):
+        path = tmp_path / "out.py"
+        path.write_text("x = 1\n")
+        with pytest.raises(RuntimeError), AtomicOutput(str(path)) as output:
+            output.file.write("partial")
+            raise RuntimeError
+        assert path.read_text() == "x = 1\n"
+        assert not output.written
+        assert listing(tmp_path) == ["out.py"]
+
+
+class TestProcessFileUnchanged:
+    @pytest.mark.parametrize("name", ["sample_py", "sample_md", "sample_ipynb"])
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_second_run_leaves_output_untouched(self, name, stream, request, tmp_path):
+        infile = request.getfixturevalue(name)
+        outfile = tmp_path / f"out.{infile.rsplit('.', 1)[1]}"
+        assert process_file(infile, str(outfile), stream=stream) is True
+        os.utime(outfile, ns=(0, 0))
+        assert process_file(infile, str(outfile), stream=stream) is False
+        assert outfile.stat().st_mtime_ns == 0
+        assert process_file(infile, str(outfile), solution=True, stream=stream) is True
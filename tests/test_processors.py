@@ -1,9 +1,23 @@
+import io
 import json
+import tracemalloc
 
 import pytest
 
-from codehere.exceptions import UnsupportedExtensionError
-from codehere.processors import process_file, process_markdown, process_notebook, process_py
+from codehere.converter import Converter, RenderCache
+from codehere.exceptions import NoOpenTagError, TagError, UnsupportedExtensionError
+from codehere.processors import (
+    compile_file,
+    convert_notebook_dict,
+    convert_notebook_json,
+    convert_text,
+    process_file,
+    process_markdown,
+    process_notebook,
+    process_py,
+    process_stream,
+)
+from codehere.stats import Stats
 
 
 class TestProcessPy:
@@ -24,6 +38,30 @@ class TestProcessPy:
         assert "grading" not in text
 
 
+    def test_tag_error_keeps_existing_output(self, tmp_path):
+        infile = tmp_path / "in.py"
+        infile.write_text("x = 1\n" * 100 + '"""</codehere>"""\n')
+        out = tmp_path / "out.py"
+        out.write_text("previous\n")
+        with pytest.raises(NoOpenTagError) as exc_info:
+            process_py(str(infile), str(out))
+        assert exc_info.value.line == 100
+        assert out.read_text() == "previous\n"
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["in.py", "out.py"]
+
+    def test_constant_memory(self, tmp_path):
+        block = ["x = 1\n"] * 20 + ['"""<codehere>"""\n', "secret = 2\n", '"""</codehere>"""\n']
+        infile = tmp_path / "big.py"
+        infile.write_text("".join(block * 5000))  # about 0.8 MB
+        tracemalloc.start()
+        try:
+            process_py(str(infile), str(tmp_path / "out.py"))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 200_000
+
+
 class TestProcessNotebook:
     def test_task(self, sample_ipynb, tmp_path):
         out = str(tmp_path / "out.ipynb")
@@ -59,6 +97,56 @@ class TestProcessNotebook:
         assert "grading" not in second_source
 
 
+    @pytest.mark.parametrize("solution", [False, True])
+    @pytest.mark.parametrize("clear", [False, True])
+    def test_stream_matches_default(self, sample_ipynb, tmp_path, solution, clear):
+        expected, actual = str(tmp_path / "expected.ipynb"), str(tmp_path / "actual.ipynb")
+        process_notebook(sample_ipynb, expected, solution=solution, clear=clear)
+        process_notebook(sample_ipynb, actual, solution=solution, clear=clear, stream=True)
+        assert json.loads(open(actual).read()) == json.loads(open(expected).read())
+
+    def test_stream_keeps_layout(self, sample_ipynb, tmp_path):
+        out = str(tmp_path / "out.ipynb")
+        process_notebook(sample_ipynb, out, stream=True)
+        original = open(sample_ipynb).read()
+        assert open(out).read().endswith(original[original.index('"metadata": {\n  "kernelspec"') :])
+
+    def test_stream_tag_error_names_cell(self, tmp_path):
+        infile = tmp_path / "in.ipynb"
+        infile.write_text(json.dumps({"cells": [{"cell_type": "code", "source": ["x\n", '"""</codehere>"""'], "outputs": []}]}))
+        with pytest.raises(NoOpenTagError) as exc_info:
+            process_notebook(str(infile), str(tmp_path / "out.ipynb"), stream=True)
+        assert (exc_info.value.line, exc_info.value.cell) == (1, 0)
+
+    def test_stream_does_not_load_outputs(self, tmp_path):
+        image = "iVBORw0KGgo" * 100_000
+        cell = {
+            "cell_type": "code",
+            "metadata": {},
+            "outputs": [{"output_type": "display_data", "metadata": {}, "data": {"image/png": image}}],
+            "source": ['"""<codehere>"""\n', "plot()\n", '"""</codehere>"""\n'],
+        }
+        infile = tmp_path / "heavy.ipynb"
+        infile.write_text(json.dumps({"cells": [cell] * 5, "metadata": {}, "nbformat": 4, "nbformat_minor": 5}))
+        tracemalloc.start()
+        try:
+            process_notebook(str(infile), str(tmp_path / "out.ipynb"), stream=True)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 200_000
+
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_render_cache_across_notebooks(self, sample_ipynb, tmp_path, stream):
+        converter = Converter(render_cache=RenderCache())
+        first, second = str(tmp_path / "first.ipynb"), str(tmp_path / "second.ipynb")
+        process_notebook(sample_ipynb, first, converter=converter, stream=stream)
+        process_notebook(sample_ipynb, second, converter=converter, stream=stream)
+        assert converter.render_cache.info()[:2] == (2, 2)
+        assert open(first).read() == open(second).read()
+
+
 class TestProcessMarkdown:
     def test_task(self, sample_md, tmp_path):
         out = str(tmp_path / "out.md")
@@ -76,6 +164,30 @@ class TestProcessMarkdown:
         assert "Expected output" not in text
 
 
+class TestProcessStream:
+    SOURCE = 'x = 1\r\n"""<codehere>"""\r\ny = "é"\r\n"""</codehere>"""\r\n'.encode()
+
+    def test_text_matches_convert_text(self):
+        out = io.BytesIO()
+        process_stream(io.BytesIO(self.SOURCE), out, "py")
+        assert out.getvalue() == convert_text(self.SOURCE)
+
+    def test_stats_read_whole_input(self):
+        stats, out = Stats(), io.BytesIO()
+        process_stream(io.BytesIO(self.SOURCE), out, "md", solution=True, stats=stats)
+        assert out.getvalue() == convert_text(self.SOURCE, solution=True)
+        assert stats.counts["bytes_read"] == len(self.SOURCE)
+
+    def test_notebook(self, sample_ipynb):
+        out = io.BytesIO()
+        process_stream(open(sample_ipynb, "rb"), out, "ipynb", clear=True, canonical=True)
+        assert out.getvalue() == convert_notebook_json(open(sample_ipynb, "rb").read(), clear=True, canonical=True)
+
+    def test_unknown_format(self):
+        with pytest.raises(ValueError):
+            process_stream(io.BytesIO(), io.BytesIO(), "txt")
+
+
 class TestProcessFile:
     def test_dispatches_py(self, sample_py, tmp_path):
         out = str(tmp_path / "out.py")
@@ -97,3 +209,93 @@ class TestProcessFile:
         f.write_text("hello")
         with pytest.raises(UnsupportedExtensionError):
             process_file(str(f), str(tmp_path / "out.txt"))
+
+
+class TestConvertText:
+    def test_matches_file(self, sample_py, tmp_path):
+        out = tmp_path / "out.py"
+        process_py(sample_py, str(out), solution=True)
+        assert convert_text(open(sample_py).read(), solution=True) == out.read_text()
+
+    def test_bytes(self, sample_md):
+        result = convert_text(open(sample_md, "rb").read())
+        assert isinstance(result, bytes)
+        assert b"raise NotImplementedError" in result
+
+    def test_keeps_crlf(self):
+        text = 'x = 1\r\n"""<codehere>"""\r\ny = 2\r\n"""</codehere>"""\r\n'
+        result = convert_text(text)
+        assert "raise NotImplementedError\r\n" in result
+        assert "y = 2" not in result
+
+    def test_error(self):
+        with pytest.raises(TagError):
+            convert_text('"""<codehere>"""\n')
+
+
+class TestConvertNotebookDict:
+    def test_copy_leaves_input_untouched(self, sample_ipynb):
+        notebook = json.load(open(sample_ipynb))
+        before = json.dumps(notebook)
+        result = convert_notebook_dict(notebook, clear=True)
+        assert json.dumps(notebook) == before
+        assert result is not notebook
+        assert "raise NotImplementedError" in "".join(result["cells"][1]["source"])
+        assert result["cells"][1]["outputs"] == []
+        assert result["cells"][0] is notebook["cells"][0]
+
+    def test_shares_cells_without_tags(self):
+        cells = [{"cell_type": "code", "source": ["x = 1\n"], "outputs": [], "metadata": {}}]
+        notebook = {"cells": cells, "metadata": {}}
+        assert convert_notebook_dict(notebook)["cells"][0] is cells[0]
+        assert convert_notebook_dict(notebook, clear=True)["cells"][0] is not cells[0]
+
+    def test_inplace(self, sample_ipynb):
+        notebook = json.load(open(sample_ipynb))
+        assert convert_notebook_dict(notebook, inplace=True) is notebook
+        assert "raise NotImplementedError" in "".join(notebook["cells"][1]["source"])
+
+    def test_string_source(self, sample_ipynb):
+        notebook = json.load(open(sample_ipynb))
+        for cell in notebook["cells"]:
+            cell["source"] = "".join(cell["source"])
+        result = convert_notebook_dict(notebook)
+        source = result["cells"][1]["source"]
+        assert isinstance(source, str)
+        assert "raise NotImplementedError" in source
+
+    def test_error_names_cell(self, sample_ipynb):
+        notebook = json.load(open(sample_ipynb))
+        notebook["cells"][2]["source"] = ['"""<comment>"""\n']
+        with pytest.raises(TagError) as exc_info:
+            convert_notebook_dict(notebook)
+        assert exc_info.value.cell == 2
+
+
+class TestConvertNotebookJson:
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_same_type(self, sample_ipynb, stream):
+        data = open(sample_ipynb, "rb").read()
+        as_bytes = convert_notebook_json(data, clear=True, stream=stream)
+        as_text = convert_notebook_json(data.decode(), clear=True, stream=stream)
+        assert isinstance(as_bytes, bytes) and isinstance(as_text, str)
+        assert as_bytes.decode() == as_text
+        assert "raise NotImplementedError" in as_text
+
+    def test_matches_file(self, sample_ipynb, tmp_path):
+        out = tmp_path / "out.ipynb"
+        process_notebook(sample_ipynb, str(out), solution=True)
+        assert convert_notebook_json(open(sample_ipynb).read(), solution=True) == out.read_text()
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_string_source_file(self, sample_ipynb, tmp_path, stream):
+        notebook = json.load(open(sample_ipynb))
+        for cell in notebook["cells"]:
+            cell["source"] = "".join(cell["source"])
+        infile = tmp_path / "strings.ipynb"
+        infile.write_text(json.dumps(notebook))
+        out = tmp_path / "out.ipynb"
+        process_notebook(str(infile), str(out), stream=stream)
+        assert "raise NotImplementedError" in json.loads(out.read_text())["cells"][1]["source"]
+        compile_file(str(infile)).write(str(out))
+        assert "raise NotImplementedError" in json.loads(out.read_text())["cells"][1]["source"]
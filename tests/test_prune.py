@@ -0,0 +1,148 @@
+import json
+import os
+
+import pytest
+
+from codehere.cache import make_options
+from codehere.cli import main
+from codehere.processors import compile_file, process_notebook
+from codehere.prune import PrunePolicy, prune_cell, prune_output
+
+IMAGE = {"output_type": "display_data", "data": {"image/png": "A" * 5000, "text/plain": ["<Figure>"]}, "metadata": {}}
+HTML = {"output_type": "display_data", "data": {"text/html": ["<div>widget</div>"]}, "metadata": {"isolated": True}}
+RESULT = {"output_type": "execute_result", "execution_count": 3, "data": {"text/plain": ["42"]}, "metadata": {}}
+STREAM = {"output_type": "stream", "name": "stdout", "text": [f"line {i}\n" for i in range(100)]}
+ERROR = {"output_type": "error", "ename": "ValueError", "evalue": "x", "traceback": ["x" * 5000]}
+
+
+@pytest.fixture
+def rich_ipynb(tmp_path):
+    notebook = {
+        "cells": [
+            {"cell_type": "markdown", "metadata": {"tags": ["intro"]}, "source": ["# Title\n"]},
+            {
+                "cell_type": "code",
+                "execution_count": 3,
+                "metadata": {"tags": ["plot"], "ExecuteTime": {"end_time": "2024-01-01"}},
+                "outputs": [IMAGE, HTML, RESULT, STREAM, ERROR],
+                "source": ["x = 1\n"],
+            },
+        ],
+        "metadata": {"kernelspec": {"name": "python3"}, "widgets": {"state": {"a": "b" * 1000}}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+    path = tmp_path / "rich.ipynb"
+    path.write_text(json.dumps(notebook, indent=1))
+    return str(path)
+
+
+class TestPruneOutput:
+    def test_max_output_bytes_drops_large_items(self):
+        pruned = prune_output(IMAGE, PrunePolicy(max_output_bytes=1000))
+        assert pruned["data"] == {"text/plain": ["<Figure>"]}
+        assert "image/png" in IMAGE["data"]
+
+    def test_output_without_items_is_removed(self):
+        assert prune_output(HTML, PrunePolicy(deny_mime=("text/html",))) is None
+
+    def test_allow_mime_patterns(self):
+        policy = PrunePolicy(allow_mime=("text/*",))
+        assert prune_output(IMAGE, policy)["data"] == {"text/plain": ["<Figure>"]}
+        assert prune_output(HTML, policy) is HTML
+
+    def test_unchanged_output_is_shared(self):
+        assert prune_output(RESULT, PrunePolicy(max_output_bytes=1000)) is RESULT
+
+    def test_stream_lines(self):
+        text = prune_output(STREAM, PrunePolicy(max_stream_lines=3))["text"]
+        assert text == ["line 0\n", "line 1\n", "line 2\n", "[... 97 more lines]\n"]
+
+    def test_stream_bytes(self):
+        text = prune_output({**STREAM, "text": "".join(STREAM["text"])}, PrunePolicy(max_output_bytes=20))["text"]
+        assert text == "line 0\nline 1\n[... 98 more lines]\n"
+
+    def test_error_is_kept(self):
+        assert prune_output(ERROR, PrunePolicy(max_output_bytes=10)) is ERROR
+
+    def test_execution_count_and_metadata(self):
+        policy = PrunePolicy(strip_execution_count=True, strip_metadata=True)
+        assert prune_output(RESULT, policy)["execution_count"] is None
+        assert prune_output(HTML, policy)["metadata"] == {}
+
+    def test_prune_cell_does_not_mutate_values(self):
+        cell = {"outputs": [IMAGE], "metadata": {"tags": ["a"], "ExecuteTime": {}}, "execution_count": 1}
+        original = {key: value for key, value in cell.items()}
+        prune_cell(cell, PrunePolicy(deny_mime=("image/*",), strip_execution_count=True, strip_metadata=True))
+        assert cell["outputs"] == [{**IMAGE, "data": {"text/plain": ["<Figure>"]}}]
+        assert cell["metadata"] == {"tags": ["a"]}
+        assert cell["execution_count"] is None
+        assert original["metadata"] == {"tags": ["a"], "ExecuteTime": {}}
+
+
+POLICY = PrunePolicy(
+    max_output_bytes=1000,
+    deny_mime=("text/html",),
+    max_stream_lines=10,
+    strip_execution_count=True,
+    strip_metadata=True,
+)
+
+
+class TestProcessNotebookPrune:
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_policy(self, rich_ipynb, tmp_path, stream):
+        outfile = tmp_path / "out.ipynb"
+        process_notebook(rich_ipynb, str(outfile), stream=stream, prune=POLICY)
+        notebook = json.loads(outfile.read_text())
+        cell = notebook["cells"][1]
+        output_types = [output["output_type"] for output in cell["outputs"]]
+        assert output_types == ["display_data", "execute_result", "stream", "error"]
+        assert cell["outputs"][0]["data"] == {"text/plain": ["<Figure>"]}
+        assert len(cell["outputs"][2]["text"]) == 11
+        assert cell["execution_count"] is None
+        assert cell["metadata"] == {"tags": ["plot"]}
+        assert notebook["cells"][0]["metadata"] == {"tags": ["intro"]}
+        assert "widgets" not in notebook["metadata"]
+        assert outfile.stat().st_size < os.path.getsize(rich_ipynb) / 2
+
+    def test_stream_matches_default(self, rich_ipynb, tmp_path):
+        process_notebook(rich_ipynb, str(tmp_path / "a.ipynb"), prune=POLICY)
+        process_notebook(rich_ipynb, str(tmp_path / "b.ipynb"), stream=True, prune=POLICY)
+        assert json.loads((tmp_path / "a.ipynb").read_text()) == json.loads((tmp_path / "b.ipynb").read_text())
+
+    def test_clear_wins(self, rich_ipynb, tmp_path):
+        outfile = tmp_path / "out.ipynb"
+        process_notebook(rich_ipynb, str(outfile), clear=True, stream=True, prune=POLICY)
+        assert json.loads(outfile.read_text())["cells"][1]["outputs"] == []
+
+    def test_compiled_document(self, rich_ipynb):
+        document = compile_file(rich_ipynb)
+        notebook = document.render(prune=POLICY)
+        assert notebook["cells"][1]["execution_count"] is None
+        assert document.notebook["cells"][1]["execution_count"] == 3
+
+
+class TestCachePrune:
+    def test_policy_is_part_of_options(self):
+        assert make_options() == {"solution": False, "clear": False, "replacement": " Your code here "}
+        assert make_options(prune=PrunePolicy(deny_mime=("image/*",)))["prune"]["deny_mime"] == ["image/*"]
+
+    def test_options_survive_json(self):
+        options = make_options(prune=POLICY)
+        assert json.loads(json.dumps(options)) == options
+
+
+class TestCliPrune:
+    def test_flags(self, rich_ipynb, tmp_path):
+        outfile = tmp_path / "out.ipynb"
+        main([rich_ipynb, "--outfile", str(outfile), "--deny-mime", "image/*", "--max-stream-lines", "2"])
+        cell = json.loads(outfile.read_text())["cells"][1]
+        assert "image/png" not in cell["outputs"][0]["data"]
+        assert len(cell["outputs"][3]["text"]) == 3
+        assert cell["execution_count"] == 3
+        assert "ExecuteTime" in cell["metadata"]
+
+    def test_negative_rejected(self, rich_ipynb):
+        with pytest.raises(SystemExit):
+            main([rich_ipynb, "--max-output-bytes", "-1"])
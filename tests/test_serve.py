@@ -0,0 +1,166 @@
+import io
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from codehere.processors import convert_notebook_json
+from codehere.serve import Service, UnixServer
+
+TASK = 'a = 1\n"""<codehere>"""\nb = 2\n"""</codehere>"""\n'
+
+
+@pytest.fixture
+def service():
+    service = Service(jobs=4)
+    yield service
+    service.close()
+
+
+def serve_lines(service: Service, requests: list) -> list[dict]:
+    rfile = io.BytesIO(b"".join((r if isinstance(r, bytes) else json.dumps(r).encode()) + b"\n" for r in requests))
+    wfile = io.BytesIO()
+    service.serve(rfile, wfile)
+    return [json.loads(line) for line in wfile.getvalue().splitlines()]
+
+
+class TestHandle:
+    def test_content(self, service):
+        response = service.handle({"id": 1, "content": TASK, "format": "py"})
+        assert response["ok"] and response["id"] == 1
+        assert "raise NotImplementedError" in response["content"]
+        assert "b = 2" not in response["content"]
+
+    def test_notebook_content(self, service, sample_ipynb):
+        response = service.handle({"content": open(sample_ipynb).read(), "format": "ipynb", "clear": True})
+        notebook = json.loads(response["content"])
+        assert notebook["cells"][1]["outputs"] == []
+
+    def test_notebook_object_content(self, service, sample_ipynb):
+        notebook = json.load(open(sample_ipynb))
+        response = service.handle({"content": notebook, "format": "ipynb", "clear": True})
+        assert response["ok"] is True
+        assert response["content"] == json.loads(convert_notebook_json(open(sample_ipynb).read(), clear=True))
+
+    def test_notebook_object_to_outfile(self, service, sample_ipynb, tmp_path):
+        outfile = tmp_path / "out.ipynb"
+        response = service.handle({"content": json.load(open(sample_ipynb)), "outfile": str(outfile)})
+        assert response["written"] is True
+        assert outfile.read_text() == convert_notebook_json(open(sample_ipynb).read())
+
+    def test_format_from_outfile(self, service, tmp_path):
+        outfile = tmp_path / "out.md"
+        response = service.handle({"content": TASK, "outfile": str(outfile), "solution": True})
+        assert response == {"id": None, "ok": True, "outfile": str(outfile), "written": True}
+        assert "b = 2" in outfile.read_text()
+
+    def test_infile(self, service, sample_py, tmp_path):
+        outfile = str(tmp_path / "out.py")
+        response = service.handle({"infile": sample_py, "outfile": outfile})
+        assert response["written"] is True
+        assert "raise NotImplementedError" in open(outfile).read()
+
+    def test_tag_error_details(self, service, sample_ipynb):
+        notebook = json.load(open(sample_ipynb))
+        notebook["cells"][2]["source"].append('"""<codehere>"""\n')
+        response = service.handle({"id": "x", "content": json.dumps(notebook), "format": "ipynb"})
+        assert response["ok"] is False
+        assert response["error"]["type"] == "UnclosedTagError"
+        assert response["error"]["cell"] == 2
+        assert response["error"]["line"] == 4
+
+    @pytest.mark.parametrize(
+        "request_",
+        [
+            {"op": "nope"},
+            {"content": TASK},
+            {"infile": "missing.py"},
+            {"solution": True},
+            {"content": {"cells": []}, "format": "py"},
+            {"content": {"cells": []}, "format": "ipynb", "stream": True},
+            {"content": ["a = 1\n"], "format": "py"},
+        ],
+    )
+    def test_invalid_requests(self, service, request_):
+        assert service.handle(request_)["ok"] is False
+
+    @pytest.mark.parametrize("value", ["false", 0, None])
+    def test_options_must_be_booleans(self, service, value):
+        response = service.handle({"content": TASK, "format": "py", "solution": value})
+        assert response["ok"] is False
+        assert response["error"]["message"] == f"Option 'solution' must be true or false, not {value!r}"
+
+    def test_render_cache_is_shared(self, service):
+        for _ in range(3):
+            service.handle({"content": TASK, "format": "py"})
+        assert service.handle({"op": "info"})["render_cache"]["hits"] == 2
+
+
+class TestServe:
+    def test_answers_every_request(self, service):
+        requests = [{"id": index, "content": TASK, "format": "py"} for index in range(50)]
+        responses = serve_lines(service, [*requests, b"", b"not json"])
+        assert sorted(r["id"] for r in responses if r["id"] is not None) == list(range(50))
+        assert [r["ok"] for r in responses if r["id"] is None] == [False]
+
+    def test_malformed_notebook_is_answered(self, service):
+        requests = [{"id": 1, "content": {"nbformat": 4}, "format": "ipynb"}, {"id": 2, "op": "ping"}]
+        responses = serve_lines(service, requests)
+        assert sorted((r["id"], r["ok"]) for r in responses) == [(1, False), (2, True)]
+
+    def test_failing_job_is_answered(self, service, monkeypatch):
+        def handle(request):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(service, "handle", handle)
+        (response,) = serve_lines(service, [{"id": 7, "op": "ping"}])
+        assert response == {"id": 7, "ok": False, "error": {"type": "RuntimeError", "message": "boom"}}
+
+    def test_shutdown_is_answered_last(self, service):
+        responses = serve_lines(
+            service, [{"id": 1, "content": TASK, "format": "py"}, {"id": 2, "op": "shutdown"}, {"id": 3, "op": "ping"}]
+        )
+        assert [r["id"] for r in responses] == [1, 2]
+        assert service.stopped.is_set()
+
+
+class TestUnixServer:
+    def test_connections_share_service(self, service, tmp_path):
+        path = str(tmp_path / "codehere.sock")
+        server = UnixServer(path, service)
+        thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+        thread.start()
+        try:
+            for _ in range(2):
+                with socket.socket(socket.AF_UNIX) as client:
+                    client.connect(path)
+                    client.sendall(json.dumps({"id": 1, "content": TASK, "format": "py"}).encode() + b"\n")
+                    client.shutdown(socket.SHUT_WR)
+                    response = json.loads(client.makefile("rb").readline())
+                    assert "raise NotImplementedError" in response["content"]
+            with socket.socket(socket.AF_UNIX) as client:
+                client.connect(path)
+                client.sendall(b'{"id": 9, "op": "shutdown"}\n')
+                assert json.loads(client.makefile("rb").readline()) == {"id": 9, "ok": True}
+            thread.join(timeout=5)
+            assert not thread.is_alive()
+            assert service.handle({"op": "info"})["render_cache"]["hits"] == 1
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestCliServe:
+    def test_stdin_stdout(self, sample_py, tmp_path):
+        requests = json.dumps({"id": 1, "infile": sample_py, "outfile": str(tmp_path / "out.py")}) + "\n"
+        result = subprocess.run(
+            [sys.executable, "-c", "from codehere.cli import main; main()", "serve"],
+            input=requests,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert json.loads(result.stdout) == {"id": 1, "ok": True, "outfile": str(tmp_path / "out.py"), "written": True}
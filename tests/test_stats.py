@@ -0,0 +1,138 @@
+import json
+import time
+
+import pytest
+
+from codehere import Stats, convert
+from codehere.batch import convert_many
+from codehere.cli import main
+from codehere.converter import Converter
+from codehere.processors import compile_file, process_file
+from codehere.stats import STAGES, current_stats
+
+
+class TestStats:
+    def test_nested_stages_do_not_overlap(self):
+        stats = Stats()
+        started = time.perf_counter()
+        with stats.stage("parse"):
+            time.sleep(0.02)
+            with stats.stage("scan"):
+                time.sleep(0.02)
+        elapsed = time.perf_counter() - started
+        assert stats.timings["scan"] >= 0.02
+        assert stats.timings["parse"] >= 0.02
+        assert stats.timings["parse"] + stats.timings["scan"] <= elapsed
+
+    def test_callback(self):
+        calls = []
+        stats = Stats(callback=lambda name, seconds: calls.append(name))
+        with stats.stage("read"):
+            pass
+        assert calls == ["read"]
+
+    def test_context_manager_activates(self):
+        assert current_stats() is None
+        with Stats() as stats:
+            assert current_stats() is stats
+            with Stats() as inner:
+                assert current_stats() is inner
+            assert current_stats() is stats
+        assert current_stats() is None
+
+    def test_merge(self):
+        first, second = Stats(), Stats()
+        first.add("files")
+        second.add("files", 2)
+        second.timings["read"] = 1.0
+        first.merge(second)
+        assert first.counts["files"] == 3
+        assert first.timings["read"] == 1.0
+
+    def test_as_dict(self):
+        data = Stats().as_dict()
+        assert set(data["stages"]) == set(STAGES)
+        assert data["total"] == 0
+
+
+class TestProcessFileStats:
+    def test_py(self, sample_py, tmp_path):
+        stats = Stats()
+        process_file(sample_py, str(tmp_path / "out.py"), stats=stats)
+        assert stats.counts["files"] == 1
+        assert stats.counts["blocks"] == 3
+        assert stats.counts["lines"] == len(open(sample_py).readlines())
+        assert stats.counts["bytes_written"] == (tmp_path / "out.py").stat().st_size
+        assert stats.timings["scan"] > 0 and stats.timings["write"] > 0
+
+    def test_instrumented_output_matches(self, sample_py, tmp_path):
+        process_file(sample_py, str(tmp_path / "plain.py"))
+        process_file(sample_py, str(tmp_path / "stats.py"), stats=Stats())
+        assert (tmp_path / "plain.py").read_text() == (tmp_path / "stats.py").read_text()
+
+    @pytest.mark.parametrize("stream", [False, True])
+    def test_notebook(self, sample_ipynb, tmp_path, stream):
+        stats = Stats()
+        process_file(sample_ipynb, str(tmp_path / "out.ipynb"), clear=True, stream=stream, stats=stats)
+        assert stats.counts["cells"] == 2
+        assert stats.counts["blocks"] == 2
+        assert stats.timings["parse"] > 0
+
+    def test_given_converter_is_not_modified(self, sample_py, tmp_path):
+        converter = Converter()
+        stats = Stats()
+        process_file(sample_py, str(tmp_path / "out.py"), converter=converter, stats=stats)
+        assert converter.stats is None
+        assert stats.counts["blocks"] == 3
+
+    def test_compiled_document(self, sample_ipynb, tmp_path):
+        stats = Stats()
+        document = compile_file(sample_ipynb, stats=stats)
+        document.write(str(tmp_path / "task.ipynb"))
+        document.write(str(tmp_path / "solution.ipynb"), solution=True)
+        assert stats.counts["files"] == 2
+        assert stats.counts["cells"] == 2
+        assert stats.timings["serialize"] > 0
+
+
+class TestActiveStats:
+    def test_convert_inside_with_block(self, sample_py, tmp_path):
+        with Stats() as stats:
+            outfile = {"task": str(tmp_path / "task.py"), "solution": str(tmp_path / "solution.py")}
+            convert(sample_py, outfile=outfile, targets=["task", "solution"])
+        assert stats.counts["files"] == 2
+
+
+class TestBatchStats:
+    def test_workers_are_merged(self, fixtures_dir, tmp_path):
+        stats = Stats()
+        convert_many([str(fixtures_dir)], str(tmp_path / "out"), jobs=2, stats=stats)
+        assert stats.counts["files"] == 3
+        assert stats.counts["cells"] == 2
+
+
+class TestCliStats:
+    def test_json(self, sample_py, tmp_path, capsys):
+        main([sample_py, "--outfile", str(tmp_path / "out.py"), "--stats", "--stats-format", "json"])
+        data = json.loads(capsys.readouterr().out)
+        assert data["counts"]["files"] == 1
+
+    def test_text(self, sample_py, tmp_path, capsys):
+        main([sample_py, "--outfile", str(tmp_path / "out.py"), "--stats"])
+        assert "scan" in capsys.readouterr().err
+
+    def test_flag_before_input(self, sample_py, tmp_path, capsys):
+        infile = tmp_path / "sample.py"
+        infile.write_text(open(sample_py).read())
+        main(["--stats", str(infile)])
+        assert "scan" in capsys.readouterr().err
+        assert (tmp_path / "sample-task.py").exists()
+
+    def test_format_requires_stats(self, sample_py, capsys):
+        with pytest.raises(SystemExit):
+            main([sample_py, "--stats-format", "json"])
+        assert "--stats-format only applies to --stats" in capsys.readouterr().err
+
+    def test_watch_rejected(self, sample_py):
+        with pytest.raises(SystemExit):
+            main([sample_py, "--watch", "--stats"])
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from codehere.streaming import rewrite_notebook, skip_value
+
+
+def rewrite(text, render_source=lambda lines, index: None, clear=False):
+    chunks = []
+    rewrite_notebook(text.encode(), lambda chunk: chunks.append(bytes(chunk)), render_source, clear=clear)
+    return b"".join(chunks).decode()
+
+
+class TestSkipValue:
+    @pytest.mark.parametrize(
+        "value",
+        ['"plain"', r'"esc\"aped"', r'"back\\"', '"br]}ckets"', "[1, [2], {}]", '{"a": ["]", {"b": "}"}]}', "-1.5e3", "null"],
+    )
+    def test_value_end(self, value):
+        text = (value + ", 0").encode()
+        assert skip_value(text, 0) == len(value)
+
+    def test_unterminated(self):
+        with pytest.raises(ValueError):
+            skip_value(b'["abc', 0)
+
+
+class TestRewriteNotebook:
+    NOTEBOOK = {
+        "cells": [
+            {"cell_type": "markdown", "metadata": {}, "source": ["# Title"]},
+            {
+                "outputs": [{"output_type": "stream", "name": "stdout", "text": ["]}\\"]}],
+                "source": ["x = 1\n"],
+                "metadata": {"tags": ["}"]},
+                "cell_type": "code",
+                "execution_count": 1,
+            },
+        ],
+        "metadata": {"kernelspec": {"name": "python3"}},
+        "nbformat": 4,
+        "nbformat_minor": 5,
+    }
+
+    def test_unchanged_copy_is_identical(self):
+        text = json.dumps(self.NOTEBOOK, indent=1)
+        assert rewrite(text) == text
+
+    def test_rewrites_code_sources_only(self):
+        seen = []
+
+        def render_source(lines, index):
+            seen.append((index, lines))
+            return ["y = 2\n"]
+
+        text = json.dumps(self.NOTEBOOK, indent=1)
+        result = json.loads(rewrite(text, render_source))
+        assert seen == [(1, ["x = 1\n"])]
+        assert result["cells"][0] == self.NOTEBOOK["cells"][0]
+        assert result["cells"][1] == {**self.NOTEBOOK["cells"][1], "source": ["y = 2\n"]}
+
+    def test_clear_drops_outputs(self):
+        result = json.loads(rewrite(json.dumps(self.NOTEBOOK), clear=True))
+        assert result["cells"][1]["outputs"] == []
+        assert result["metadata"] == self.NOTEBOOK["metadata"]
+
+    def test_string_source(self):
+        notebook = {"cells": [{"cell_type": "code", "source": "a\nb", "outputs": []}]}
+        result = json.loads(rewrite(json.dumps(notebook), lambda lines, index: [line.upper() for line in lines]))
+        assert result["cells"][0]["source"] == "A\nB"
+
+    def test_malformed(self):
+        with pytest.raises(ValueError):
+            rewrite('{"cells": [{"cell_type": "code"} {}]}')
@@ -0,0 +1,99 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from codehere.processors import process_file
+from codehere.watch import InotifyBackend, PollingBackend, Watcher, report
+
+BACKENDS = [
+    pytest.param(lambda paths: PollingBackend(paths, interval=0.01), id="polling"),
+    pytest.param(
+        InotifyBackend,
+        id="inotify",
+        marks=pytest.mark.skipif(not InotifyBackend.available(), reason="inotify is not available"),
+    ),
+]
+
+TASK = '"""<codehere>"""\nanswer = {}\n"""</codehere>"""\n'
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.parametrize("make_backend", BACKENDS)
+class TestWatcher:
+    def test_rerenders_saved_file(self, make_backend, tmp_path):
+        infile = tmp_path / "hw.py"
+        infile.write_text(TASK.format(1))
+        watcher = Watcher([str(infile)], targets=["solution"], backend=make_backend([str(infile)]))
+        stop = threading.Event()
+        thread = threading.Thread(target=watcher.run, args=(stop,))
+        thread.start()
+        try:
+            outfile = tmp_path / "hw-solution.py"
+            assert wait_for(lambda: outfile.exists() and "answer = 1" in outfile.read_text())
+            infile.write_text(TASK.format(2))
+            assert wait_for(lambda: "answer = 2" in outfile.read_text())
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_new_file_in_directory(self, make_backend, tmp_path):
+        course, outdir = tmp_path / "course", tmp_path / "render"
+        (course / "week1").mkdir(parents=True)
+        watcher = Watcher([str(course)], str(outdir), backend=make_backend([str(course)]))
+        (course / "week1" / "hw.py").write_text(TASK.format(1))
+        results = []
+        assert wait_for(lambda: results.extend(watcher.poll(timeout=0.05)) or results)
+        assert results == [(str(outdir / "week1" / "hw.py"), True, None)]
+        assert "raise NotImplementedError" in (outdir / "week1" / "hw.py").read_text()
+
+
+class TestAffected:
+    def test_ignores_own_outputs(self, tmp_path):
+        infile = tmp_path / "hw.py"
+        infile.write_text(TASK.format(1))
+        watcher = Watcher([str(infile)], backend=PollingBackend([str(infile)]))
+        assert watcher.affected({tmp_path / "hw-task.py", infile, tmp_path / "notes.txt"}) == [infile]
+
+    def test_stream(self, sample_ipynb, tmp_path):
+        infile = tmp_path / "hw.ipynb"
+        infile.write_text(Path(sample_ipynb).read_text())
+        watcher = Watcher([str(infile)], stream=True, backend=PollingBackend([str(infile)]))
+        watcher.render([infile])
+        streamed = tmp_path / "streamed.ipynb"
+        process_file(str(infile), str(streamed), stream=True)
+        assert (tmp_path / "hw-task.ipynb").read_bytes() == streamed.read_bytes()
+
+    def test_reports_tag_errors(self, tmp_path):
+        infile = tmp_path / "hw.py"
+        infile.write_text('"""<codehere>"""\n')
+        watcher = Watcher([str(infile)], backend=PollingBackend([str(infile)]))
+        [(path, written, error)] = watcher.render([infile])
+        assert path == str(infile)
+        assert error.line == 0
+        assert not Path(tmp_path / "hw-task.py").exists()
+
+    def test_reports_malformed_notebooks(self, tmp_path):
+        infile = tmp_path / "hw.ipynb"
+        infile.write_text('{"nbformat": 4}')
+        watcher = Watcher([str(infile)], backend=PollingBackend([str(infile)]))
+        [(path, written, error)] = watcher.render([infile])
+        assert path == str(infile) and isinstance(error, KeyError)
+
+    def test_reports_unchanged_outputs(self, tmp_path, capsys):
+        infile = tmp_path / "hw.py"
+        infile.write_text(TASK.format(1))
+        watcher = Watcher([str(infile)], backend=PollingBackend([str(infile)]))
+        report(watcher.render([infile]))
+        report(watcher.render([infile]))
+        err = capsys.readouterr().err.splitlines()
+        assert err == [f"Saved in: {tmp_path / 'hw-task.py'}", f"Up to date: {tmp_path / 'hw-task.py'}"]